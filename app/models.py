@@ -22,9 +22,29 @@ class Settings(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
 class Trade(db.Model):
+    """
+    Orders and fills recorded by the trading bot (trading_bot/trade_recorder.py writes this table in batches).
+    kind is 'order' for placed orders (including stop-loss/take-profit) and 'fill' for executions synced
+    from the exchange; fills carry the exchange's trade_id, realized_pnl and commission (fee in fee_asset).
+    """
+    __table_args__ = (
+        db.Index('ix_trade_symbol_timestamp', 'symbol', 'timestamp'),
+        db.Index('ix_trade_timestamp', 'timestamp'),
+        db.Index('ix_trade_trade_id', 'trade_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    symbol = db.Column(db.String(10), nullable=False)
+    symbol = db.Column(db.String(20), nullable=False)
     action = db.Column(db.String(10), nullable=False)
     quantity = db.Column(db.Float, nullable=False)
     price = db.Column(db.Float, nullable=False)
+    kind = db.Column(db.String(10), nullable=False, default='fill')
+    order_type = db.Column(db.String(30))
+    order_id = db.Column(db.String(40))
+    status = db.Column(db.String(20))
+    leverage = db.Column(db.Integer)
+    fee = db.Column(db.Float, nullable=False, default=0.0)
+    fee_asset = db.Column(db.String(10))
+    realized_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    trade_id = db.Column(db.BigInteger)
@@ -1,9 +1,38 @@
-from flask import render_template, url_for, flash, redirect, request
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func, case, and_, or_
+from flask import render_template, url_for, flash, redirect, request, jsonify, abort, send_file, Response, stream_with_context
 from app import app, db, bcrypt
 from app.forms import RegistrationForm, LoginForm, SettingsForm
-from app.models import User, Settings
+from app.models import User, Settings, Trade
 from flask_login import login_user, current_user, logout_user, login_required
 
+# The trading bot modules import each other by flat name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'trading_bot'))
+from job_queue import JobQueue, JOB_KINDS
+from live_feed import LiveFeedBroker, LiveFeedReceiver
+from config import get_config
+
+jobs = JobQueue()
+
+# Live updates from the trading process, fanned out to dashboard streams
+live_feed_settings = get_config().get_live_feed_settings()
+live_broker = LiveFeedBroker(live_feed_settings['max_clients'])
+live_receiver = None
+live_receiver_lock = threading.Lock()
+STREAM_HEARTBEAT_SECONDS = 15
+
+def ensure_live_receiver():
+    # Bound on the first stream request, so only the process that serves requests owns the socket
+    global live_receiver
+    with live_receiver_lock:
+        if live_receiver is None and live_feed_settings['enabled']:
+            live_receiver = LiveFeedReceiver(live_broker, live_feed_settings['socket_path'])
+            live_receiver.start()
+
 @app.route("/")
 @app.route("/home")
 def home():
@@ -72,3 +101,153 @@ def settings():
             form.account_balance.data = settings.account_balance
             form.symbols.data = settings.symbols
     return render_template('settings.html', title='Settings', form=form)
+
+# Backtest and retrain jobs; they run in the job worker, so requests return immediately
+def _owned_job(job_id):
+    try:
+        job = jobs.get(job_id)
+    except ValueError:
+        job = None
+    if job is None or job['user'] != f"web:{current_user.id}":
+        abort(404)
+    return job
+
+@app.route("/jobs", methods=['GET', 'POST'])
+@login_required
+def job_list():
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        kind = payload.get('kind', 'backtest')
+        if kind not in JOB_KINDS:
+            return jsonify({'error': f"Unknown job kind: {kind}"}), 400
+        job_id = jobs.submit(kind, {'pairs': payload.get('pairs')}, f"web:{current_user.id}")
+        return jsonify({'id': job_id, 'url': url_for('job_detail', job_id=job_id)}), 202
+    return jsonify(jobs.list(f"web:{current_user.id}"))
+
+@app.route("/jobs/<job_id>")
+@login_required
+def job_detail(job_id):
+    job = _owned_job(job_id)
+    job['artifact_urls'] = {name: url_for('job_artifact', job_id=job_id, name=name) for name in job['artifacts']}
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/progress")
+@login_required
+def job_progress(job_id):
+    _owned_job(job_id)
+    return jsonify(jobs.progress(job_id, request.args.get('since', 0, type=int)))
+
+@app.route("/jobs/<job_id>/cancel", methods=['POST'])
+@login_required
+def job_cancel(job_id):
+    _owned_job(job_id)
+    return jsonify({'cancelled': jobs.cancel(job_id)})
+
+@app.route("/jobs/<job_id>/artifacts/<name>")
+@login_required
+def job_artifact(job_id, name):
+    _owned_job(job_id)
+    path = jobs.artifact_path(job_id, name)
+    if path is None:
+        abort(404)
+    return send_file(path)
+
+# Trade history: keyset pagination and SQL aggregates, served by the (symbol, timestamp) and timestamp indexes
+MAX_PAGE_SIZE = 500
+# Realized PnL net of commissions paid in the quote asset; commissions in other assets (e.g. BNB) are not converted
+NET_PNL = Trade.realized_pnl - case((Trade.fee_asset == 'USDT', Trade.fee), else_=0.0)
+
+def _trade_filters(query):
+    symbol = request.args.get('symbol')
+    if symbol:
+        query = query.filter(Trade.symbol == symbol.upper())
+    days = request.args.get('days', type=int)
+    if days:
+        query = query.filter(Trade.timestamp >= datetime.utcnow() - timedelta(days=days))
+    return query
+
+@app.route("/api/trades")
+@login_required
+def trade_history():
+    """
+    Newest trades first. Pass the returned next cursor as ?before= for the following page;
+    unlike OFFSET, the cost of a page does not grow with its depth.
+    """
+    limit = min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE)
+    query = _trade_filters(Trade.query)
+    kind = request.args.get('kind')
+    if kind:
+        query = query.filter(Trade.kind == kind)
+    before = request.args.get('before')
+    if before:
+        try:
+            timestamp, trade_id = before.rsplit('|', 1)
+            timestamp, trade_id = datetime.fromisoformat(timestamp), int(trade_id)
+        except ValueError:
+            return jsonify({'error': f"Invalid cursor: {before}"}), 400
+        query = query.filter(or_(Trade.timestamp < timestamp, and_(Trade.timestamp == timestamp, Trade.id < trade_id)))
+    trades = query.order_by(Trade.timestamp.desc(), Trade.id.desc()).limit(limit).all()
+    return jsonify({
+        'trades': [{
+            'id': trade.id, 'timestamp': trade.timestamp.isoformat(), 'symbol': trade.symbol, 'action': trade.action,
+            'kind': trade.kind, 'order_type': trade.order_type, 'quantity': trade.quantity, 'price': trade.price,
+            'fee': trade.fee, 'fee_asset': trade.fee_asset, 'realized_pnl': trade.realized_pnl, 'status': trade.status,
+            'trade_id': trade.trade_id
+        } for trade in trades],
+        'next': f"{trades[-1].timestamp.isoformat()}|{trades[-1].id}" if len(trades) == limit else None
+    })
+
+@app.route("/api/stats/daily_pnl")
+@login_required
+def daily_pnl():
+    day = func.date(Trade.timestamp)
+    rows = _trade_filters(
+        db.session.query(day, func.sum(NET_PNL), func.count(Trade.id))
+    ).filter(Trade.kind == 'fill').group_by(day).order_by(day).all()
+    return jsonify([{'date': str(date), 'pnl': pnl or 0.0, 'fills': fills} for date, pnl, fills in rows])
+
+@app.route("/api/stats/symbols")
+@login_required
+def symbol_stats():
+    closing = Trade.realized_pnl != 0
+    rows = _trade_filters(db.session.query(
+        Trade.symbol,
+        func.count(Trade.id),
+        func.sum(Trade.quantity * Trade.price),
+        func.sum(NET_PNL),
+        func.sum(case((Trade.realized_pnl > 0, 1), else_=0)),
+        func.sum(case((closing, 1), else_=0)),
+        func.max(Trade.timestamp),
+    )).filter(Trade.kind == 'fill').group_by(Trade.symbol).order_by(Trade.symbol).all()
+    return jsonify([{
+        'symbol': symbol, 'fills': fills, 'volume': volume or 0.0, 'pnl': pnl or 0.0,
+        'win_rate': wins / closes if closes else None, 'last_trade': last.isoformat() if last else None
+    } for symbol, fills, volume, pnl, wins, closes, last in rows])
+
+@app.route("/stream")
+@login_required
+def live_stream():
+    """
+    Server-Sent Events stream of equity, positions, signals and per-symbol status from the trading bot.
+    Every event carries the broker version as its id, so a reconnecting EventSource resumes from
+    Last-Event-ID and only receives what changed.
+    """
+    ensure_live_receiver()
+    if not live_broker.connect():
+        return jsonify({'error': 'Too many live stream clients.'}), 503
+    since = request.headers.get('Last-Event-ID', 0, type=int)
+
+    def events():
+        version = since
+        try:
+            while True:
+                version, updates = live_broker.wait(version, STREAM_HEARTBEAT_SECONDS)
+                if not updates:
+                    yield ": heartbeat\n\n"  # Keeps proxies from closing an idle stream
+                for update_version, update in updates:
+                    yield f"id: {update_version}\nevent: {update['topic']}\ndata: {json.dumps(update)}\n\n"
+        finally:
+            live_broker.disconnect()
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
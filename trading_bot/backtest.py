@@ -1,10 +1,13 @@
 import logging
+import os
 import pandas as pd
 import numpy as np
 from strategy import load_trained_model, trading_strategy, load_or_train_rl
 from risk_management import calculate_stop_loss_take_profit
 from data_fetching import get_historical_data
-from config import Config
+from config import get_config
+from multi_timeframe import align_higher_timeframe_trend, resample_ohlcv
+from futures_data import FuturesDataStore, align_futures_features
 from binance.client import Client
 from stable_baselines3 import PPO
 import matplotlib.pyplot as plt
@@ -26,24 +29,38 @@ def calculate_max_drawdown(equity_curve):
     return drawdowns.min()
 
 # Function to visualize equity curve
-def plot_equity_curve(equity_curve, title="Equity Curve"):
-    plt.figure(figsize=(12, 6))
+def plot_equity_curve(equity_curve, title="Equity Curve", path=None, show=True):
+    """
+    :param path: Save the figure as a PNG at this path.
+    :param show: Open a plot window (disable for jobs and headless runs).
+    """
+    figure = plt.figure(figsize=(12, 6))
     plt.plot(equity_curve, label='Equity Curve', color='blue')
     plt.title(title)
     plt.xlabel('Trades')
     plt.ylabel('Equity')
     plt.legend()
     plt.grid()
-    plt.show()
+    if path:
+        figure.savefig(path, dpi=100, bbox_inches='tight')
+    if show:
+        plt.show()
+    plt.close(figure)
 
 # Backtesting logic for a single pair
-def backtest_pair(df, xgboost_model, rl_model, pair, leverage=1, higher_timeframe_df=None):
+def backtest_pair(df, xgboost_model, rl_model, pair, leverage=1, higher_timeframe_df=None, indicator_mode="simple",
+                  futures_features=None):
     logger.info(f"Starting backtest for {pair} with leverage {leverage}...")
+    # Futures observations are aligned to every bar once; each bar only sees values known at its close
+    df = align_futures_features(df, futures_features)
+
     initial_balance = 100
     balance = initial_balance
     position_size = 0
     equity_curve = [initial_balance]
-    rewards = []
+
+    # Trend of the latest 4h candle closed before each bar, so no bar sees future higher timeframe data
+    higher_timeframe_trend = align_higher_timeframe_trend(df, higher_timeframe_df, higher_interval='4h')
 
     for i in range(1, len(df)):
         current_row = df.iloc[i]
@@ -54,7 +71,9 @@ def backtest_pair(df, xgboost_model, rl_model, pair, leverage=1, higher_timefram
             continue
 
         # Generate trading signal
-        signal = trading_strategy(df_with_features, higher_timeframe_df, xgboost_model, rl_model, mode="hybrid")
+        signal = trading_strategy(df_with_features, higher_timeframe_df, xgboost_model, rl_model, mode="hybrid",
+                                  higher_timeframe_trend=int(higher_timeframe_trend.iloc[i]),
+                                  indicator_mode=indicator_mode)
         current_price = current_row['close']
 
         if signal == 'BUY' and balance > 0:
@@ -64,7 +83,6 @@ def backtest_pair(df, xgboost_model, rl_model, pair, leverage=1, higher_timefram
 
         elif signal == 'SELL' and position_size > 0:
             balance = position_size * current_price
-            rewards.append(balance - initial_balance)  # Reward = Profit/Loss
             position_size = 0
             logger.info(f"SELL signal: Sold {pair} at {current_price}")
 
@@ -76,10 +94,6 @@ def backtest_pair(df, xgboost_model, rl_model, pair, leverage=1, higher_timefram
     profit_loss = final_balance - initial_balance
     logger.info(f"Backtest completed for {pair}. Initial balance: {initial_balance}, Final balance: {final_balance}")
 
-    # Train RL model on rewards
-    if rewards:
-        rl_model.learn(total_timesteps=len(rewards))
-
     return {
         'pair': pair,
         'initial_balance': initial_balance,
@@ -91,46 +105,78 @@ def backtest_pair(df, xgboost_model, rl_model, pair, leverage=1, higher_timefram
     }
 
 # Main backtesting function
-def run_backtest():
-    config = Config()
-    trading_pairs = config.get_trading_pairs()
+def run_backtest(output_dir=None, show_plots=True, progress=None, pairs=None):
+    """
+    Backtest every trading pair and summarize the results.
+
+    :param output_dir: Save equity curves (equity_<pair>.png) and the summary (summary.csv, summary.json) here.
+    :param show_plots: Open a plot window per pair.
+    :param progress: Optional callback(fraction, message) reporting progress.
+    :param pairs: Pairs to backtest instead of the configured trading pairs.
+    :return: Summary DataFrame, one row per pair.
+    """
+    config = get_config()
+    trading_pairs = pairs or config.get_trading_pairs()
+    report = progress or (lambda fraction, message: None)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
 
     api_key, api_secret = config.get_api_credentials()
     client = Client(api_key, api_secret)
 
+    report(0.0, "Loading models")
     xgboost_model = load_trained_model()
     rl_model = load_or_train_rl()
 
+    futures_settings = config.get_futures_data_settings()
+    futures_store = FuturesDataStore()
+
     all_results = []
 
-    for pair in trading_pairs:
+    for index, pair in enumerate(trading_pairs):
+        report(index / len(trading_pairs), f"Backtesting {pair}")
         df = get_historical_data(client, pair, '1h', '6 months ago UTC')
         if df is None or df.empty:
             logger.error(f"No data for {pair}. Skipping.")
             continue
 
-        # Fetch higher timeframe data for multi-timeframe analysis
-        higher_timeframe_df = get_historical_data(client, pair, interval='4h', lookback='6 months ago UTC')
+        # Derive higher timeframe data for multi-timeframe analysis from the same 1h series
+        higher_timeframe_df = resample_ohlcv(df, '4h')
 
         # Ensure sufficient data for features and indicators
         if len(df) < 22:  # Example threshold
             logger.error(f"Not enough data for {pair} to calculate features. Skipping this pair.")
             continue
 
+        futures_features = None
+        if futures_settings['enabled']:
+            futures_store.sync_symbol(client, pair, interval='1h', stats_period=futures_settings['history_stats_period'],
+                                      lookback=futures_settings['lookback'])
+            futures_features = futures_store.observations(pair, interval='1h',
+                                                          stats_period=futures_settings['history_stats_period'])
+
         leverage = config.get_leverage_settings(pair)
-        results = backtest_pair(df, xgboost_model, rl_model, pair, leverage, higher_timeframe_df=higher_timeframe_df)
+        results = backtest_pair(df, xgboost_model, rl_model, pair, leverage, higher_timeframe_df=higher_timeframe_df,
+                                indicator_mode=config.get_indicator_mode(), futures_features=futures_features)
         logger.info(f"Backtest results for {pair}: {results}")
 
         # Append results for later analysis
         all_results.append(results)
 
         # Plot equity curve
-        plot_equity_curve(results['equity_curve'], title=f"Equity Curve for {pair}")
+        plot_equity_curve(results['equity_curve'], title=f"Equity Curve for {pair}",
+                          path=os.path.join(output_dir, f"equity_{pair}.png") if output_dir else None, show=show_plots)
 
     # Aggregate results for summary
     summary_df = pd.DataFrame(all_results)
     logger.info("Backtesting Summary:")
     logger.info(summary_df)
+    if output_dir and not summary_df.empty:
+        summary = summary_df.drop(columns=['equity_curve'])
+        summary.to_csv(os.path.join(output_dir, 'summary.csv'), index=False)
+        summary.to_json(os.path.join(output_dir, 'summary.json'), orient='records', indent=2)
+    report(1.0, "Backtest completed")
+    return summary_df
 
 if __name__ == "__main__":
     run_backtest()
\ No newline at end of file
@@ -0,0 +1,248 @@
+# benchmark.py
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')  # Backtests must never open plot windows while benchmarking
+
+import numpy as np
+import pandas as pd
+
+from data_handler import add_features
+from feature_graph import FEATURE_GRAPHS
+from data_fetching import parse_kline_message
+from strategy import trading_strategy, TradingEnvironment, FEATURE_COLUMNS
+from backtest import backtest_pair
+from candle_buffer import CandleRingBuffer, DEFAULT_CAPACITY
+from portfolio_risk import PortfolioRiskEngine
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_THRESHOLD = 1.25  # Fail when a case is 25% slower than its baseline
+ENV_STEPS = 10_000
+WEBSOCKET_MESSAGES = 1_000
+
+# Synthetic OHLCV generator
+def generate_ohlcv(rows, seed=42, start='2020-01-01', freq='1min', start_price=30000.0):
+    """
+    Generate a reproducible OHLCV DataFrame following a geometric random walk.
+
+    :param rows: Number of candles to generate.
+    :param seed: Random seed, so every run benchmarks identical data.
+    :param start: Timestamp of the first candle.
+    :param freq: Candle frequency as a pandas offset alias.
+    :param start_price: Price of the first candle.
+    :return: Pandas DataFrame indexed by open_time.
+    """
+    rng = np.random.default_rng(seed)
+    log_returns = rng.normal(0, 0.001, rows)
+    close = start_price * np.exp(np.cumsum(log_returns))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.0008, rows)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(3, 1, rows)
+    index = pd.date_range(start=start, periods=rows, freq=freq, name='open_time')
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+
+# Synthetic kline WebSocket messages
+def generate_kline_messages(df, symbol='BTCUSDT', interval='1m'):
+    messages = []
+    for open_time, row in zip(df.index.asi8 // 1_000_000, df.itertuples(index=False)):
+        messages.append({
+            'e': 'kline',
+            's': symbol,
+            'k': {
+                't': int(open_time), 'i': interval, 'o': str(row.open), 'h': str(row.high),
+                'l': str(row.low), 'c': str(row.close), 'v': str(row.volume), 'x': True
+            }
+        })
+    return messages
+
+# Stubbed models so benchmarks run offline and only measure the bot's own code
+class StubXGBoostModel:
+    def predict(self, X):
+        return np.zeros(len(X), dtype=int)
+
+class StubRLModel:
+    def predict(self, observation, deterministic=True):
+        return np.zeros(len(observation), dtype=int), None
+
+    def learn(self, total_timesteps):
+        return self
+
+# Benchmark cases: (name, setup(df) -> state, run(state), max_rows)
+def _feature_case(indicator_mode, name):
+    # One feature node with the nodes it depends on, as add_features computes it
+    graph = FEATURE_GRAPHS[indicator_mode]
+    return (f"feature.{indicator_mode}.{name}", lambda df: df.copy(), lambda df: graph.evaluate(df, [name]), None)
+
+def _trading_strategy_setup(df):
+    return df.copy(), generate_ohlcv(1000, seed=7, freq='4h'), StubXGBoostModel(), StubRLModel()
+
+def _environment_setup(df):
+    env = TradingEnvironment(add_features(df.copy()).dropna())
+    env.reset()
+    return env
+
+def _environment_run(env):
+    steps = min(ENV_STEPS, len(env.data) - 2)
+    env.reset()
+    for step in range(steps):
+        env.step(step % 3)
+
+def _backtest_setup(df):
+    return df.copy(), StubXGBoostModel(), StubRLModel(), generate_ohlcv(1000, seed=7, freq='4h')
+
+def _backtest_run(state):
+    df, xgboost_model, rl_model, higher_timeframe_df = state
+    backtest_pair(df, xgboost_model, rl_model, 'BENCH', higher_timeframe_df=higher_timeframe_df)
+
+def _candle_buffer_setup(df):
+    rows = [(open_time, *values) for open_time, values in
+            zip(df.index.asi8 // 1_000_000, df[['open', 'high', 'low', 'close', 'volume']].itertuples(index=False))]
+    return CandleRingBuffer(DEFAULT_CAPACITY), rows
+
+def _candle_buffer_run(state):
+    # One in-progress update and one close per candle, plus a strategy-sized window read
+    buffer, rows = state
+    for row in rows:
+        buffer.update(*row, is_closed=False)
+        buffer.update(*row, is_closed=True)
+        buffer.window(60)
+
+def _portfolio_risk_setup(df, n_symbols=100):
+    # Covariance of 100 symbols seeded from shifted copies of the series, with open positions everywhere
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    closes = pd.DataFrame({symbol: np.roll(df['close'].to_numpy(), i) for i, symbol in enumerate(symbols)}, index=df.index)
+    engine = PortfolioRiskEngine(symbols)
+    engine.seed(closes)
+    for symbol in symbols:
+        engine.set_position(symbol, 0.01, float(closes[symbol].iloc[-1]), leverage=20)
+    return engine, symbols, float(df['close'].iloc[-1])
+
+def _portfolio_risk_run(state):
+    # One pre-trade check per candle, as made before each order
+    engine, symbols, price = state
+    for i in range(1_000):
+        engine.check_order(symbols[i % len(symbols)], 0.05, price, 20, 100_000.0)
+
+def build_cases():
+    # Modes share most nodes; each shared node is timed once
+    cases = [_feature_case(indicator_mode, name) for indicator_mode, graph in FEATURE_GRAPHS.items() for name in graph.outputs
+             if indicator_mode == 'simple' or graph.nodes[name] is not FEATURE_GRAPHS['simple'].nodes.get(name)]
+    cases += [
+        ('add_features', lambda df: df.copy(), add_features, None),
+        ('add_features.model_columns', lambda df: df.copy(), lambda df: add_features(df, columns=FEATURE_COLUMNS), None),
+        ('trading_strategy', _trading_strategy_setup, lambda state: trading_strategy(*state, mode="hybrid"), 100_000),
+        ('TradingEnvironment.step', _environment_setup, _environment_run, 100_000),
+        ('backtest_pair', _backtest_setup, _backtest_run, 1_000),  # O(n^2): one strategy call per bar
+        ('websocket.parse_kline_message',
+         lambda df: generate_kline_messages(df.iloc[:WEBSOCKET_MESSAGES]),
+         lambda messages: [parse_kline_message(msg) for msg in messages], WEBSOCKET_MESSAGES),
+        ('candle_buffer.update', _candle_buffer_setup, _candle_buffer_run, 100_000),
+        ('portfolio_risk.check_order', _portfolio_risk_setup, _portfolio_risk_run, 10_000),
+    ]
+    return cases
+
+# Time a single case
+def run_case(setup, run, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        state = setup(df)
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'repeat': repeat}
+
+def run_benchmarks(sizes=None, name_filter=None, repeat=None):
+    """
+    Run every benchmark case for each data size.
+
+    :param sizes: List of row counts for the synthetic OHLCV data.
+    :param name_filter: Only run cases whose name contains this substring.
+    :param repeat: Number of timed runs per case (defaults to fewer runs for larger inputs).
+    :return: Dictionary mapping "<case>[<rows>]" to timing statistics.
+    """
+    results = {}
+    for size in sizes or DEFAULT_SIZES:
+        base_df = generate_ohlcv(size)
+        for name, setup, run, max_rows in build_cases():
+            if name_filter and name_filter not in name:
+                continue
+            rows = min(size, max_rows) if max_rows else size
+            key = f"{name}[{rows}]"
+            if key in results:
+                continue
+            runs = repeat or (5 if rows <= 10_000 else 3 if rows <= 100_000 else 1)
+            results[key] = run_case(setup, run, base_df.iloc[:rows], runs)
+            logger.warning(f"{key}: median {results[key]['median_s'] * 1000:.2f} ms")
+    return results
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file).get('results', {})
+
+def save_baseline(results, path=BASELINE_FILE):
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, 'w') as baseline_file:
+        json.dump({'python': sys.version.split()[0], 'pandas': pd.__version__, 'numpy': np.__version__,
+                   'results': baseline}, baseline_file, indent=2, sort_keys=True)
+    logger.warning(f"Baseline saved to {path} ({len(results)} cases).")
+
+def compare_with_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results with the stored baseline.
+
+    :return: List of (case, baseline_s, current_s, ratio) tuples for cases slower than the threshold.
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+        reference = baseline[key]['median_s']
+        ratio = result['median_s'] / reference if reference > 0 else 1.0
+        status = "REGRESSION" if ratio > threshold else "ok"
+        print(f"{key:<50} {reference * 1000:>10.2f} ms -> {result['median_s'] * 1000:>10.2f} ms  x{ratio:.2f}  {status}")
+        if ratio > threshold:
+            regressions.append((key, reference, result['median_s'], ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indicators, strategy and backtests on synthetic data.")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated synthetic data sizes in rows.")
+    parser.add_argument('--filter', default=None, help="Only run cases whose name contains this substring.")
+    parser.add_argument('--repeat', type=int, default=None, help="Timed runs per case.")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline.")
+    parser.add_argument('--compare', action='store_true', help="Fail if any case regresses past the threshold.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown ratio against the baseline.")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Path of the baseline file.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    results = run_benchmarks(sizes, args.filter, args.repeat)
+
+    if args.compare:
+        regressions = compare_with_baseline(results, load_baseline(args.baseline), args.threshold)
+        if regressions:
+            logger.error(f"{len(regressions)} benchmark(s) regressed by more than x{args.threshold}.")
+            sys.exit(1)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import logging
+import threading
+from collections import deque
+import pandas as pd
+from multi_timeframe import interval_to_timedelta, resample_ohlcv
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVALS = ['5m', '15m', '1h', '4h', '1d']
+CANDLE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+class _Bar:
+    __slots__ = ('open_time', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, open_time, open_, high, low, close, volume):
+        self.open_time = open_time
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def as_tuple(self):
+        return (self.open_time, self.open, self.high, self.low, self.close, self.volume)
+
+# Streaming aggregation of one base series into several higher timeframes
+class CandleAggregator:
+    """
+    Derives coarser candles (e.g. 5m, 1h, 4h, 1d) from a single base kline stream.
+
+    Each closed base candle is folded into the open bar of every target interval in O(1).
+    A bar is emitted once the base candle covering the end of its period has closed, or
+    when a candle from a later period arrives (e.g. after a gap). The still-open base candle
+    can be included on demand with current().
+    """
+    def __init__(self, base_interval='1m', intervals=None, history=500, on_close=None):
+        """
+        :param base_interval: Interval of the incoming base candles.
+        :param intervals: Target intervals; each must be a whole multiple of the base interval.
+        :param history: Number of closed bars kept per interval.
+        :param on_close: Optional callback(interval, bar) called with (open_time_ms, open, high, low, close, volume).
+        """
+        self.base_interval = base_interval
+        self.base_ms = int(interval_to_timedelta(base_interval).total_seconds() * 1000)
+        self.periods = {}
+        for interval in intervals or DEFAULT_INTERVALS:
+            period_ms = int(interval_to_timedelta(interval).total_seconds() * 1000)
+            if period_ms <= self.base_ms or period_ms % self.base_ms:
+                raise ValueError(f"Interval {interval} is not a multiple of base interval {base_interval}.")
+            self.periods[interval] = period_ms
+        self.bars = {interval: None for interval in self.periods}
+        self.history = {interval: deque(maxlen=history) for interval in self.periods}
+        self.on_close = on_close
+        self.last_open_time = None
+        self.partial = None
+        self._lock = threading.Lock()
+
+    def update(self, open_time, open_, high, low, close, volume, is_closed=True):
+        """
+        Feed one base candle.
+
+        :param open_time: Candle open time in milliseconds since the epoch.
+        :param is_closed: False for in-progress updates of the current base candle.
+        :return: List of (interval, bar) tuples closed by this update.
+        """
+        open_time = int(open_time)
+        closed = []
+        with self._lock:
+            if not is_closed:
+                self.partial = _Bar(open_time, float(open_), float(high), float(low), float(close), float(volume))
+                return closed
+            if self.last_open_time is not None and open_time <= self.last_open_time:
+                return closed
+            self.last_open_time = open_time
+            self.partial = None
+
+            for interval, period in self.periods.items():
+                bucket = open_time - open_time % period
+                bar = self.bars[interval]
+                if bar is not None and bar.open_time != bucket:
+                    closed.append(self._close(interval, bar))
+                    bar = None
+                if bar is None:
+                    bar = _Bar(bucket, float(open_), float(high), float(low), float(close), float(volume))
+                    self.bars[interval] = bar
+                else:
+                    bar.high = max(bar.high, float(high))
+                    bar.low = min(bar.low, float(low))
+                    bar.close = float(close)
+                    bar.volume += float(volume)
+                if open_time + self.base_ms >= bucket + period:
+                    closed.append(self._close(interval, bar))
+
+        if self.on_close:
+            for interval, bar in closed:
+                try:
+                    self.on_close(interval, bar)
+                except Exception as e:
+                    logger.error(f"Error in candle close callback for {interval}: {e}")
+        return closed
+
+    def _close(self, interval, bar):
+        self.bars[interval] = None
+        closed_bar = bar.as_tuple()
+        self.history[interval].append(closed_bar)
+        return interval, closed_bar
+
+    def seed(self, interval, df):
+        """
+        Load closed bars of one interval (e.g. from a REST fetch of that interval) into its history.
+        Base candles inside the seeded bars are ignored afterwards.
+
+        :param df: Closed OHLCV bars of the interval, indexed by open_time.
+        """
+        if df is None or df.empty:
+            return
+        open_times = df.index.asi8 // 1_000_000
+        with self._lock:
+            for open_time, row in zip(open_times, df[CANDLE_COLUMNS].itertuples(index=False)):
+                self.history[interval].append((int(open_time), *(float(value) for value in row)))
+            self.bars[interval] = None
+            last_base = int(open_times[-1]) + self.periods[interval] - self.base_ms
+            self.last_open_time = max(self.last_open_time or last_base, last_base)
+
+    def update_from_frame(self, df):
+        """
+        Feed every candle of a closed base OHLCV DataFrame indexed by open_time.
+        """
+        if df is None or df.empty:
+            return
+        open_times = df.index.asi8 // 1_000_000
+        for open_time, row in zip(open_times, df[CANDLE_COLUMNS].itertuples(index=False)):
+            self.update(open_time, *row)
+
+    def current(self, interval):
+        """
+        Return the in-progress bar of an interval, including the open base candle, or None.
+        """
+        with self._lock:
+            period = self.periods[interval]
+            bar = self.bars[interval]
+            partial = self.partial
+            if partial is None or (self.last_open_time is not None and partial.open_time <= self.last_open_time):
+                return bar.as_tuple() if bar else None
+            bucket = partial.open_time - partial.open_time % period
+            if bar is None or bar.open_time != bucket:
+                return (bucket, partial.open, partial.high, partial.low, partial.close, partial.volume)
+            return (bar.open_time, bar.open, max(bar.high, partial.high), min(bar.low, partial.low),
+                    partial.close, bar.volume + partial.volume)
+
+    def to_frame(self, interval, include_current=False):
+        """
+        Return the closed bars of an interval as an OHLCV DataFrame indexed by open_time.
+        """
+        with self._lock:
+            rows = list(self.history[interval])
+        if include_current:
+            current = self.current(interval)
+            if current is not None:
+                rows.append(current)
+        df = pd.DataFrame(rows, columns=['open_time'] + CANDLE_COLUMNS)
+        df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
+        return df.set_index('open_time')
+
+# Batch aggregation for backtests and training
+def aggregate_frame(df, intervals=None, drop_incomplete=True):
+    """
+    Derive several higher timeframes from one base OHLCV DataFrame.
+
+    Bars are aligned to the epoch exactly like CandleAggregator, so batch and streaming
+    results match.
+
+    :return: Dictionary mapping each interval to its OHLCV DataFrame.
+    """
+    return {interval: resample_ohlcv(df, interval, drop_incomplete=drop_incomplete)
+            for interval in intervals or DEFAULT_INTERVALS}
+
+def warmup_minutes(interval, bars, base_interval='1m'):
+    """
+    Minutes of base history needed to build `bars` closed candles of `interval`.
+    """
+    period = interval_to_timedelta(interval)
+    base = interval_to_timedelta(base_interval)
+    return int(((bars + 1) * period + base).total_seconds() // 60)
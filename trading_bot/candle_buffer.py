@@ -0,0 +1,158 @@
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CANDLE_DTYPE = np.dtype([
+    ('open_time', np.int64),  # Milliseconds since the epoch
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+])
+CANDLE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+DEFAULT_CAPACITY = 1440  # One day of 1m candles
+
+class CandleRingBuffer:
+    """
+    Fixed-capacity candle history for one symbol, backed by a NumPy structured array.
+
+    Every row is written twice, at position i and i + capacity of a 2 * capacity array, so
+    the latest n rows are always one contiguous slice: window() returns a view without
+    copying, and memory stays constant however long the buffer runs. An update with the
+    open time of the latest row replaces it in place (the in-progress candle).
+
+    Views alias the buffer and change as candles arrive; use to_frame() or copy the view
+    for a stable snapshot.
+    """
+    __slots__ = ('symbol', 'capacity', '_data', '_position', '_size', '_last_closed', '_lock')
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, symbol=None):
+        self.symbol = symbol
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=CANDLE_DTYPE)
+        self._position = -1  # Index of the latest row in [0, capacity)
+        self._size = 0
+        self._last_closed = True
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _write(self, index, row):
+        self._data[index] = row
+        self._data[index + self.capacity] = row
+
+    def update(self, open_time, open_, high, low, close, volume, is_closed=True):
+        """
+        Append a candle, or replace the latest one if it has the same open time.
+
+        :param open_time: Candle open time in milliseconds since the epoch.
+        :param is_closed: False while the candle is still in progress.
+        :return: False if the candle is older than the latest one and was ignored.
+        """
+        open_time = int(open_time)
+        row = (open_time, float(open_), float(high), float(low), float(close), float(volume))
+        with self._lock:
+            if self._size:
+                latest_time = int(self._data['open_time'][self._position])
+                if open_time < latest_time:
+                    return False
+                if open_time == latest_time:
+                    self._write(self._position, row)
+                    self._last_closed = is_closed
+                    return True
+            self._position = (self._position + 1) % self.capacity
+            self._write(self._position, row)
+            self._size = min(self._size + 1, self.capacity)
+            self._last_closed = is_closed
+        return True
+
+    def extend_from_frame(self, df, last_closed=True):
+        """
+        Load candles from an OHLCV DataFrame indexed by open_time, newer than the latest row.
+        """
+        if df is None or df.empty:
+            return
+        open_times = df.index.asi8 // 1_000_000
+        with self._lock:
+            if self._size:
+                keep = open_times > self._data['open_time'][self._position]
+                df, open_times = df[keep], open_times[keep]
+            rows = np.empty(min(len(df), self.capacity), dtype=CANDLE_DTYPE)
+            if not len(rows):
+                return
+            rows['open_time'] = open_times[-len(rows):]
+            for column in CANDLE_COLUMNS:
+                rows[column] = df[column].to_numpy(dtype=np.float64)[-len(rows):]
+            indices = (self._position + 1 + np.arange(len(rows))) % self.capacity
+            self._data[indices] = rows
+            self._data[indices + self.capacity] = rows
+            self._position = int(indices[-1])
+            self._size = min(self._size + len(rows), self.capacity)
+            self._last_closed = last_closed
+
+    def window(self, n=None, closed_only=False):
+        """
+        Return the latest n candles (all buffered candles by default), oldest first, as a
+        zero-copy structured-array view.
+
+        :param closed_only: Exclude the latest candle while it is still in progress.
+        """
+        with self._lock:
+            return self._window(n, closed_only)
+
+    def _window(self, n, closed_only):
+        size, end = self._size, self._position + self.capacity + 1
+        if closed_only and size and not self._last_closed:
+            size, end = size - 1, end - 1
+        n = size if n is None else min(n, size)
+        return self._data[end - n:end]
+
+    def latest(self):
+        """
+        :return: The latest candle as a structured scalar, or None.
+        """
+        with self._lock:
+            return self._data[self._position].copy() if self._size else None
+
+    def to_frame(self, n=None, closed_only=False):
+        """
+        Return the latest n candles as an OHLCV DataFrame indexed by open_time (a copy).
+        """
+        with self._lock:
+            view = self._window(n, closed_only).copy()
+        index = pd.DatetimeIndex(pd.to_datetime(view['open_time'], unit='ms'), name='open_time')
+        return pd.DataFrame({column: view[column] for column in CANDLE_COLUMNS}, index=index)
+
+class CandleBufferSet:
+    """
+    One CandleRingBuffer per symbol, fed from kline WebSocket updates.
+    """
+    __slots__ = ('capacity', 'buffers')
+
+    def __init__(self, symbols=(), capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.buffers = {symbol: CandleRingBuffer(capacity, symbol) for symbol in symbols}
+
+    def get(self, symbol):
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            buffer = self.buffers.setdefault(symbol, CandleRingBuffer(self.capacity, symbol))
+        return buffer
+
+    def on_kline(self, symbol, open_time, open_, high, low, close, volume, is_closed):
+        """
+        Kline callback with the signature of start_websocket's on_kline.
+        """
+        self.get(symbol).update(open_time, open_, high, low, close, volume, is_closed)
+
+    def seed(self, symbol, df, last_closed=True):
+        self.get(symbol).extend_from_frame(df, last_closed)
+
+    def to_frame(self, symbol, n=None, closed_only=False):
+        buffer = self.buffers.get(symbol)
+        return buffer.to_frame(n, closed_only) if buffer is not None and len(buffer) else pd.DataFrame()
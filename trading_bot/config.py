@@ -1,36 +1,180 @@
 import json
 import os
 import logging
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_WATCH_INTERVAL = 2.0  # Seconds between config.json modification checks
+
+@dataclass(frozen=True)
+class PairSettings:
+    """Risk and strategy settings of one trading pair, with defaults already applied."""
+    leverage: int
+    risk_percentage: float
+    strategy: str
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Validated, immutable view of config.json. Config swaps the whole snapshot on reload, so a
+    reader never sees settings from two different versions of the file.
+    """
+    data: MappingProxyType
+    default_pair: PairSettings
+    pairs: MappingProxyType  # symbol -> PairSettings
+    risk_factor: float
+    reward_factor: float
+    min_risk_to_reward: float
+    indicator_mode: str
+    version: tuple  # (mtime_ns, size) of the file it was loaded from
+
+    def pair(self, symbol=None):
+        return self.pairs.get(symbol, self.default_pair)
+
+def _check(errors, condition, message):
+    if not condition:
+        errors.append(message)
+
+def _pair_settings(errors, name, settings, default=None):
+    leverage = settings.get('leverage', default.leverage if default else 20)
+    risk_percentage = settings.get('risk_percentage', default.risk_percentage if default else 0.01)
+    strategy = settings.get('strategy', default.strategy if default else 'hybrid')
+    _check(errors, isinstance(leverage, int) and not isinstance(leverage, bool) and 1 <= leverage <= 125,
+           f"{name}: leverage must be an integer between 1 and 125, got {leverage!r}")
+    _check(errors, isinstance(risk_percentage, (int, float)) and 0 < risk_percentage <= 1,
+           f"{name}: risk_percentage must be in (0, 1], got {risk_percentage!r}")
+    _check(errors, isinstance(strategy, str), f"{name}: strategy must be a string, got {strategy!r}")
+    return PairSettings(leverage, float(risk_percentage), strategy)
+
+def build_snapshot(config_data, version=None):
+    """
+    Validate configuration data and precompute the per-pair settings.
+
+    :raises ValueError: Listing every invalid setting.
+    """
+    errors = []
+    pairs = config_data.get('trading_pairs')
+    _check(errors, isinstance(pairs, list) and pairs and all(isinstance(pair, str) for pair in pairs),
+           "trading_pairs must be a non-empty list of symbols")
+    default_pair = _pair_settings(errors, 'defaults', {
+        'leverage': config_data.get('default_leverage', 20),
+        'risk_percentage': config_data.get('default_risk_percentage', 0.01),
+        'strategy': config_data.get('default_strategy', 'hybrid'),
+    })
+    pair_specific = config_data.get('pair_specific', {})
+    _check(errors, isinstance(pair_specific, dict), "pair_specific must be an object keyed by symbol")
+    pair_settings = {}
+    if isinstance(pair_specific, dict):
+        for symbol, settings in pair_specific.items():
+            if isinstance(settings, dict):
+                pair_settings[symbol] = _pair_settings(errors, f"pair_specific.{symbol}", settings, default_pair)
+            else:
+                errors.append(f"pair_specific.{symbol} must be an object")
+    factors = {name: config_data.get(name, default) for name, default in
+               (('default_risk_factor', 2), ('default_reward_factor', 6), ('min_risk_to_reward', 3))}
+    for name, value in factors.items():
+        _check(errors, isinstance(value, (int, float)) and value > 0, f"{name} must be positive, got {value!r}")
+    indicator_mode = config_data.get('indicator_mode', 'simple')
+    _check(errors, indicator_mode in ('simple', 'wilder'), f"indicator_mode must be 'simple' or 'wilder', got {indicator_mode!r}")
+    users = config_data.get('authorized_users', [])
+    _check(errors, isinstance(users, list) and all(isinstance(user, int) for user in users),
+           "authorized_users must be a list of Telegram user ids")
+    if errors:
+        raise ValueError("Invalid configuration: " + "; ".join(errors))
+    return ConfigSnapshot(
+        data=MappingProxyType(config_data), default_pair=default_pair, pairs=MappingProxyType(pair_settings),
+        risk_factor=factors['default_risk_factor'], reward_factor=factors['default_reward_factor'],
+        min_risk_to_reward=factors['min_risk_to_reward'], indicator_mode=indicator_mode, version=version
+    )
+
 class Config:
+    """
+    Settings from config.json.
+
+    The file is validated once per load into a ConfigSnapshot; getters read the current snapshot,
+    so per-pair lookups are a single dict access. With watch(), changes to the file are picked
+    up in the background and swapped in atomically; an invalid file is logged and ignored.
+    """
     def __init__(self):
         self.config_file_path = os.path.join(os.path.dirname(__file__), 'config.json')
-        self.config_data = {}
+        self.snapshot = None
+        self._listeners = []
+        self._watch_thread = None
+        self._stop_event = threading.Event()
         self.load_config()
 
+    @property
+    def config_data(self):
+        return self.snapshot.data
+
+    def _file_version(self):
+        stat = os.stat(self.config_file_path)
+        return stat.st_mtime_ns, stat.st_size
+
     def load_config(self):
         """
         Load configuration from the JSON file.
         """
         try:
+            version = self._file_version()
             with open(self.config_file_path) as config_file:
-                self.config_data = json.load(config_file)
-                logger.info("Configuration loaded successfully.")
+                snapshot = build_snapshot(json.load(config_file), version)
         except Exception as e:
             logger.error(f"Error loading configuration: {e}")
             raise
+        self.snapshot = snapshot  # A single reference assignment, so readers switch atomically
+        logger.info("Configuration loaded successfully.")
 
     def reload_config(self):
         """
-        Reload the configuration file dynamically.
+        Reload the configuration file dynamically. The current settings stay in effect if the file is invalid.
         """
         try:
+            previous = self.snapshot
             self.load_config()
             logger.info("Configuration reloaded successfully.")
         except Exception as e:
             logger.error(f"Error reloading configuration: {e}")
+            return False
+        for listener in self._listeners:
+            try:
+                listener(previous, self.snapshot)
+            except Exception as e:
+                logger.error(f"Configuration reload listener failed: {e}")
+        return True
+
+    def add_listener(self, listener):
+        """
+        :param listener: Called as listener(previous, current) with ConfigSnapshots after each successful reload.
+        """
+        self._listeners.append(listener)
+
+    def watch(self, interval=DEFAULT_WATCH_INTERVAL):
+        """
+        Reload the configuration whenever config.json changes, checked every interval seconds.
+        """
+        if self._watch_thread is not None:
+            return
+
+        def run():
+            rejected = None  # Version that failed validation, reported once rather than on every check
+            while not self._stop_event.wait(interval):
+                try:
+                    version = self._file_version()
+                    if version not in (self.snapshot.version, rejected) and not self.reload_config():
+                        rejected = version
+                except OSError as e:
+                    logger.warning(f"Cannot check {self.config_file_path}: {e}")
+
+        self._watch_thread = threading.Thread(target=run, name='config-watcher', daemon=True)
+        self._watch_thread.start()
+        logger.info(f"Watching {self.config_file_path} for changes.")
+
+    def stop_watching(self):
+        self._stop_event.set()
 
     # Fetch API credentials
     def get_api_credentials(self):
@@ -40,35 +184,33 @@ class Config:
     def get_trading_pairs(self):
         return self.config_data['trading_pairs']
 
+    # Fetch all settings of a pair (defaults for pairs without pair_specific settings)
+    def get_pair_settings(self, pair=None):
+        return self.snapshot.pair(pair)
+
     # Fetch leverage settings
     def get_leverage_settings(self, pair=None):
-        if pair and 'pair_specific' in self.config_data and pair in self.config_data['pair_specific']:
-            return self.config_data['pair_specific'][pair].get('leverage', self.config_data['default_leverage'])
-        return self.config_data.get('default_leverage', 20)
+        return self.snapshot.pair(pair).leverage
 
     # Fetch risk percentage
     def get_risk_percentage(self, pair=None):
-        if pair and 'pair_specific' in self.config_data and pair in self.config_data['pair_specific']:
-            return self.config_data['pair_specific'][pair].get('risk_percentage', self.config_data['default_risk_percentage'])
-        return self.config_data.get('default_risk_percentage', 0.01)
+        return self.snapshot.pair(pair).risk_percentage
 
     # Fetch risk factor
     def get_risk_factor(self):
-        return self.config_data.get('default_risk_factor', 2)
+        return self.snapshot.risk_factor
 
     # Fetch reward factor
     def get_reward_factor(self):
-        return self.config_data.get('default_reward_factor', 6)
+        return self.snapshot.reward_factor
 
     # Fetch minimum risk-to-reward ratio
     def get_min_risk_to_reward(self):
-        return self.config_data.get('min_risk_to_reward', 3)
+        return self.snapshot.min_risk_to_reward
 
     # Fetch trading strategy
     def get_strategy(self, pair=None):
-        if pair and 'pair_specific' in self.config_data and pair in self.config_data['pair_specific']:
-            return self.config_data['pair_specific'][pair].get('strategy', self.config_data['default_strategy'])
-        return self.config_data.get('default_strategy', 'hybrid')
+        return self.snapshot.pair(pair).strategy
 
     # Fetch polling interval
     def get_polling_interval(self):
@@ -96,6 +238,178 @@ class Config:
     def get_model_adjustments(self, model_type):
         return self.config_data['model_adjustments'].get(model_type, {})
 
+    # Fetch indicator mode ('simple' rolling means or 'wilder' smoothing)
+    def get_indicator_mode(self):
+        return self.snapshot.indicator_mode
+
+    # Fetch order-flow feature settings
+    def get_order_flow_settings(self):
+        settings = self.config_data.get('order_flow', {})
+        return {
+            'enabled': settings.get('enabled', False),
+            'default_vpin_bucket_volume': settings.get('default_vpin_bucket_volume', 100),
+            'vpin_bucket_volume': settings.get('vpin_bucket_volume', {}),
+            'vpin_window': settings.get('vpin_window', 50)
+        }
+
+    # Fetch pooled multi-symbol training settings
+    def get_pooled_training_settings(self):
+        settings = self.config_data.get('pooled_training', {})
+        return {
+            'intervals': settings.get('intervals', ['1h']),
+            'lookback': settings.get('lookback', '2 months ago UTC'),
+            'chunk_rows': settings.get('chunk_rows', 250000),
+            'external_memory_dir': settings.get('external_memory_dir') or None
+        }
+
+    # Fetch XGBoost hyperparameter search settings (n_workers 0 uses every core)
+    def get_hyperparameter_search_settings(self):
+        settings = self.config_data.get('hyperparameter_search', {})
+        return {
+            'method': settings.get('method', 'successive_halving'),
+            'interval': settings.get('interval', '1h'),
+            'lookback': settings.get('lookback', '12 months ago UTC'),
+            'n_trials': settings.get('n_trials', 32),
+            'n_splits': settings.get('n_splits', 5),
+            'min_estimators': settings.get('min_estimators', 50),
+            'max_estimators': settings.get('max_estimators', 400),
+            'eta': settings.get('eta', 3),
+            'n_workers': settings.get('n_workers') or None,
+            'seed': settings.get('seed', 42)
+        }
+
+    # Fetch parallel PPO training settings (timesteps and policy come from model_adjustments)
+    def get_rl_training_settings(self):
+        settings = self.config_data.get('rl_training', {})
+        rl_adjustments = self.get_model_adjustments('rl')
+        return {
+            'total_timesteps': rl_adjustments.get('training_timesteps', 50000),
+            'policy': rl_adjustments.get('policy_type', 'MlpPolicy'),
+            'n_envs': settings.get('n_envs', 4),
+            'windows_per_symbol': settings.get('windows_per_symbol', 4),
+            'interval': settings.get('interval', '1h'),
+            'lookback': settings.get('lookback', '12 months ago UTC'),
+            'checkpoint_freq': settings.get('checkpoint_freq', 10000),
+            'use_subprocesses': settings.get('use_subprocesses', True)
+        }
+
+    # Fetch shadow evaluation settings for candidate models
+    def get_shadow_settings(self):
+        settings = self.config_data.get('shadow_mode', {})
+        return {
+            'enabled': settings.get('enabled', False),
+            'retrain_candidate': settings.get('retrain_candidate', 'retrained'),
+            'candidates': settings.get('candidates', []),
+            'queue_size': settings.get('queue_size', 256),
+            'log_path': settings.get('log_path', 'shadow_log.jsonl'),
+            'summary_path': settings.get('summary_path', 'shadow_summary.json')
+        }
+
+    # Fetch config.json hot reload settings (interval in seconds between file checks)
+    def get_config_reload_settings(self):
+        settings = self.config_data.get('config_reload', {})
+        return {
+            'enabled': settings.get('enabled', False),
+            'interval': settings.get('interval', DEFAULT_WATCH_INTERVAL)
+        }
+
+    # Fetch live dashboard feed settings (socket bound by the web app, account polled every account_interval seconds)
+    def get_live_feed_settings(self):
+        settings = self.config_data.get('live_feed', {})
+        socket_path = settings.get('socket_path', 'live_feed.sock')
+        if not os.path.isabs(socket_path):
+            socket_path = os.path.join(os.path.dirname(__file__), socket_path)
+        return {
+            'enabled': settings.get('enabled', False),
+            'socket_path': socket_path,
+            'account_interval': settings.get('account_interval', 5),
+            'max_clients': settings.get('max_clients', 100)
+        }
+
+    # Fetch trade history recording settings (an empty database_path uses the web app's site.db)
+    def get_trade_recorder_settings(self):
+        settings = self.config_data.get('trade_recorder', {})
+        return {
+            'enabled': settings.get('enabled', False),
+            'database_path': settings.get('database_path') or None,
+            'batch_size': settings.get('batch_size', 500),
+            'flush_interval': settings.get('flush_interval', 1.0),
+            'fill_sync_seconds': settings.get('fill_sync_seconds', 10)
+        }
+
+    # Fetch backtest/retrain job queue settings (embedded_runner runs jobs inside the Telegram bot process)
+    def get_job_queue_settings(self):
+        settings = self.config_data.get('job_queue', {})
+        return {
+            'workers': settings.get('workers', 2),
+            'memory_limit_mb': settings.get('memory_limit_mb', 4096),
+            'cpu_time_limit_s': settings.get('cpu_time_limit_s', 3600),
+            'timeout_s': settings.get('timeout_s', 7200),
+            'embedded_runner': settings.get('embedded_runner', True)
+        }
+
+    # Fetch control plane settings (relative socket paths are inside the trading_bot directory)
+    def get_control_plane_settings(self):
+        settings = self.config_data.get('control_plane', {})
+        socket_path = settings.get('socket_path', 'trading_bot.sock')
+        if not os.path.isabs(socket_path):
+            socket_path = os.path.join(os.path.dirname(__file__), socket_path)
+        lock_path = settings.get('lock_path', 'trading_bot.lock')
+        if not os.path.isabs(lock_path):
+            lock_path = os.path.join(os.path.dirname(__file__), lock_path)
+        return {
+            'enabled': settings.get('enabled', False),
+            'socket_path': socket_path,
+            'lock_path': lock_path,
+            'authkey': settings.get('authkey') or None,
+            'timeout': settings.get('timeout', 5)
+        }
+
+    # Fetch portfolio risk limits (VaR horizon in 1m candles, limits as fractions of equity)
+    def get_portfolio_risk_settings(self):
+        settings = self.config_data.get('portfolio_risk', {})
+        return {
+            'enabled': settings.get('enabled', False),
+            'decay': settings.get('decay', 0.94),
+            'confidence': settings.get('confidence', 0.99),
+            'horizon_bars': settings.get('horizon_bars', 60),
+            'max_var_fraction': settings.get('max_var_fraction', 0.05),
+            'max_margin_fraction': settings.get('max_margin_fraction', 0.5),
+            'min_order_fraction': settings.get('min_order_fraction', 0.1),
+            'reconcile_seconds': settings.get('reconcile_seconds', 5)
+        }
+
+    # Fetch futures data (funding, open interest, long/short ratio, mark price) settings
+    def get_futures_data_settings(self):
+        settings = self.config_data.get('futures_data', {})
+        return {
+            'enabled': settings.get('enabled', False),
+            'lookback': settings.get('lookback', '6 months ago UTC'),
+            'history_stats_period': settings.get('history_stats_period', '1h'),
+            'live_stats_period': settings.get('live_stats_period', '5m'),
+            'poll_seconds': settings.get('poll_seconds', 60)
+        }
+
+    # Fetch external signal refresh settings (seconds)
+    def get_external_signal_settings(self):
+        settings = self.config_data.get('external_signals', {})
+        return {
+            'enabled': settings.get('enabled', False),
+            'request_timeout': settings.get('request_timeout', 10),
+            'fear_greed_refresh_seconds': settings.get('fear_greed_refresh_seconds', 3600),
+            'fear_greed_ttl_seconds': settings.get('fear_greed_ttl_seconds', 172800)
+        }
+
+    # Fetch latency instrumentation settings
+    def get_latency_settings(self):
+        settings = self.config_data.get('latency_instrumentation', {})
+        return {
+            'enabled': settings.get('enabled', False),
+            'export_format': settings.get('export_format', 'prometheus'),
+            'export_path': settings.get('export_path', 'latency_metrics.prom'),
+            'export_interval': settings.get('export_interval', 60)
+        }
+
     # Fetch Telegram bot token
     def get_telegram_bot_token(self):
         return self.config_data.get('telegram_bot_token', '')
@@ -103,3 +417,14 @@ class Config:
     # Fetch authorized Telegram users
     def get_authorized_users(self):
         return self.config_data.get('authorized_users', [])
+
+# Process-wide configuration shared by every module instead of separate Config() instances
+_shared_config = None
+_shared_config_lock = threading.Lock()
+
+def get_config():
+    global _shared_config
+    with _shared_config_lock:
+        if _shared_config is None:
+            _shared_config = Config()
+        return _shared_config
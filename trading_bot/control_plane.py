@@ -0,0 +1,259 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Listener, Client as ConnectionClient
+import latency
+from error_handler import handle_error
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.dirname(__file__), 'trading_bot.sock')
+DEFAULT_LOCK_PATH = os.path.join(os.path.dirname(__file__), 'trading_bot.lock')
+DEFAULT_TIMEOUT = 5.0
+THROUGHPUT_WINDOW = 100  # Cycles per symbol used for the throughput estimate
+COMMANDS = ('ping', 'status', 'positions', 'pause', 'resume', 'stop')
+
+# Single live trading process: the live loop holds an exclusive lock on the lock file while it runs
+def acquire_live_lock(path=DEFAULT_LOCK_PATH):
+    """
+    Take the live trading lock for this process and record its pid in the lock file.
+
+    :return: The open lock file, to be kept open for the lifetime of the process.
+    :raises RuntimeError: If another live trading process holds the lock.
+    """
+    lock_file = open(path, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.seek(0)
+        pid = lock_file.read().strip()
+        lock_file.close()
+        raise RuntimeError(f"Another live trading process (pid {pid or 'unknown'}) is running.")
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+def live_lock_held(path=DEFAULT_LOCK_PATH):
+    """
+    :return: True if a live trading process currently holds the lock.
+    """
+    if not os.path.exists(path):
+        return False
+    with open(path) as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return False
+
+class BotState:
+    """
+    State of a running trading process shared with the control plane.
+
+    The trading loop only records cycles and reads flags; commands from the control plane only
+    set flags. Both take one short lock, so the loop is never blocked by a slow client.
+    """
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.started_at = time.time()
+        self.paused = set()
+        self.stop_requested = False
+        self.positions_provider = None
+        self.stats = {symbol: {'cycles': 0, 'last_price': None, 'last_latency_ms': None, 'max_latency_ms': 0.0,
+                               'last_cycle': None} for symbol in self.symbols}
+        self._cycle_times = {symbol: deque(maxlen=THROUGHPUT_WINDOW) for symbol in self.symbols}
+        self._lock = threading.Lock()
+
+    # Trading loop side
+    def is_active(self, symbol):
+        return not self.stop_requested and symbol not in self.paused
+
+    def record_cycle(self, symbol, seconds, price=None):
+        now = time.time()
+        latency_ms = seconds * 1000
+        with self._lock:
+            stats = self.stats.setdefault(symbol, {'cycles': 0, 'last_price': None, 'last_latency_ms': None,
+                                                   'max_latency_ms': 0.0, 'last_cycle': None})
+            stats['cycles'] += 1
+            stats['last_latency_ms'] = latency_ms
+            stats['max_latency_ms'] = max(stats['max_latency_ms'], latency_ms)
+            stats['last_cycle'] = now
+            if price is not None:
+                stats['last_price'] = price
+            self._cycle_times.setdefault(symbol, deque(maxlen=THROUGHPUT_WINDOW)).append(now)
+
+    # Control plane side
+    def pause(self, symbols=None):
+        """
+        :param symbols: Symbols to pause; all symbols when omitted.
+        """
+        with self._lock:
+            self.paused.update(symbols or self.symbols)
+        return sorted(self.paused)
+
+    def resume(self, symbols=None):
+        with self._lock:
+            if symbols:
+                self.paused.difference_update(symbols)
+            else:
+                self.paused.clear()
+        return sorted(self.paused)
+
+    def stop(self):
+        self.stop_requested = True
+
+    def positions(self):
+        """
+        Open positions with unrealized PnL from the positions provider (the exchange in live trading).
+        """
+        if self.positions_provider is None:
+            return []
+        positions = []
+        for position in self.positions_provider() or []:
+            quantity = float(position.get('positionAmt', 0))
+            if quantity:
+                positions.append({
+                    'symbol': position['symbol'],
+                    'quantity': quantity,
+                    'entry_price': float(position.get('entryPrice', 0)),
+                    'mark_price': float(position.get('markPrice', 0)),
+                    'unrealized_pnl': float(position.get('unRealizedProfit', 0)),
+                    'leverage': position.get('leverage'),
+                })
+        return positions
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            symbols = {}
+            for symbol, stats in self.stats.items():
+                times = self._cycle_times.get(symbol) or ()
+                elapsed = times[-1] - times[0] if len(times) > 1 else 0.0
+                symbols[symbol] = {
+                    **stats,
+                    'paused': symbol in self.paused,
+                    'cycles_per_minute': 60 * (len(times) - 1) / elapsed if elapsed else 0.0,
+                }
+            paused = sorted(self.paused)
+        status = {
+            'uptime_s': now - self.started_at,
+            'stopping': self.stop_requested,
+            'paused': paused,
+            'symbols': symbols,
+        }
+        if latency.is_enabled():
+            status['latency'] = {stage: latency.get_histogram(stage).snapshot()
+                                 for stage in ('signal_to_order', 'add_features', 'manage_risk')}
+        return status
+
+class ControlServer:
+    """
+    Serves BotState to control plane clients over a local Unix socket.
+
+    Each request is a dict {'command': ..., 'symbols': [...]} answered with
+    {'ok': bool, 'result' or 'error': ...}. The socket file is only accessible to its owner,
+    and an optional authkey adds an HMAC challenge.
+    """
+    def __init__(self, state, address=DEFAULT_SOCKET_PATH, authkey=None):
+        self.state = state
+        self.address = address
+        self.authkey = authkey.encode() if isinstance(authkey, str) and authkey else authkey or None
+        self._listener = None
+        self._thread = None
+
+    def start(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # Left behind by a process that did not shut down cleanly
+        self._listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        self._thread = threading.Thread(target=self._serve, name='control-server', daemon=True)
+        self._thread.start()
+        logger.info(f"Control plane listening on {self.address}.")
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _serve(self):
+        while self._listener is not None:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                break  # Listener closed
+            except Exception as e:
+                handle_error(e, error_type="Control Plane", critical=False)
+                continue
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        with connection:
+            try:
+                while True:
+                    request = connection.recv()
+                    connection.send(self.execute(request))
+            except EOFError:
+                pass
+            except Exception as e:
+                handle_error(e, error_type="Control Plane", critical=False)
+
+    def execute(self, request):
+        command = request.get('command')
+        symbols = [symbol.upper() for symbol in request.get('symbols') or []]
+        try:
+            if command == 'ping':
+                result = 'pong'
+            elif command == 'status':
+                result = self.state.status()
+            elif command == 'positions':
+                result = self.state.positions()
+            elif command == 'pause':
+                result = self.state.pause(symbols)
+            elif command == 'resume':
+                result = self.state.resume(symbols)
+            elif command == 'stop':
+                self.state.stop()
+                result = 'stopping'
+            else:
+                return {'ok': False, 'error': f"Unknown command {command!r}. Must be one of {COMMANDS}."}
+            return {'ok': True, 'result': result}
+        except Exception as e:
+            logger.error(f"Control command {command} failed: {e}")
+            return {'ok': False, 'error': str(e)}
+
+class ControlClient:
+    """
+    Client for a ControlServer. Every call opens a short-lived connection, so it can be used
+    from any thread or process; a missing or hung trading process raises ConnectionError.
+    """
+    def __init__(self, address=DEFAULT_SOCKET_PATH, authkey=None, timeout=DEFAULT_TIMEOUT):
+        self.address = address
+        self.authkey = authkey.encode() if isinstance(authkey, str) and authkey else authkey or None
+        self.timeout = timeout
+
+    def request(self, command, symbols=None):
+        try:
+            with ConnectionClient(self.address, family='AF_UNIX', authkey=self.authkey) as connection:
+                connection.send({'command': command, 'symbols': symbols or []})
+                if not connection.poll(self.timeout):
+                    raise ConnectionError(f"No reply to {command} within {self.timeout}s.")
+                response = connection.recv()
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ConnectionError(f"Trading process is not running ({self.address}).") from e
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error'))
+        return response['result']
+
+    def is_running(self):
+        try:
+            return self.request('ping') == 'pong'
+        except (ConnectionError, OSError):
+            return False
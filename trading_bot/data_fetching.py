@@ -4,8 +4,9 @@ import time
 import requests
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
-from binance import ThreadedWebsocketManager
 from error_handler import handle_error
+from order_book import OrderBookManager
+from stream_multiplexer import StreamMultiplexer, SPOT_STREAM_URL, MAX_STREAMS_PER_CONNECTION
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,58 +26,95 @@ def retry_api_call(func, *args, retries=5, delay=2, **kwargs):
     logger.error(f"Failed to execute {func.__name__} after {retries} retries.")
     return None
 
+# Convert a kline WebSocket message into a one-row DataFrame
+def parse_kline_message(msg):
+    """
+    Parse a Binance kline WebSocket message into a one-row OHLCV DataFrame.
+
+    :param msg: Kline event message (with 's' symbol and 'k' kline payload).
+    :return: Pandas DataFrame with open_time, open, high, low, close and volume columns.
+    """
+    kline = msg['k']
+    df = pd.DataFrame([[
+        kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v']
+    ]], columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
+    df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        df[col] = df[col].astype(float)
+    return df
+
+# REST backfill of candles missed by the WebSocket
+def rest_backfill(client):
+    """
+    Return a backfill(symbol, interval, first_open_time, last_open_time) function for StreamMultiplexer
+    that fetches the missed candles over REST.
+    """
+    def backfill(symbol, interval, first_open_time, last_open_time):
+        rows = []
+        start_time = first_open_time
+        while start_time <= last_open_time:
+            klines = retry_api_call(client.get_klines, symbol=symbol, interval=interval, startTime=start_time,
+                                    endTime=last_open_time, limit=1000)
+            if not klines:
+                break
+            rows.extend((int(kline[0]), float(kline[1]), float(kline[2]), float(kline[3]), float(kline[4]), float(kline[5]))
+                        for kline in klines)
+            start_time = int(klines[-1][0]) + 1
+        logger.info(f"Backfilled {len(rows)} {interval} candles for {symbol}.")
+        return rows
+    return backfill
+
 # WebSocket integration for real-time data fetching
-def start_websocket(client, symbols, interval='1m', fetch_order_book=False, rate_limit=5, batch_size=2):
+def start_websocket(client, symbols, interval='1m', fetch_order_book=False, on_kline=None, order_flow=None,
+                    base_url=SPOT_STREAM_URL, max_streams_per_connection=MAX_STREAMS_PER_CONNECTION):
     """
-    Initialize a Binance WebSocket manager to fetch real-time data for given symbols.
+    Stream real-time data for the given symbols over a pool of combined-stream connections.
 
     :param client: Binance Client object
     :param symbols: List of trading pairs to subscribe to (e.g., ['BTCUSDT'])
     :param interval: Time interval for candlestick data (default: '1m')
-    :param fetch_order_book: Boolean indicating whether to fetch real-time order book data
-    :param rate_limit: Maximum number of updates per second to throttle real-time updates.
-    :param batch_size: Number of symbols to process simultaneously in each batch.
+    :param fetch_order_book: Boolean indicating whether to maintain local order books from diff-depth streams
+    :param on_kline: Optional callback(symbol, open_time_ms, open, high, low, close, volume, is_closed)
+                     called for every kline update, including candles backfilled after a reconnect.
+    :param order_flow: Optional OrderFlowManager to feed from aggTrade streams.
+    :param base_url: WebSocket endpoint (a local stand-in server can be used for testing).
+    :param max_streams_per_connection: Streams combined on one connection.
+    :return: Tuple of (StreamMultiplexer, OrderBookManager or None).
     """
     def process_message(msg):
         """
         Callback function to process incoming WebSocket messages.
         """
-        if msg['e'] == 'error':
-            handle_error(msg, error_type="WebSocket", critical=False)
-        else:
-            try:
-                symbol = msg['s']
-                kline = msg['k']
-                df = pd.DataFrame([[
-                    kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v']
-                ]], columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
-                df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
-                for col in ['open', 'high', 'low', 'close', 'volume']:
-                    df[col] = df[col].astype(float)
-
-                logger.info(f"Real-time update for {symbol}: {df.tail(1)}")
-
-                if fetch_order_book:
-                    order_book = get_order_book(client, symbol)
-                    logger.info(f"Order book for {symbol}: {order_book}")
-            except Exception as e:
-                handle_error(e, error_type="WebSocket Processing", critical=False)
-
-    twm = ThreadedWebsocketManager(api_key=client.API_KEY, api_secret=client.API_SECRET)
-    twm.start()
-
-    def subscribe_batch(batch):
-        for symbol in batch:
-            logger.info(f"Subscribing to WebSocket for {symbol} with interval {interval}")
-            twm.start_kline_socket(callback=process_message, symbol=symbol, interval=interval)
-            time.sleep(1 / rate_limit)  # Throttle subscriptions to respect rate limits
-
-    # Process symbols in batches
-    for i in range(0, len(symbols), batch_size):
-        batch = symbols[i:i + batch_size]
-        subscribe_batch(batch)
+        try:
+            symbol = msg['s']
+            kline = msg['k']
+            if on_kline:
+                on_kline(symbol, kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v'], kline['x'])
+
+            # No per-message DataFrame: candles are kept by the on_kline consumer
+            logger.debug(f"Real-time update for {symbol}: open_time {kline['t']} close {kline['c']} volume {kline['v']}")
+        except Exception as e:
+            handle_error(e, error_type="WebSocket Processing", critical=False)
+
+    multiplexer = StreamMultiplexer(base_url, max_streams_per_connection, backfill=rest_backfill(client))
+    for symbol in symbols:
+        multiplexer.start_kline_socket(callback=process_message, symbol=symbol, interval=interval)
+
+    # Local L2 books are kept current from diff-depth streams instead of a REST call per tick
+    order_books = None
+    if fetch_order_book:
+        order_books = OrderBookManager(client, symbols)
+        order_books.subscribe(multiplexer, sync=False)
+
+    if order_flow is not None:
+        order_flow.subscribe(multiplexer)
+
+    multiplexer.start()
+    if order_books is not None:
+        order_books.sync()  # Snapshots are fetched once the depth events are being buffered
 
     logger.info(f"WebSocket initiated for {symbols} at {interval} interval.")
+    return multiplexer, order_books
 
 # Fetch order book data
 def get_order_book(client, symbol, limit=10):
@@ -93,15 +131,17 @@ def get_order_book(client, symbol, limit=10):
     return {}
 
 # Fetch Crypto Fear & Greed Index
-def get_crypto_fear_greed_index():
+def get_crypto_fear_greed_index(timeout=10):
     """
     Fetch the Crypto Fear & Greed Index from an external API.
+    The live bot reads it from the background-refreshed ExternalSignalService instead.
 
+    :param timeout: Request timeout in seconds.
     :return: Current Fear & Greed Index value (0-100) or None if unavailable.
     """
     url = "https://api.alternative.me/fng/"
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=timeout)
         response.raise_for_status()
         data = response.json()
         if 'data' in data and len(data['data']) > 0:
@@ -111,7 +151,8 @@ def get_crypto_fear_greed_index():
     return None
 
 # Fetch real-time data via WebSocket
-def get_real_time_data_via_websocket(symbols, client, interval='1m', fetch_order_book=False):
+def get_real_time_data_via_websocket(symbols, client, interval='1m', fetch_order_book=False, on_kline=None,
+                                     order_flow=None):
     """
     Initializes the WebSocket and listens for real-time updates for the given symbols.
 
@@ -119,9 +160,13 @@ def get_real_time_data_via_websocket(symbols, client, interval='1m', fetch_order
     :param client: Binance client object.
     :param interval: Candlestick interval for the WebSocket stream (default: '1m')
     :param fetch_order_book: Boolean to indicate fetching order book data.
+    :param on_kline: Optional callback for every kline update (see start_websocket).
+    :param order_flow: Optional OrderFlowManager to feed from aggTrade streams.
+    :return: Tuple of (StreamMultiplexer, OrderBookManager or None).
     """
     logger.info(f"Starting WebSocket data stream for symbols: {symbols} at interval: {interval}")
-    start_websocket(client, symbols, interval, fetch_order_book=fetch_order_book)
+    return start_websocket(client, symbols, interval, fetch_order_book=fetch_order_book, on_kline=on_kline,
+                           order_flow=order_flow)
 
 # Fetch historical data for backtesting
 def get_historical_data(client, symbol, interval='1h', lookback='84 months ago UTC'):
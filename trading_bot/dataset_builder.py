@@ -0,0 +1,158 @@
+import logging
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from feature_store import FeatureStore
+from multi_timeframe import interval_to_timedelta
+from strategy import FEATURE_COLUMNS, LABEL_MAP, label_actions
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_FEATURE_COLUMNS = ['symbol_code', 'interval_minutes', 'symbol_log_volume', 'symbol_volatility']
+DEFAULT_CHUNK_ROWS = 250_000
+DEFAULT_VALIDATION_FRACTION = 0.2
+
+class DatasetBuilder:
+    """
+    Pooled training dataset over the feature-store entries of several symbols and intervals.
+
+    Entries stay memory-mapped; rows are produced in chunks of at most chunk_rows, so the
+    full matrix never has to fit in memory. Each entry is split by time: the last
+    validation_fraction of its rows form the validation part. Rows are tagged with
+    SYMBOL_FEATURE_COLUMNS, computed from the training part only.
+    """
+    def __init__(self, symbols, intervals=('1h',), indicator_mode='simple', feature_columns=None,
+                 validation_fraction=DEFAULT_VALIDATION_FRACTION, chunk_rows=DEFAULT_CHUNK_ROWS, feature_store=None):
+        self.symbols = sorted(symbols)
+        self.intervals = list(intervals)
+        self.indicator_mode = indicator_mode
+        self.feature_columns = list(feature_columns or FEATURE_COLUMNS)
+        self.validation_fraction = validation_fraction
+        self.chunk_rows = chunk_rows
+        self.feature_store = feature_store or FeatureStore()
+        self.entries = self._discover()
+        logger.info(f"Dataset: {len(self.entries)} entries, {self.n_rows('train')} training and "
+                    f"{self.n_rows('valid')} validation rows.")
+        self.symbol_features = {(symbol, interval): self._compute_symbol_features(symbol, interval, features, split)
+                                for symbol, interval, features, split in self.entries}
+
+    @property
+    def columns(self):
+        return self.feature_columns + SYMBOL_FEATURE_COLUMNS
+
+    def _discover(self):
+        entries = []
+        for symbol in self.symbols:
+            for interval in self.intervals:
+                features = self.feature_store.load(symbol, interval, self.indicator_mode)
+                if features is None or features.empty:
+                    logger.warning(f"No stored features for {symbol} {interval}. Excluded from the dataset.")
+                    continue
+                missing = set(self.feature_columns) - set(features.columns)
+                if missing:
+                    logger.warning(f"Stored features for {symbol} {interval} lack {sorted(missing)}. Excluded from the dataset.")
+                    continue
+                split = int(len(features) * (1 - self.validation_fraction))
+                entries.append((symbol, interval, features, split))
+        return entries
+
+    def _compute_symbol_features(self, symbol, interval, features, split):
+        train = features.iloc[:split]
+        close = np.asarray(train['close'])
+        volume = np.asarray(train['volume'])
+        returns = np.diff(np.log(close)) if len(close) > 1 else np.array([np.nan])
+        return {
+            'symbol_code': float(self.symbols.index(symbol)),
+            'interval_minutes': interval_to_timedelta(interval).total_seconds() / 60,
+            'symbol_log_volume': float(np.log1p(np.nanmedian(close * volume))) if len(close) else np.nan,
+            'symbol_volatility': float(np.nanstd(returns)),
+        }
+
+    def _part_range(self, part, n_rows, split):
+        if part == 'train':
+            return 0, split
+        if part == 'valid':
+            return split, n_rows
+        if part == 'all':
+            return 0, n_rows
+        raise ValueError(f"Invalid part: {part}. Must be 'train', 'valid' or 'all'.")
+
+    def n_rows(self, part='train'):
+        total = 0
+        for _, _, features, split in self.entries:
+            start, end = self._part_range(part, len(features), split)
+            total += end - start
+        return total
+
+    def iter_chunks(self, part='train'):
+        """
+        Yield (X, y) chunks of the dataset in entry order, each at most chunk_rows long.
+        """
+        for symbol, interval, features, split in self.entries:
+            start, end = self._part_range(part, len(features), split)
+            for chunk_start in range(start, end, self.chunk_rows):
+                chunk = features.iloc[chunk_start:min(chunk_start + self.chunk_rows, end)]
+                X = add_symbol_features(chunk[self.feature_columns], self.symbol_features[(symbol, interval)])
+                y = label_actions(chunk).map(LABEL_MAP)
+                yield X, y
+
+    def to_frame(self, part='train'):
+        """
+        Materialize a part in memory. Only suitable for datasets that fit in RAM.
+
+        :return: Tuple of (X, y).
+        """
+        chunks = list(self.iter_chunks(part))
+        if not chunks:
+            return pd.DataFrame(columns=self.columns), pd.Series(dtype=int)
+        return pd.concat([X for X, _ in chunks]), pd.concat([y for _, y in chunks])
+
+    def dmatrix(self, part='train', ref=None, max_bin=256, cache_prefix=None):
+        """
+        Build an XGBoost matrix by streaming the chunks.
+
+        Without cache_prefix, chunks are quantized on the fly into a QuantileDMatrix (only
+        the compressed histogram bins stay in memory). With cache_prefix, an external-memory
+        DMatrix pages the data to disk under that prefix.
+
+        :param ref: Training QuantileDMatrix whose bin boundaries a validation matrix must reuse.
+        """
+        iterator = ChunkIterator(self, part, cache_prefix)
+        if cache_prefix:
+            return xgb.DMatrix(iterator)
+        return xgb.QuantileDMatrix(iterator, ref=ref, max_bin=max_bin)
+
+class ChunkIterator(xgb.DataIter):
+    """
+    XGBoost data iterator over the chunks of a DatasetBuilder part.
+    """
+    def __init__(self, builder, part='train', cache_prefix=None):
+        self.builder = builder
+        self.part = part
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = self.builder.iter_chunks(self.part)
+        try:
+            X, y = next(self._chunks)
+        except StopIteration:
+            return 0
+        input_data(data=X, label=y)
+        return 1
+
+    def reset(self):
+        self._chunks = None
+
+def add_symbol_features(df, symbol_features):
+    """
+    Append SYMBOL_FEATURE_COLUMNS to a feature DataFrame, e.g. before predicting with a pooled model.
+
+    :param symbol_features: Dictionary keyed by SYMBOL_FEATURE_COLUMNS (from DatasetBuilder.symbol_features
+                            or the metadata of a pooled model artifact).
+    """
+    df = df.copy()
+    for column in SYMBOL_FEATURE_COLUMNS:
+        df[column] = symbol_features[column]
+    return df
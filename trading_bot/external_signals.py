@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import requests
+from error_handler import handle_error
+
+logger = logging.getLogger(__name__)
+
+EXTERNAL_SIGNALS_DIR = os.path.join(os.path.dirname(__file__), 'external_signals')
+FEAR_GREED_URL = 'https://api.alternative.me/fng/'
+REQUEST_TIMEOUT = 10  # Seconds; no third-party request may wait longer
+RETRY_INTERVAL = 60  # Seconds before a failed fetch is retried
+SCHEDULER_TICK = 1.0
+
+# Fetchers: return (source_timestamp_ms or None, value)
+def fetch_fear_greed(timeout=REQUEST_TIMEOUT):
+    response = requests.get(FEAR_GREED_URL, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()['data'][0]
+    return int(data['timestamp']) * 1000, int(data['value'])
+
+class _Source:
+    __slots__ = ('name', 'fetch', 'refresh_interval', 'ttl', 'value', 'timestamp', 'updated', 'next_run', 'in_flight')
+
+    def __init__(self, name, fetch, refresh_interval, ttl):
+        self.name = name
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self.value = None
+        self.timestamp = None
+        self.updated = None
+        self.next_run = 0.0
+        self.in_flight = False
+
+class ExternalSignalService:
+    """
+    Background-refreshed cache of external indicators (Fear & Greed, funding rates, ...).
+
+    Each registered source is fetched on its own schedule by a worker pool, so a slow or
+    stalled API only delays its own refresh. get() only reads memory and never waits on the
+    network. Every new observation is appended to a JSONL history file in the local store;
+    the latest stored value is loaded at start-up.
+    """
+    def __init__(self, store_dir=EXTERNAL_SIGNALS_DIR, max_workers=4):
+        self.store_dir = store_dir
+        self.sources = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='external-signals')
+
+    def register(self, name, fetch, refresh_interval, ttl):
+        """
+        :param fetch: Callable returning (source_timestamp_ms or None, value); the value must be JSON-serializable.
+        :param refresh_interval: Seconds between fetches.
+        :param ttl: Seconds after which get() treats the value as expired.
+        """
+        source = _Source(name, fetch, refresh_interval, ttl)
+        last = self._load_last(name)
+        if last:
+            source.timestamp, source.value, source.updated = last.get('timestamp'), last['value'], last['time']
+            # Skip the start-up fetch while the stored value is still fresh
+            source.next_run = source.updated + refresh_interval
+        self.sources[name] = source
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='external-signals-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self.executor.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            now = time.time()
+            for source in self.sources.values():
+                with self._lock:
+                    due = not source.in_flight and now >= source.next_run
+                    if due:
+                        source.in_flight = True
+                if due:
+                    self.executor.submit(self._refresh, source)
+            self._stop_event.wait(SCHEDULER_TICK)
+
+    def _refresh(self, source):
+        try:
+            timestamp, value = source.fetch()
+            now = time.time()
+            with self._lock:
+                changed = timestamp is None or timestamp != source.timestamp or value != source.value
+                source.timestamp, source.value, source.updated = timestamp, value, now
+                source.next_run = now + source.refresh_interval
+            if changed:
+                self._append_history(source.name, {'time': now, 'timestamp': timestamp, 'value': value})
+        except Exception as e:
+            handle_error(e, error_type=f"External Signal {source.name}", critical=False)
+            with self._lock:
+                source.next_run = time.time() + min(RETRY_INTERVAL, source.refresh_interval)
+        finally:
+            with self._lock:
+                source.in_flight = False
+
+    def get(self, name, default=None, allow_stale=False):
+        """
+        Latest value of a source from memory, or default if it is unknown or older than its TTL.
+        """
+        source = self.sources.get(name)
+        if source is None or source.updated is None:
+            return default
+        with self._lock:
+            value, updated = source.value, source.updated
+        if not allow_stale and time.time() - updated > source.ttl:
+            return default
+        return value
+
+    def snapshot(self, allow_stale=False):
+        """
+        :return: Dictionary of every source's current (non-expired) value.
+        """
+        values = {name: self.get(name, allow_stale=allow_stale) for name in self.sources}
+        return {name: value for name, value in values.items() if value is not None}
+
+    # Local store
+    def _history_path(self, name):
+        return os.path.join(self.store_dir, f"{name}.jsonl")
+
+    def _append_history(self, name, record):
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self._history_path(name), 'a') as history_file:
+            history_file.write(json.dumps(record) + '\n')
+
+    def _load_last(self, name):
+        path = self._history_path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as history_file:
+                history_file.seek(0, os.SEEK_END)
+                history_file.seek(max(0, history_file.tell() - 65536))
+                lines = history_file.read().splitlines()
+            return json.loads(lines[-1]) if lines else None
+        except Exception as e:
+            logger.error(f"Could not read external signal history {path}: {e}")
+            return None
+
+    def history(self, name):
+        """
+        Stored observations of a source as a DataFrame indexed by the source timestamp
+        (or the fetch time when the source has none).
+        """
+        path = self._history_path(name)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=['value'])
+        df = pd.read_json(path, lines=True)
+        df['timestamp'] = pd.to_datetime(df['timestamp'].fillna(df['time'] * 1000), unit='ms')
+        return df.set_index('timestamp')[['value']]
+
+def create_default_service(settings):
+    """
+    Build the service with the built-in sources.
+
+    :param settings: Dictionary from Config.get_external_signal_settings.
+    """
+    service = ExternalSignalService()
+    timeout = settings['request_timeout']
+    service.register('fear_greed', lambda: fetch_fear_greed(timeout), settings['fear_greed_refresh_seconds'],
+                     settings['fear_greed_ttl_seconds'])
+    return service
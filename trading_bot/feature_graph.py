@@ -0,0 +1,191 @@
+import logging
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from latency import timed
+from indicator_kernels import wilder_atr, wilder_adx, wilder_rsi, supertrend, parabolic_sar
+
+logger = logging.getLogger(__name__)
+
+SOURCE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# A feature: kernel(*inputs) returns its column. inputs name other nodes or source columns;
+# warmup is the number of earlier bars the kernel needs on top of the warm-up of its inputs.
+# Nodes whose name starts with '_' are shared intermediates that are never written to the DataFrame.
+FeatureNode = namedtuple('FeatureNode', ['name', 'inputs', 'warmup', 'kernel'])
+
+# EWM features depend on all history; their warm-up is where the seed's weight drops below ~0.25%
+EWM_WARMUP_SPANS = 3
+
+class FeatureGraph:
+    """
+    Features declared as a DAG, evaluated only as far as the requested outputs need.
+
+    plan() resolves the requested outputs to the nodes they depend on, in dependency order,
+    so shared intermediates (e.g. the true range behind ATR and ADX) are computed once.
+    min_history() is the number of bars after which every requested output is warmed up.
+    Cumulative features (OBV, VWAP) have no warm-up but depend on where the history starts.
+    """
+    def __init__(self, nodes):
+        self.nodes = {node.name: node for node in nodes}
+        for node in nodes:
+            missing = [name for name in node.inputs if name not in self.nodes and name not in SOURCE_COLUMNS]
+            if missing:
+                raise ValueError(f"Feature {node.name} has unknown inputs: {missing}")
+        self.outputs = [name for name in self.nodes if not name.startswith('_')]
+        self._plans = {}
+        self._warmups = {}
+
+    def plan(self, outputs=None):
+        """
+        :param outputs: Feature names to compute; all features when omitted.
+        :return: Tuple of node names to evaluate, in dependency order.
+        """
+        key = None if outputs is None else frozenset(outputs)
+        if key not in self._plans:
+            requested = self.outputs if outputs is None else list(outputs)
+            unknown = [name for name in requested if name not in self.nodes]
+            if unknown:
+                raise ValueError(f"Unknown features: {unknown}")
+            order, visiting = [], set()
+
+            def visit(name):
+                if name in SOURCE_COLUMNS or name in order:
+                    return
+                if name in visiting:
+                    raise ValueError(f"Feature graph has a cycle through {name}")
+                visiting.add(name)
+                for dependency in self.nodes[name].inputs:
+                    visit(dependency)
+                visiting.discard(name)
+                order.append(name)
+
+            for name in requested:
+                visit(name)
+            self._plans[key] = tuple(order)
+        return self._plans[key]
+
+    def warmup(self, name):
+        """
+        :return: Bars of history before the first fully warmed-up value of a feature.
+        """
+        if name in SOURCE_COLUMNS:
+            return 0
+        if name not in self._warmups:
+            node = self.nodes[name]
+            self._warmups[name] = node.warmup + max((self.warmup(dependency) for dependency in node.inputs), default=0)
+        return self._warmups[name]
+
+    def min_history(self, outputs=None):
+        """
+        :return: Minimum number of bars for the last row to have every requested output warmed up.
+        """
+        return 1 + max((self.warmup(name) for name in self.plan(outputs)), default=0)
+
+    def evaluate(self, df, outputs=None):
+        """
+        Compute the requested outputs (and the public features they depend on) from the OHLCV columns.
+
+        :return: A new DataFrame with the computed columns; existing columns of the same name are replaced in place,
+                 new ones are appended in declaration order.
+        """
+        values = {}
+        for name in self.plan(outputs):
+            node = self.nodes[name]
+            with timed(f'indicator.{name}'):
+                values[name] = node.kernel(*(values[dependency] if dependency in values else df[dependency]
+                                             for dependency in node.inputs))
+        return df.assign(**{name: values[name] for name in self.outputs if name in values})
+
+# Kernels
+def _true_range(high, low, close):
+    previous_close = close.shift()
+    return np.maximum(high - low, np.maximum(np.abs(high - previous_close), np.abs(low - previous_close)))
+
+def _directional_movement(high, low):
+    up = high - high.shift()
+    down = low.shift() - low
+    dm_plus = pd.Series(np.where(up > down, np.maximum(up, 0), 0), index=high.index)
+    dm_minus = pd.Series(np.where(down > up, np.maximum(down, 0), 0), index=high.index)
+    return dm_plus, dm_minus
+
+def _adx(true_range, directional_movement, window=14):
+    dm_plus, dm_minus = directional_movement
+    tr_smooth = true_range.rolling(window=window).sum()
+    di_plus = 100 * (dm_plus.rolling(window=window).sum() / tr_smooth)
+    di_minus = 100 * (dm_minus.rolling(window=window).sum() / tr_smooth)
+    dx = 100 * (np.abs(di_plus - di_minus) / (di_plus + di_minus))
+    return dx.rolling(window=window).mean()
+
+def _rsi(close, window=14):
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(window=window).mean()
+    loss = -delta.where(delta < 0, 0).rolling(window=window).mean()
+    return 100 - (100 / (1 + gain / loss))
+
+def _midpoint(high, low, window):
+    return (high.rolling(window=window).max() + low.rolling(window=window).min()) / 2
+
+# Feature nodes of the 'simple' indicator mode, in the column order add_features has always produced
+SIMPLE_NODES = [
+    FeatureNode('returns', ('close',), 1, lambda close: close.pct_change().fillna(0)),
+    FeatureNode('volatility', ('returns',), 20, lambda returns: returns.rolling(window=21).std()),
+    FeatureNode('momentum', ('close',), 21, lambda close: close.diff(21).fillna(0)),
+    FeatureNode('_true_range', ('high', 'low', 'close'), 1, _true_range),
+    FeatureNode('atr', ('_true_range',), 13, lambda true_range: true_range.rolling(window=14).mean()),
+    FeatureNode('_directional_movement', ('high', 'low'), 1, _directional_movement),
+    FeatureNode('adx', ('_true_range', '_directional_movement'), 26, _adx),
+    FeatureNode('obv', ('close', 'volume'), 0,
+                lambda close, volume: (np.sign(close.diff()) * volume).fillna(0).cumsum()),
+    FeatureNode('vwap', ('high', 'low', 'close', 'volume'), 0,
+                lambda high, low, close, volume: (volume * (high + low + close) / 3).cumsum() / volume.cumsum()),
+    FeatureNode('tenkan_sen', ('high', 'low'), 8, lambda high, low: _midpoint(high, low, 9)),
+    FeatureNode('kijun_sen', ('high', 'low'), 25, lambda high, low: _midpoint(high, low, 26)),
+    FeatureNode('senkou_span_a', ('tenkan_sen', 'kijun_sen'), 26, lambda tenkan, kijun: ((tenkan + kijun) / 2).shift(26)),
+    FeatureNode('senkou_span_b', ('high', 'low'), 77, lambda high, low: _midpoint(high, low, 52).shift(26)),
+    FeatureNode('chikou_span', ('close',), 0, lambda close: close.shift(-26)),  # Looks 26 bars ahead
+    FeatureNode('_bb_mean', ('close',), 19, lambda close: close.rolling(window=20).mean()),
+    FeatureNode('_bb_std', ('close',), 19, lambda close: close.rolling(window=20).std()),
+    FeatureNode('bb_upper', ('_bb_mean', '_bb_std'), 0, lambda mean, std: mean + (std * 2)),
+    FeatureNode('bb_lower', ('_bb_mean', '_bb_std'), 0, lambda mean, std: mean - (std * 2)),
+    FeatureNode('macd', ('close',), EWM_WARMUP_SPANS * 26,
+                lambda close: close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()),
+    FeatureNode('macd_signal', ('macd',), EWM_WARMUP_SPANS * 9, lambda macd: macd.ewm(span=9, adjust=False).mean()),
+    FeatureNode('macd_diff', ('macd', 'macd_signal'), 0, lambda macd, signal: macd - signal),
+    FeatureNode('rsi', ('close',), 14, _rsi),
+    FeatureNode('stochastic_k', ('high', 'low', 'close'), 13,
+                lambda high, low, close: 100 * (close - low.rolling(window=14).min())
+                / (high.rolling(window=14).max() - low.rolling(window=14).min())),
+    FeatureNode('stochastic_d', ('stochastic_k',), 2, lambda k: k.rolling(window=3).mean()),
+    FeatureNode('short_ma', ('close',), 49, lambda close: close.rolling(window=50).mean()),
+    FeatureNode('long_ma', ('close',), 199, lambda close: close.rolling(window=200).mean()),
+]
+
+# 'wilder' mode: Wilder-smoothed ATR/ADX/RSI from the compiled kernels replace the simple ones in place,
+# followed by Supertrend and Parabolic SAR
+WILDER_REPLACEMENTS = {
+    'atr': FeatureNode('atr', ('high', 'low', 'close'), 14,
+                       lambda high, low, close: wilder_atr(high.values, low.values, close.values, 14)),
+    'adx': FeatureNode('adx', ('high', 'low', 'close'), 27,
+                       lambda high, low, close: wilder_adx(high.values, low.values, close.values, 14)[0]),
+    'rsi': FeatureNode('rsi', ('close',), 14, lambda close: wilder_rsi(close.values, 14)),
+}
+WILDER_NODES = [WILDER_REPLACEMENTS.get(node.name, node) for node in SIMPLE_NODES] + [
+    FeatureNode('_supertrend', ('high', 'low', 'close'), 10,
+                lambda high, low, close: supertrend(high.values, low.values, close.values)),
+    FeatureNode('supertrend', ('_supertrend',), 0, lambda result: result[0]),
+    FeatureNode('supertrend_direction', ('_supertrend',), 0, lambda result: result[1]),
+    FeatureNode('_psar', ('high', 'low'), 1, lambda high, low: parabolic_sar(high.values, low.values)),
+    FeatureNode('psar', ('_psar',), 0, lambda result: result[0]),
+    FeatureNode('psar_direction', ('_psar',), 0, lambda result: result[1]),
+]
+
+FEATURE_GRAPHS = {
+    'simple': FeatureGraph(SIMPLE_NODES),
+    'wilder': FeatureGraph(WILDER_NODES),
+}
+
+def get_feature_graph(indicator_mode='simple'):
+    if indicator_mode not in FEATURE_GRAPHS:
+        raise ValueError(f"Invalid indicator_mode: {indicator_mode}. Must be one of {tuple(FEATURE_GRAPHS)}.")
+    return FEATURE_GRAPHS[indicator_mode]
@@ -0,0 +1,204 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+import data_handler
+import indicator_kernels
+import feature_graph
+from data_handler import add_features
+
+logger = logging.getLogger(__name__)
+
+FEATURE_STORE_DIR = os.path.join(os.path.dirname(__file__), 'feature_store')
+
+# Modules whose source defines the feature set; any change produces a new version
+FEATURE_SET_MODULES = [data_handler, feature_graph, indicator_kernels]
+
+# Rows at the end of the store that are always recomputed: chikou_span looks 26 bars ahead
+RECOMPUTE_TAIL = 26
+# Bars of history recomputed before the rewritten rows so rolling and EWM features converge
+WARMUP_BARS = 500
+
+VALUES_FILE = 'values.f64'
+INDEX_FILE = 'index.i8'
+META_FILE = 'meta.json'
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+def feature_set_version(indicator_mode='simple'):
+    """
+    Hash of the feature code and settings, used to key the store.
+    """
+    digest = hashlib.sha256()
+    for module in FEATURE_SET_MODULES:
+        digest.update(inspect.getsource(module).encode())
+    digest.update(indicator_mode.encode())
+    return digest.hexdigest()[:12]
+
+class FeatureStore:
+    """
+    Persisted feature matrices keyed by (symbol, interval, feature-set version).
+
+    Each entry is a raw float64 row-major matrix plus an int64 open_time index. When the
+    source klines grow, only the new bars (and a short tail that can still change) are
+    computed and written; loads are memory-mapped.
+    """
+    def __init__(self, root=FEATURE_STORE_DIR):
+        self.root = root
+
+    def _entry_dir(self, symbol, interval, version):
+        return os.path.join(self.root, symbol, interval, version)
+
+    def _read_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, META_FILE)) as meta_file:
+                return json.load(meta_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Unreadable feature store metadata in {entry_dir}: {e}")
+            return None
+
+    def _write_meta(self, entry_dir, meta):
+        tmp_path = os.path.join(entry_dir, META_FILE + '.tmp')
+        with open(tmp_path, 'w') as meta_file:
+            json.dump(meta, meta_file, indent=2)
+        os.replace(tmp_path, os.path.join(entry_dir, META_FILE))
+
+    def load(self, symbol, interval, indicator_mode='simple', version=None):
+        """
+        Memory-map a stored feature matrix.
+
+        :return: DataFrame indexed by open_time, or None if nothing is stored for this version.
+        """
+        entry_dir = self._entry_dir(symbol, interval, version or feature_set_version(indicator_mode))
+        meta = self._read_meta(entry_dir)
+        if not meta or not meta['rows']:
+            return None
+        rows, columns = meta['rows'], meta['columns']
+        values = np.memmap(os.path.join(entry_dir, VALUES_FILE), dtype=np.float64, mode='r', shape=(rows, len(columns)))
+        index = np.memmap(os.path.join(entry_dir, INDEX_FILE), dtype=np.int64, mode='r', shape=(rows,))
+        return pd.DataFrame(values, columns=columns, index=pd.DatetimeIndex(np.asarray(index), name='open_time'), copy=False)
+
+    def get_features(self, symbol, interval, klines, indicator_mode='simple'):
+        """
+        Return features for the given klines, computing only bars missing from the store.
+
+        :param klines: OHLCV DataFrame indexed by open_time (e.g. from get_historical_data). It may either
+                       start with the stored history or only overlap its most recent bars. Klines that start
+                       after the stored history are computed but not stored.
+        :return: Feature DataFrame indexed by open_time.
+        """
+        if klines is None or klines.empty:
+            return klines
+        version = feature_set_version(indicator_mode)
+        entry_dir = self._entry_dir(symbol, interval, version)
+        meta = self._read_meta(entry_dir)
+        start_time = time.time()
+
+        stored = self.load(symbol, interval, version=version) if meta else None
+        requested_end = klines.index[-1]
+        if stored is not None and stored.index[0] < klines.index[0] <= stored.index[-1]:
+            klines = self._merge_with_stored(stored, klines)
+        elif stored is not None and klines.index[0] < stored.index[0] <= klines.index[-1] < stored.index[-1]:
+            klines = self._merge_with_stored(stored, klines, later=True)  # Earlier history; keep the stored recent bars
+        if stored is not None and stored.index[0] <= klines.index[0] and klines.index[-1] <= stored.index[-1]:
+            return stored.loc[klines.index[0]:klines.index[-1]]
+        if stored is not None and klines.index[0] > stored.index[-1]:
+            # Never shrink the store to a window that leaves a gap after it; the gap has to be synced first
+            logger.warning(f"Feature store: {symbol} {interval} klines start at {klines.index[0]}, after the stored history "
+                           f"ends at {stored.index[-1]}. Computing them without storing.")
+            features = add_features(klines.copy(), indicator_mode=indicator_mode, blocking_sentiment=True)
+            return features.select_dtypes(include=[np.number])
+        if stored is None or not self._extends(stored, klines):
+            # Only reached with klines that cover the start of the stored history, so a rewrite never loses rows
+            features = add_features(klines.copy(), indicator_mode=indicator_mode, blocking_sentiment=True)
+            features = features.select_dtypes(include=[np.number])
+            self._write(entry_dir, features, 0, symbol, interval, version, indicator_mode)
+            logger.info(f"Feature store: computed {len(features)} rows for {symbol} {interval} in {time.time() - start_time:.2f}s.")
+            return self.load(symbol, interval, version=version).loc[:requested_end]
+
+        new_rows = len(klines) - len(stored)
+        if new_rows <= 0:
+            return stored
+
+        rewrite_from = max(0, len(stored) - RECOMPUTE_TAIL)
+        warmup_start = max(0, rewrite_from - WARMUP_BARS)
+        tail = add_features(klines.iloc[warmup_start:].copy(), indicator_mode=indicator_mode, blocking_sentiment=True)
+        tail = self._continue_cumulative(tail.reindex(columns=stored.columns), stored, warmup_start)
+        self._write(entry_dir, tail.iloc[rewrite_from - warmup_start:], rewrite_from, symbol, interval, version, indicator_mode)
+        logger.info(f"Feature store: appended {new_rows} rows for {symbol} {interval} in {time.time() - start_time:.2f}s.")
+        return self.load(symbol, interval, version=version)
+
+    def _merge_with_stored(self, stored, klines, later=False):
+        """
+        Prepend stored OHLCV rows to klines that only overlap the end of the store, so a short
+        recent window (e.g. an hourly sync) can extend a long history.
+
+        :param later: Append the stored rows after the klines instead, for klines that start before the store.
+        """
+        if later:
+            rows = stored.loc[stored.index > klines.index[-1], OHLCV_COLUMNS]
+        else:
+            rows = stored.loc[stored.index < klines.index[0], OHLCV_COLUMNS]
+        rows = pd.DataFrame(np.array(rows), index=rows.index, columns=OHLCV_COLUMNS)
+        return pd.concat([klines[OHLCV_COLUMNS], rows] if later else [rows, klines[OHLCV_COLUMNS]])
+
+    def _extends(self, stored, klines):
+        # The klines must contain the stored bars at the same positions
+        if len(klines) < len(stored):
+            return False
+        return klines.index[0] == stored.index[0] and klines.index[len(stored) - 1] == stored.index[-1]
+
+    def _continue_cumulative(self, tail, stored, warmup_start):
+        """
+        OBV and VWAP accumulate from the first bar; continue them from the stored values
+        instead of restarting at the warm-up window.
+        """
+        if warmup_start == 0:
+            return tail
+        if 'obv' in tail.columns:
+            tail['obv'] += stored['obv'].iloc[warmup_start] - tail['obv'].iloc[0]
+        if 'vwap' in tail.columns:
+            previous_volume = float(np.asarray(stored['volume'].iloc[:warmup_start]).sum())
+            previous_price_volume = float(stored['vwap'].iloc[warmup_start - 1]) * previous_volume
+            price_volume = tail['volume'] * (tail['high'] + tail['low'] + tail['close']) / 3
+            tail['vwap'] = (previous_price_volume + price_volume.cumsum()) / (previous_volume + tail['volume'].cumsum())
+        return tail
+
+    def _write(self, entry_dir, features, offset, symbol, interval, version, indicator_mode):
+        """
+        Write feature rows starting at row `offset`, overwriting any rows after it.
+        """
+        os.makedirs(entry_dir, exist_ok=True)
+        values = np.ascontiguousarray(features.to_numpy(dtype=np.float64))
+        index = np.ascontiguousarray(features.index.asi8.astype(np.int64))
+
+        if offset and os.path.exists(os.path.join(entry_dir, VALUES_FILE)):
+            # Appends only grow the files, so existing memory maps stay valid
+            for file_name, data, row_bytes in ((VALUES_FILE, values, values.shape[1] * 8), (INDEX_FILE, index, 8)):
+                with open(os.path.join(entry_dir, file_name), 'r+b') as data_file:
+                    data_file.seek(offset * row_bytes)
+                    data_file.write(data.tobytes())
+                    data_file.truncate()
+        else:
+            # Full rewrites go to new files so memory maps of the old ones are never truncated
+            for file_name, data in ((VALUES_FILE, values), (INDEX_FILE, index)):
+                tmp_path = os.path.join(entry_dir, file_name + '.tmp')
+                with open(tmp_path, 'wb') as data_file:
+                    data_file.write(data.tobytes())
+                os.replace(tmp_path, os.path.join(entry_dir, file_name))
+
+        # Metadata is written last so readers never see rows that are not fully written
+        self._write_meta(entry_dir, {
+            'symbol': symbol,
+            'interval': interval,
+            'version': version,
+            'indicator_mode': indicator_mode,
+            'columns': list(features.columns),
+            'rows': offset + len(features),
+            'updated': time.time(),
+        })
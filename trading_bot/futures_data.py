@@ -0,0 +1,301 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+import pandas as pd
+from binance.helpers import date_to_milliseconds
+from data_fetching import retry_api_call
+from error_handler import handle_error
+from external_signals import ExternalSignalService
+from multi_timeframe import interval_to_timedelta, infer_interval
+from stream_multiplexer import StreamMultiplexer, FUTURES_STREAM_URL
+
+logger = logging.getLogger(__name__)
+
+FUTURES_DATA_DIR = os.path.join(os.path.dirname(__file__), 'futures_data')
+FUTURES_COLUMNS = ['funding_rate', 'open_interest', 'open_interest_value', 'long_short_ratio', 'mark_price', 'mark_basis']
+STATS_PERIODS = ['5m', '15m', '30m', '1h', '2h', '4h', '6h', '12h', '1d']
+STATS_HISTORY_DAYS = 30  # Binance serves open interest and long/short history for the last 30 days only
+DEFAULT_HISTORY = 1000
+DEFAULT_POLL_SECONDS = 60
+
+# Historical datasets: request function, pagination limit, time key and row parser.
+# Every parsed row is (observation_time_ms, {column: value}), the time the value became known.
+def _funding_rate_request(client, symbol, period):
+    return lambda **kwargs: client.futures_funding_rate(symbol=symbol, **kwargs)
+
+def _open_interest_request(client, symbol, period):
+    return lambda **kwargs: client.futures_open_interest_hist(symbol=symbol, period=period, **kwargs)
+
+def _long_short_request(client, symbol, period):
+    return lambda **kwargs: client.futures_global_longshort_ratio(symbol=symbol, period=period, **kwargs)
+
+def _mark_price_request(client, symbol, period):
+    return lambda **kwargs: client.futures_mark_price_klines(symbol=symbol, interval=period, **kwargs)
+
+DATASETS = {
+    'funding_rate': (_funding_rate_request, 1000, 'fundingTime',
+                     lambda row: (int(row['fundingTime']), {'funding_rate': float(row['fundingRate'])})),
+    'open_interest': (_open_interest_request, 500, 'timestamp',
+                      lambda row: (int(row['timestamp']), {'open_interest': float(row['sumOpenInterest']),
+                                                           'open_interest_value': float(row['sumOpenInterestValue'])})),
+    'long_short_ratio': (_long_short_request, 500, 'timestamp',
+                         lambda row: (int(row['timestamp']), {'long_short_ratio': float(row['longShortRatio'])})),
+    # A mark price kline is known once it closes (close time + 1 ms)
+    'mark_price': (_mark_price_request, 1500, 0, lambda row: (int(row[6]) + 1, {'mark_price': float(row[4])})),
+}
+STATS_DATASETS = {'open_interest', 'long_short_ratio'}
+
+def _paginate(request, start_time, end_time, limit, time_key):
+    rows = []
+    while start_time < end_time:
+        batch = retry_api_call(request, startTime=start_time, endTime=end_time, limit=limit)
+        if not batch:
+            break
+        rows.extend(batch)
+        last_time = int(batch[-1][time_key])
+        if len(batch) < limit or last_time < start_time:
+            break
+        start_time = last_time + 1
+    return rows
+
+class FuturesDataStore:
+    """
+    Append-only local store of futures market data, one CSV per symbol and dataset.
+
+    Files hold an observation time in milliseconds and the dataset's columns; sync() only
+    requests rows newer than the last stored one.
+    """
+    def __init__(self, root=FUTURES_DATA_DIR):
+        self.root = root
+
+    def _path(self, symbol, dataset, period):
+        name = dataset if dataset == 'funding_rate' else f"{dataset}_{period}"
+        return os.path.join(self.root, symbol.upper(), f"{name}.csv")
+
+    def _last_time(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as store_file:
+            store_file.seek(0, os.SEEK_END)
+            store_file.seek(max(0, store_file.tell() - 4096))
+            lines = store_file.read().splitlines()
+        try:
+            return int(lines[-1].split(b',')[0])
+        except (IndexError, ValueError):
+            return None
+
+    def load(self, symbol, dataset, period='1h'):
+        """
+        :return: DataFrame of the stored dataset indexed by observation time.
+        """
+        path = self._path(symbol, dataset, period)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        df = pd.read_csv(path)
+        df['time'] = pd.to_datetime(df['time'], unit='ms')
+        return df.drop_duplicates('time', keep='last').set_index('time').sort_index()
+
+    def sync(self, client, symbol, dataset, period='1h', lookback='6 months ago UTC'):
+        """
+        Fetch rows of one dataset newer than the stored ones and append them.
+
+        :param period: Statistics period for open interest and long/short ratio, kline interval for mark price.
+        :param lookback: Start of the history for an empty store.
+        :return: Number of rows appended.
+        """
+        request_factory, limit, time_key, parse = DATASETS[dataset]
+        path = self._path(symbol, dataset, period)
+        end_time = int(time.time() * 1000)
+        last_time = self._last_time(path)
+        # Rows at or before last_time are filtered below; a mark price kline opens at the previous one's observation time
+        start_time = last_time if last_time is not None else date_to_milliseconds(lookback)
+        if dataset in STATS_DATASETS:
+            start_time = max(start_time, end_time - (STATS_HISTORY_DAYS * 86_400_000 - 60_000))
+
+        rows = [parse(row) for row in _paginate(request_factory(client, symbol, period), start_time, end_time,
+                                                limit, time_key)]
+        rows = [(observed, values) for observed, values in rows if last_time is None or observed > last_time]
+        # The in-progress mark price kline is not known yet
+        rows = [(observed, values) for observed, values in rows if observed <= end_time]
+        if not rows:
+            return 0
+        df = pd.DataFrame([values for _, values in rows])
+        df.insert(0, 'time', [observed for observed, _ in rows])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        logger.info(f"Stored {len(df)} {dataset} rows for {symbol}.")
+        return len(df)
+
+    def sync_symbol(self, client, symbol, interval='1h', stats_period='1h', lookback='6 months ago UTC'):
+        for dataset in DATASETS:
+            try:
+                self.sync(client, symbol, dataset, stats_period if dataset in STATS_DATASETS else interval, lookback)
+            except Exception as e:
+                handle_error(e, error_type=f"Futures Data Sync {symbol} {dataset}", critical=False)
+
+    def observations(self, symbol, interval='1h', stats_period='1h'):
+        """
+        Every stored dataset of a symbol on one time axis, each column forward-filled to its
+        latest known value. Suitable as futures_features for add_features.
+        """
+        frames = [self.load(symbol, dataset, stats_period if dataset in STATS_DATASETS else interval)
+                  for dataset in DATASETS]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=FUTURES_COLUMNS)
+        combined = pd.concat(frames, axis=1, sort=True)
+        return combined.groupby(level=0).last().ffill()
+
+# Vectorized alignment for backtests and training
+def align_futures_features(df, futures_features, interval=None):
+    """
+    Attach futures observations to candles without lookahead: each candle gets the latest
+    values observed at or before its close.
+
+    :param df: OHLCV DataFrame indexed by open_time.
+    :param futures_features: Observations indexed by time (FuturesDataStore.observations or FuturesDataManager.to_frame).
+    :param interval: Candle interval. Inferred from df when omitted.
+    :return: df with FUTURES_COLUMNS (NaN where nothing was observed yet).
+    """
+    if df is None or df.empty or futures_features is None or futures_features.empty:
+        return df
+    period = interval_to_timedelta(interval) if interval else (infer_interval(df) or pd.Timedelta(0))
+    observations = futures_features.sort_index()
+    observations = observations.reset_index().rename(columns={observations.index.name or 'index': 'close_time'})
+    observations['close_time'] = pd.to_datetime(observations['close_time'])
+    aligned = pd.merge_asof(pd.DataFrame({'close_time': df.index + period}), observations, on='close_time',
+                            direction='backward')
+
+    df = df.drop(columns=FUTURES_COLUMNS, errors='ignore')
+    for column in FUTURES_COLUMNS:
+        if column in aligned.columns:
+            df[column] = aligned[column].to_numpy(dtype=float)
+    if 'mark_price' in df.columns:
+        df['mark_basis'] = df['mark_price'] / df['close'] - 1
+    return df
+
+# Live futures data
+class FuturesDataManager:
+    """
+    Live futures observations per symbol.
+
+    Mark prices and funding arrive over markPrice@1s streams on a futures combined-stream
+    connection; open interest and the long/short ratio are polled over REST by an
+    ExternalSignalService, so a slow endpoint never blocks the stream or the trading loop.
+    One observation row is kept per candle (the last update before it closed), so to_frame()
+    has the shape of the stored history and align_futures_features works for both.
+
+    funding_rate is the last settled rate, as in the stored history: the stream's predicted
+    rate is only taken over once its funding time has passed.
+    """
+    def __init__(self, client, symbols, interval='1m', stats_period='5m', poll_seconds=DEFAULT_POLL_SECONDS,
+                 history=DEFAULT_HISTORY, store=None, base_url=FUTURES_STREAM_URL):
+        self.client = client
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.interval = interval
+        self.interval_ms = int(interval_to_timedelta(interval).total_seconds() * 1000)
+        self.base_url = base_url
+        self.rows = {symbol: deque(maxlen=history) for symbol in self.symbols}
+        self.state = {symbol: {} for symbol in self.symbols}
+        self.multiplexer = None
+        self._lock = threading.Lock()
+
+        store = store or FuturesDataStore()
+        for symbol in self.symbols:
+            settled = store.load(symbol, 'funding_rate')
+            if not settled.empty:
+                self.state[symbol]['funding_rate'] = float(settled['funding_rate'].iloc[-1])
+
+        self.signals = ExternalSignalService(store_dir=os.path.join(store.root, 'live'))
+        for symbol in self.symbols:
+            self.signals.register(f"{symbol}_open_interest", self._open_interest_fetcher(symbol), poll_seconds,
+                                  3 * poll_seconds)
+            self.signals.register(f"{symbol}_long_short_ratio", self._long_short_fetcher(symbol, stats_period),
+                                  poll_seconds, 3 * poll_seconds)
+
+    def _open_interest_fetcher(self, symbol):
+        def fetch():
+            response = self.client.futures_open_interest(symbol=symbol)
+            return int(response['time']), float(response['openInterest'])
+        return fetch
+
+    def _long_short_fetcher(self, symbol, period):
+        def fetch():
+            latest = self.client.futures_global_longshort_ratio(symbol=symbol, period=period, limit=1)[-1]
+            return int(latest['timestamp']), float(latest['longShortRatio'])
+        return fetch
+
+    def subscribe(self, streams):
+        for symbol in self.symbols:
+            streams.start_mark_price_socket(callback=self.process_message, symbol=symbol)
+
+    def start(self):
+        self.multiplexer = StreamMultiplexer(self.base_url)
+        self.subscribe(self.multiplexer)
+        self.multiplexer.start()
+        self.signals.start()
+
+    def stop(self):
+        if self.multiplexer is not None:
+            self.multiplexer.stop()
+        self.signals.stop()
+
+    def process_message(self, msg):
+        if msg.get('e') == 'error':
+            handle_error(msg, error_type="Futures Data WebSocket", critical=False)
+            return
+        try:
+            if msg.get('e') == 'markPriceUpdate':
+                self.on_mark_price(msg['s'], msg['E'], msg['p'], msg['r'], msg['T'])
+        except Exception as e:
+            handle_error(e, error_type="Futures Data Processing", critical=False)
+
+    def on_mark_price(self, symbol, event_time, mark_price, predicted_funding_rate, next_funding_time):
+        """
+        Process one markPrice update; O(1) per message.
+        """
+        event_time = int(event_time)
+        candle_open_time = event_time - event_time % self.interval_ms
+        with self._lock:
+            state = self.state.get(symbol)
+            if state is None:
+                return
+            if state.get('candle_open_time') is not None and candle_open_time > state['candle_open_time']:
+                self.rows[symbol].append(self._observation(symbol, state))
+            if state.get('next_funding_time') is not None and event_time >= state['next_funding_time']:
+                state['funding_rate'] = state['predicted_funding_rate']
+            state.update(candle_open_time=candle_open_time, time=event_time, mark_price=float(mark_price),
+                         predicted_funding_rate=float(predicted_funding_rate), next_funding_time=int(next_funding_time))
+
+    def _observation(self, symbol, state):
+        open_interest = self.signals.get(f"{symbol}_open_interest", float('nan'))
+        mark_price = state.get('mark_price', float('nan'))
+        return {
+            'time': state['time'],
+            'funding_rate': state.get('funding_rate', float('nan')),
+            'open_interest': open_interest,
+            'open_interest_value': open_interest * mark_price,
+            'long_short_ratio': self.signals.get(f"{symbol}_long_short_ratio", float('nan')),
+            'mark_price': mark_price,
+        }
+
+    def to_frame(self, symbol):
+        """
+        Observation rows of a symbol, including the current state, indexed by time.
+        """
+        with self._lock:
+            rows = list(self.rows.get(symbol, ()))
+            state = self.state.get(symbol)
+            if state and 'time' in state:
+                rows.append(self._observation(symbol, state))
+        df = pd.DataFrame(rows, columns=['time'] + FUTURES_COLUMNS[:-1])
+        df['time'] = pd.to_datetime(df['time'], unit='ms')
+        return df.set_index('time')
+
+    def attach(self, symbol, df):
+        """
+        Join the futures observations of a symbol onto a candle DataFrame indexed by open_time.
+        """
+        return align_futures_features(df, self.to_frame(symbol), self.interval)
@@ -0,0 +1,229 @@
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import TimeSeriesSplit
+from xgboost import XGBClassifier
+from model_training import MODELS_DIR, atomic_write_json, load_training_frames
+from strategy import FEATURE_COLUMNS, LABEL_MAP, label_actions
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DIR = os.path.join(MODELS_DIR, 'hyperparameter_search')
+BEST_PARAMS_FILE = os.path.join(SEARCH_DIR, 'best_xgboost_params.json')
+SEARCH_METHODS = ('random', 'successive_halving')
+
+# Parameter distributions: (kind, low, high); 'log' samples uniformly in log space
+SEARCH_SPACE = {
+    'max_depth': ('int', 3, 10),
+    'learning_rate': ('log', 0.01, 0.3),
+    'subsample': ('float', 0.5, 1.0),
+    'colsample_bytree': ('float', 0.5, 1.0),
+    'min_child_weight': ('log', 1.0, 20.0),
+    'reg_lambda': ('log', 0.1, 10.0),
+    'gamma': ('float', 0.0, 5.0),
+}
+
+def sample_params(rng, space=SEARCH_SPACE):
+    params = {}
+    for name, (kind, low, high) in space.items():
+        if kind == 'int':
+            params[name] = int(rng.integers(low, high + 1))
+        elif kind == 'log':
+            params[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            params[name] = float(rng.uniform(low, high))
+    return params
+
+# Trial evaluation (runs in worker processes)
+def evaluate_trial(trial_id, params, n_estimators, data_dir, n_splits, n_jobs):
+    """
+    Score one parameter set with time-series cross-validation on the memory-mapped dataset.
+
+    :return: Trial record with per-fold and mean validation accuracy.
+    """
+    start_time = time.time()
+    X = np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(data_dir, 'y.npy'), mmap_mode='r')
+    fold_scores = []
+    for train_index, test_index in TimeSeriesSplit(n_splits=n_splits).split(X):
+        model = XGBClassifier(**params, n_estimators=n_estimators, tree_method='hist', n_jobs=n_jobs)
+        model.fit(X[train_index], y[train_index])
+        fold_scores.append(float(accuracy_score(y[test_index], model.predict(X[test_index]))))
+    return {
+        'trial_id': trial_id,
+        'params': params,
+        'n_estimators': n_estimators,
+        'fold_scores': fold_scores,
+        'score': float(np.mean(fold_scores)),
+        'seconds': time.time() - start_time,
+    }
+
+class HyperparameterSearch:
+    """
+    Parallel XGBoost hyperparameter search over cached features.
+
+    Trials run in a process pool; each trial gets an equal share of the cores for XGBoost's
+    own threads. Every finished trial is appended to a JSONL log, and the best configuration
+    is saved as a versioned artifact plus BEST_PARAMS_FILE, which training picks up.
+
+    method='random' evaluates n_trials sampled configurations with max_estimators rounds.
+    method='successive_halving' starts all n_trials with min_estimators rounds and keeps the
+    best 1/eta of them at each rung, multiplying the rounds by eta, up to max_estimators.
+    """
+    def __init__(self, method='successive_halving', n_trials=32, n_splits=5, min_estimators=50, max_estimators=400,
+                 eta=3, n_workers=None, seed=42, base_params=None, output_dir=SEARCH_DIR):
+        if method not in SEARCH_METHODS:
+            raise ValueError(f"Invalid search method: {method}. Must be one of {SEARCH_METHODS}.")
+        self.method = method
+        self.n_trials = n_trials
+        self.n_splits = n_splits
+        self.min_estimators = min_estimators
+        self.max_estimators = max_estimators
+        self.eta = eta
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.threads_per_trial = max(1, (os.cpu_count() or 1) // self.n_workers)
+        self.rng = np.random.default_rng(seed)
+        self.base_params = {key: value for key, value in (base_params or {}).items() if key in SEARCH_SPACE}
+        self.output_dir = output_dir
+        self.version = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        self.trial_log_path = os.path.join(output_dir, f"trials_{self.version}.jsonl")
+
+    def _candidates(self):
+        # The configured model_adjustments are always evaluated, so the search never picks a worse baseline
+        candidates = [dict(self.base_params)] if self.base_params else []
+        while len(candidates) < self.n_trials:
+            candidates.append(sample_params(self.rng))
+        return candidates
+
+    def _log_trial(self, record):
+        with open(self.trial_log_path, 'a') as log_file:
+            log_file.write(json.dumps(record) + '\n')
+
+    def _run_rung(self, executor, candidates, n_estimators, data_dir, rung):
+        futures = [
+            executor.submit(evaluate_trial, trial_id, params, n_estimators, data_dir, self.n_splits, self.threads_per_trial)
+            for trial_id, params in candidates
+        ]
+        results = []
+        for future in as_completed(futures):
+            try:
+                record = {**future.result(), 'rung': rung}
+            except Exception as e:
+                logger.error(f"Hyperparameter trial failed: {e}")
+                continue
+            self._log_trial(record)
+            logger.info(f"Trial {record['trial_id']} (rung {rung}, {n_estimators} rounds): "
+                        f"accuracy {record['score']:.4f} in {record['seconds']:.1f}s.")
+            results.append(record)
+        return sorted(results, key=lambda record: record['score'], reverse=True)
+
+    def run(self, X, y):
+        """
+        Run the search on a time-ordered feature matrix and labels.
+
+        :return: Best trial record, or None if every trial failed.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        data_dir = tempfile.mkdtemp(prefix='hyperparameter_search_')
+        start_time = time.time()
+        try:
+            # Workers memory-map the dataset instead of receiving a pickled copy per trial
+            np.save(os.path.join(data_dir, 'X.npy'), np.ascontiguousarray(X, dtype=np.float32))
+            np.save(os.path.join(data_dir, 'y.npy'), np.asarray(y, dtype=np.int32))
+            candidates = list(enumerate(self._candidates()))
+
+            with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+                if self.method == 'random':
+                    results = self._run_rung(executor, candidates, self.max_estimators, data_dir, 0)
+                else:
+                    n_estimators, rung = self.min_estimators, 0
+                    while True:
+                        results = self._run_rung(executor, candidates, n_estimators, data_dir, rung)
+                        if n_estimators >= self.max_estimators or len(results) <= 1:
+                            break
+                        keep = max(1, len(results) // self.eta)
+                        candidates = [(record['trial_id'], record['params']) for record in results[:keep]]
+                        n_estimators, rung = min(n_estimators * self.eta, self.max_estimators), rung + 1
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        if not results:
+            logger.error("Hyperparameter search produced no results.")
+            return None
+        best = results[0]
+        self._save_best(best, len(X), time.time() - start_time)
+        return best
+
+    def _save_best(self, best, n_rows, seconds):
+        artifact = {
+            'version': self.version,
+            'method': self.method,
+            'params': {**best['params'], 'n_estimators': best['n_estimators']},
+            'score': best['score'],
+            'fold_scores': best['fold_scores'],
+            'n_splits': self.n_splits,
+            'rows': n_rows,
+            'search_seconds': seconds,
+            'trial_log': os.path.basename(self.trial_log_path),
+        }
+        atomic_write_json(artifact, os.path.join(self.output_dir, f"best_{self.version}.json"))
+        atomic_write_json(artifact, os.path.join(self.output_dir, os.path.basename(BEST_PARAMS_FILE)))
+        logger.info(f"Best XGBoost parameters (accuracy {best['score']:.4f}) saved as version {self.version}.")
+
+def load_best_params(path=BEST_PARAMS_FILE):
+    """
+    :return: Best XGBoost parameters from the latest search, or an empty dictionary.
+    """
+    try:
+        with open(path) as params_file:
+            return json.load(params_file)['params']
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.error(f"Could not read hyperparameter search results from {path}: {e}")
+        return {}
+
+def xgboost_params(config):
+    """
+    XGBoost parameters for training: the config's model_adjustments, overridden by the best
+    searched parameters when a search has been run.
+    """
+    return {**config.get_model_adjustments('xgboost'), **load_best_params()}
+
+def build_search_dataset(frames):
+    """
+    Pool per-pair feature frames into one matrix ordered by time, so cross-validation folds
+    never train on bars later than the ones they are validated on.
+
+    :return: Tuple of (X, y) arrays.
+    """
+    pooled = pd.concat(frames.values()).sort_index(kind='stable')
+    return pooled[FEATURE_COLUMNS].to_numpy(dtype=np.float32), label_actions(pooled).map(LABEL_MAP).to_numpy()
+
+def run_search(client, pairs, settings, base_params=None, indicator_mode='simple'):
+    """
+    Sync and load cached features for the pairs, then run a hyperparameter search.
+
+    :param settings: Dictionary from Config.get_hyperparameter_search_settings.
+    :return: Best trial record, or None.
+    """
+    frames = load_training_frames(client, pairs, settings['interval'], settings['lookback'], indicator_mode)
+    if not frames:
+        logger.error("No data available for the hyperparameter search.")
+        return None
+    X, y = build_search_dataset(frames)
+    search = HyperparameterSearch(settings['method'], settings['n_trials'], settings['n_splits'],
+                                  settings['min_estimators'], settings['max_estimators'], settings['eta'],
+                                  settings['n_workers'], settings['seed'], base_params)
+    logger.info(f"Starting {search.method} search: {search.n_trials} trials on {len(X)} rows, "
+                f"{search.n_workers} workers x {search.threads_per_trial} threads.")
+    return search.run(X, y)
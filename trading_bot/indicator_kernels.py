@@ -0,0 +1,209 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Numba is optional; without it the same kernels run as NumPy code, vectorized across symbols
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+def _kernel(func):
+    if NUMBA_AVAILABLE:
+        return njit(cache=True)(func)
+    return func
+
+# Input/output shape handling: kernels work on (n_bars, n_symbols) arrays
+def _as_2d(*arrays):
+    converted = [np.ascontiguousarray(np.asarray(array, dtype=np.float64)) for array in arrays]
+    squeeze = converted[0].ndim == 1
+    if squeeze:
+        converted = [array.reshape(-1, 1) for array in converted]
+    return converted, squeeze
+
+def _restore(result, squeeze):
+    return result[:, 0] if squeeze else result
+
+@_kernel
+def _wilder_smooth(x, period, start):
+    n, m = x.shape
+    out = np.full((n, m), np.nan)
+    if n - start < period:
+        return out
+    total = np.zeros(m)
+    for t in range(start, start + period):
+        total += x[t]
+    previous = total / period
+    out[start + period - 1] = previous
+    for t in range(start + period, n):
+        previous = previous + (x[t] - previous) / period
+        out[t] = previous
+    return out
+
+# Without Numba, the Wilder recursion runs as a first-order IIR filter in SciPy (a scikit-learn dependency)
+if not NUMBA_AVAILABLE:
+    try:
+        from scipy.signal import lfilter
+
+        def _wilder_smooth(x, period, start):
+            n, m = x.shape
+            out = np.full((n, m), np.nan)
+            if n - start < period:
+                return out
+            seed = x[start:start + period].mean(axis=0)
+            out[start + period - 1] = seed
+            decay = 1.0 - 1.0 / period
+            if n > start + period:
+                out[start + period:], _ = lfilter([1.0 / period], [1.0, -decay], x[start + period:], axis=0,
+                                                  zi=(decay * seed).reshape(1, -1))
+            return out
+    except ImportError:
+        logger.info("Neither Numba nor SciPy available; Wilder smoothing runs as a NumPy loop.")
+
+# Non-recursive steps are whole-array expressions, so they are fast with or without Numba
+@_kernel
+def _true_range(high, low, close):
+    tr = high - low
+    tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(high[1:] - close[:-1]), np.abs(low[1:] - close[:-1])))
+    return tr
+
+@_kernel
+def _rsi(close, period):
+    n, m = close.shape
+    gain = np.zeros((n, m))
+    loss = np.zeros((n, m))
+    delta = close[1:] - close[:-1]
+    gain[1:] = np.maximum(delta, 0.0)
+    loss[1:] = np.maximum(-delta, 0.0)
+    average_gain = _wilder_smooth(gain, period, 1)
+    average_loss = _wilder_smooth(loss, period, 1)
+    safe_loss = np.where(average_loss == 0, 1.0, average_loss)
+    rsi = np.where(average_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + average_gain / safe_loss))
+    rsi[:period] = np.nan
+    return rsi
+
+@_kernel
+def _adx(high, low, close, period):
+    n, m = high.shape
+    plus_dm = np.zeros((n, m))
+    minus_dm = np.zeros((n, m))
+    up_move = high[1:] - high[:-1]
+    down_move = low[:-1] - low[1:]
+    plus_dm[1:] = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
+    minus_dm[1:] = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
+    tr = _true_range(high, low, close)
+    smoothed_tr = _wilder_smooth(tr, period, 1)
+    smoothed_plus = _wilder_smooth(plus_dm, period, 1)
+    smoothed_minus = _wilder_smooth(minus_dm, period, 1)
+
+    valid_tr = smoothed_tr > 0
+    safe_tr = np.where(valid_tr, smoothed_tr, 1.0)
+    di_plus = np.where(valid_tr, 100.0 * smoothed_plus / safe_tr, 0.0)
+    di_minus = np.where(valid_tr, 100.0 * smoothed_minus / safe_tr, 0.0)
+    di_sum = di_plus + di_minus
+    dx = np.where(di_sum > 0, 100.0 * np.abs(di_plus - di_minus) / np.where(di_sum > 0, di_sum, 1.0), 0.0)
+    di_plus[:period] = np.nan
+    di_minus[:period] = np.nan
+    dx[:period] = 0.0
+    adx = _wilder_smooth(dx, period, period)
+    return adx, di_plus, di_minus
+
+@_kernel
+def _supertrend(high, low, close, atr, multiplier, first):
+    n, m = close.shape
+    line = np.full((n, m), np.nan)
+    direction = np.zeros((n, m))
+    if first >= n:
+        return line, direction
+    hl2 = (high + low) / 2.0
+    upper = hl2[first] + multiplier * atr[first]
+    lower = hl2[first] - multiplier * atr[first]
+    trend = np.ones(m)
+    line[first] = lower
+    direction[first] = trend
+    for t in range(first + 1, n):
+        basic_upper = hl2[t] + multiplier * atr[t]
+        basic_lower = hl2[t] - multiplier * atr[t]
+        upper = np.where((basic_upper < upper) | (close[t - 1] > upper), basic_upper, upper)
+        lower = np.where((basic_lower > lower) | (close[t - 1] < lower), basic_lower, lower)
+        trend = np.where(trend > 0, np.where(close[t] < lower, -1.0, 1.0), np.where(close[t] > upper, 1.0, -1.0))
+        line[t] = np.where(trend > 0, lower, upper)
+        direction[t] = trend
+    return line, direction
+
+@_kernel
+def _parabolic_sar(high, low, af_start, af_step, af_max):
+    n, m = high.shape
+    sar_out = np.full((n, m), np.nan)
+    direction = np.zeros((n, m))
+    if n < 3:
+        return sar_out, direction
+    up = high[1] >= high[0]
+    sar = np.where(up, low[0], high[0])
+    extreme = np.where(up, high[1], low[1])
+    af = np.full(m, af_start)
+    sar_out[1] = sar
+    direction[1] = np.where(up, 1.0, -1.0)
+    for t in range(2, n):
+        candidate = sar + af * (extreme - sar)
+        candidate = np.where(up, np.minimum(candidate, np.minimum(low[t - 1], low[t - 2])),
+                             np.maximum(candidate, np.maximum(high[t - 1], high[t - 2])))
+        reversed_ = np.where(up, low[t] < candidate, high[t] > candidate)
+        new_up = np.where(reversed_, np.logical_not(up), up)
+        candidate = np.where(reversed_, extreme, candidate)
+
+        new_high = np.logical_and(np.logical_not(reversed_), np.logical_and(up, high[t] > extreme))
+        new_low = np.logical_and(np.logical_not(reversed_), np.logical_and(np.logical_not(up), low[t] < extreme))
+        extreme = np.where(reversed_, np.where(new_up, high[t], low[t]),
+                           np.where(new_high, high[t], np.where(new_low, low[t], extreme)))
+        af = np.where(reversed_, af_start,
+                      np.where(np.logical_or(new_high, new_low), np.minimum(af + af_step, af_max), af))
+        up = new_up
+        sar = candidate
+        sar_out[t] = sar
+        direction[t] = np.where(up, 1.0, -1.0)
+    return sar_out, direction
+
+# Public array API: accepts (n_bars,) or (n_bars, n_symbols) arrays
+def wilder_smooth(values, period=14, start=0):
+    (values,), squeeze = _as_2d(values)
+    return _restore(_wilder_smooth(values, period, start), squeeze)
+
+def true_range(high, low, close):
+    (high, low, close), squeeze = _as_2d(high, low, close)
+    return _restore(_true_range(high, low, close), squeeze)
+
+def wilder_atr(high, low, close, period=14):
+    (high, low, close), squeeze = _as_2d(high, low, close)
+    return _restore(_wilder_smooth(_true_range(high, low, close), period, 0), squeeze)
+
+def wilder_rsi(close, period=14):
+    (close,), squeeze = _as_2d(close)
+    return _restore(_rsi(close, period), squeeze)
+
+def wilder_adx(high, low, close, period=14):
+    """
+    :return: Tuple of (adx, di_plus, di_minus) arrays.
+    """
+    (high, low, close), squeeze = _as_2d(high, low, close)
+    adx, di_plus, di_minus = _adx(high, low, close, period)
+    return _restore(adx, squeeze), _restore(di_plus, squeeze), _restore(di_minus, squeeze)
+
+def supertrend(high, low, close, period=10, multiplier=3.0):
+    """
+    :return: Tuple of (supertrend line, direction) arrays; direction is 1 (up) or -1 (down).
+    """
+    (high, low, close), squeeze = _as_2d(high, low, close)
+    atr = _wilder_smooth(_true_range(high, low, close), period, 0)
+    line, direction = _supertrend(high, low, close, atr, float(multiplier), period - 1)
+    return _restore(line, squeeze), _restore(direction, squeeze)
+
+def parabolic_sar(high, low, af_start=0.02, af_step=0.02, af_max=0.2):
+    """
+    :return: Tuple of (sar, direction) arrays; direction is 1 (long) or -1 (short).
+    """
+    (high, low), squeeze = _as_2d(high, low)
+    sar, direction = _parabolic_sar(high, low, float(af_start), float(af_step), float(af_max))
+    return _restore(sar, squeeze), _restore(direction, squeeze)
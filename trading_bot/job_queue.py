@@ -0,0 +1,365 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_DIR = os.path.join(os.path.dirname(__file__), 'jobs')
+PENDING_DIR = 'pending'
+CLAIMED_DIR = 'claimed'
+JOB_FILE = 'job.json'
+PROGRESS_FILE = 'progress.jsonl'
+ARTIFACTS_DIR = 'artifacts'
+CANCEL_FILE = 'cancel'
+FINAL_STATES = ('succeeded', 'failed', 'cancelled')
+DEFAULT_WORKERS = 2
+DEFAULT_MEMORY_LIMIT_MB = 4096
+DEFAULT_CPU_TIME_LIMIT_S = 3600
+DEFAULT_TIMEOUT_S = 7200
+POLL_INTERVAL = 1.0
+ORPHAN_GRACE_S = 60  # A claim younger than this may belong to a runner that has not recorded itself yet
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as json_file:
+        json.dump(data, json_file, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+# Job functions, run in a worker process: job(params, output_dir, progress) -> JSON-serializable result
+def backtest_job(params, output_dir, progress):
+    from backtest import run_backtest
+    summary = run_backtest(output_dir=output_dir, show_plots=False, progress=progress, pairs=params.get('pairs'))
+    if summary.empty:
+        return {'pairs': 0}
+    return {'pairs': len(summary), 'total_profit_loss': float(summary['profit_loss'].sum()),
+            'results': summary.drop(columns=['equity_curve']).to_dict(orient='records')}
+
+def retrain_xgboost_job(params, output_dir, progress):
+    from binance.client import Client
+    from config import get_config
+    from model_training import retrain_xgboost
+    from hyperparameter_search import xgboost_params
+    from shadow import candidate_path
+
+    config = get_config()
+    api_key, api_secret = config.get_api_credentials()
+    pairs = params.get('pairs') or config.get_trading_pairs()
+    shadow_settings = config.get_shadow_settings()
+    progress(0.0, f"Retraining XGBoost on {', '.join(pairs)}")
+    # As in periodic retraining, shadow mode turns the retrained model into a candidate
+    model, metadata = retrain_xgboost(Client(api_key, api_secret), pairs, params.get('interval', '1h'),
+                                      params.get('lookback', '2 months ago UTC'), params=xgboost_params(config),
+                                      indicator_mode=config.get_indicator_mode(),
+                                      candidate_path=candidate_path(shadow_settings['retrain_candidate'])
+                                      if shadow_settings['enabled'] else None)
+    if model is None:
+        raise RuntimeError("No data available for retraining.")
+    _write_json(os.path.join(output_dir, 'metadata.json'), metadata)
+    progress(1.0, f"Validation accuracy {metadata['validation_accuracy']:.4f}")
+    return metadata
+
+JOB_KINDS = {
+    'backtest': backtest_job,
+    'retrain_xgboost': retrain_xgboost_job,
+}
+
+class JobQueue:
+    """
+    Directory-backed job queue shared by every process on the host.
+
+    Each job has a directory with job.json (spec and state), progress.jsonl (appended
+    progress events) and artifacts/. A job is queued as a token file in pending/; a runner
+    claims it by renaming the token into claimed/, which succeeds for exactly one runner.
+    Submitting only writes files, so Telegram and web handlers return immediately.
+    """
+    def __init__(self, root=JOB_QUEUE_DIR):
+        self.root = root
+        for directory in (PENDING_DIR, CLAIMED_DIR):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    def _job_dir(self, job_id):
+        if os.path.basename(job_id) != job_id or job_id in ('', '.', '..', PENDING_DIR, CLAIMED_DIR):
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.root, job_id)
+
+    def submit(self, kind, params=None, user=None):
+        """
+        :param user: Owner of the job (e.g. 'telegram:<id>' or 'web:<id>').
+        :return: The job id.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}. Must be one of {list(JOB_KINDS)}.")
+        job_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        job_dir = self._job_dir(job_id)
+        os.makedirs(os.path.join(job_dir, ARTIFACTS_DIR))
+        _write_json(os.path.join(job_dir, JOB_FILE), {
+            'id': job_id, 'kind': kind, 'params': params or {}, 'user': user, 'state': 'queued',
+            'submitted_at': time.time()
+        })
+        open(os.path.join(self.root, PENDING_DIR, job_id), 'w').close()
+        logger.info(f"Queued {kind} job {job_id} for {user}.")
+        return job_id
+
+    def claim(self):
+        """
+        :return: The oldest pending job id, now owned by the caller, or None.
+        """
+        for job_id in sorted(os.listdir(os.path.join(self.root, PENDING_DIR))):
+            try:
+                os.rename(os.path.join(self.root, PENDING_DIR, job_id), os.path.join(self.root, CLAIMED_DIR, job_id))
+                return job_id
+            except FileNotFoundError:
+                continue  # Claimed or cancelled by someone else
+        return None
+
+    def claimed(self):
+        """
+        :return: Ids of the jobs currently claimed by some runner, with the time each claim was made.
+        """
+        claims = {}
+        for job_id in os.listdir(os.path.join(self.root, CLAIMED_DIR)):
+            try:
+                claims[job_id] = os.stat(os.path.join(self.root, CLAIMED_DIR, job_id)).st_ctime  # Renaming sets ctime
+            except FileNotFoundError:
+                continue
+        return claims
+
+    def release(self, job_id):
+        try:
+            os.remove(os.path.join(self.root, CLAIMED_DIR, job_id))
+        except FileNotFoundError:
+            pass
+
+    def get(self, job_id):
+        job_dir = self._job_dir(job_id)
+        try:
+            with open(os.path.join(job_dir, JOB_FILE)) as job_file:
+                job = json.load(job_file)
+        except FileNotFoundError:
+            return None
+        events = self.progress(job_id)
+        job['progress'] = events[-1] if events else None
+        job['artifacts'] = sorted(os.listdir(os.path.join(job_dir, ARTIFACTS_DIR)))
+        return job
+
+    def update(self, job_id, **fields):
+        # Only the process that owns the job's current state writes job.json
+        path = os.path.join(self._job_dir(job_id), JOB_FILE)
+        with open(path) as job_file:
+            job = json.load(job_file)
+        job.update(fields)
+        _write_json(path, job)
+        return job
+
+    def list(self, user=None, limit=20):
+        jobs = []
+        for job_id in sorted(os.listdir(self.root), reverse=True):
+            if job_id in (PENDING_DIR, CLAIMED_DIR) or not os.path.isdir(os.path.join(self.root, job_id)):
+                continue
+            job = self.get(job_id)
+            if job and (user is None or job['user'] == user):
+                jobs.append(job)
+                if len(jobs) >= limit:
+                    break
+        return jobs
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued job at once, or ask the runner to terminate a running one.
+        """
+        try:
+            os.remove(os.path.join(self.root, PENDING_DIR, job_id))
+            self.update(job_id, state='cancelled', finished_at=time.time())
+            return True
+        except FileNotFoundError:
+            pass
+        job = self.get(job_id)
+        if job is None or job['state'] in FINAL_STATES:
+            return False
+        open(os.path.join(self._job_dir(job_id), CANCEL_FILE), 'w').close()
+        return True
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(os.path.join(self._job_dir(job_id), CANCEL_FILE))
+
+    # Progress and artifacts
+    def report_progress(self, job_id, fraction, message):
+        with open(os.path.join(self._job_dir(job_id), PROGRESS_FILE), 'a') as progress_file:
+            progress_file.write(json.dumps({'time': time.time(), 'fraction': fraction, 'message': message}) + '\n')
+
+    def progress(self, job_id, since=0):
+        """
+        :param since: Number of events the caller has already seen.
+        :return: Progress events after the first `since` ones.
+        """
+        path = os.path.join(self._job_dir(job_id), PROGRESS_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as progress_file:
+            lines = progress_file.read().splitlines()
+        return [json.loads(line) for line in lines[since:] if line]
+
+    def artifacts_dir(self, job_id):
+        return os.path.join(self._job_dir(job_id), ARTIFACTS_DIR)
+
+    def artifact_path(self, job_id, name):
+        """
+        :return: Path of an artifact, or None if it does not exist.
+        """
+        if os.path.basename(name) != name:
+            return None
+        path = os.path.join(self.artifacts_dir(job_id), name)
+        return path if os.path.isfile(path) else None
+
+def _apply_limits(memory_limit_mb, cpu_time_limit_s):
+    try:
+        import resource
+    except ImportError:
+        logger.warning("Resource limits are not supported on this platform.")
+        return
+    if memory_limit_mb:
+        limit = int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_time_limit_s:
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_time_limit_s), int(cpu_time_limit_s) + 5))
+
+def _job_process(root, job_id, memory_limit_mb, cpu_time_limit_s):
+    """
+    Entry point of a job's worker process.
+    """
+    _apply_limits(memory_limit_mb, cpu_time_limit_s)
+    import matplotlib
+    matplotlib.use('Agg')  # Jobs save figures instead of opening windows
+
+    queue = JobQueue(root)
+    job = queue.update(job_id, state='running', started_at=time.time(), pid=os.getpid())
+    try:
+        result = JOB_KINDS[job['kind']](job['params'], queue.artifacts_dir(job_id),
+                                        lambda fraction, message: queue.report_progress(job_id, fraction, message))
+        queue.update(job_id, state='succeeded', result=result, finished_at=time.time())
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        queue.update(job_id, state='failed', error=str(e) or type(e).__name__, traceback=traceback.format_exc(),
+                     finished_at=time.time())
+
+class JobRunner:
+    """
+    Runs queued jobs in worker processes, at most n_workers at a time.
+
+    Every job gets its own spawned process with address-space and CPU-time rlimits, and is
+    terminated after timeout_s or when cancelled. A process that dies without recording a
+    result (e.g. killed by a limit) is marked failed with its exit code. Jobs left claimed by
+    a runner that died are marked failed when the next runner starts.
+    """
+    def __init__(self, queue=None, n_workers=DEFAULT_WORKERS, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+                 cpu_time_limit_s=DEFAULT_CPU_TIME_LIMIT_S, timeout_s=DEFAULT_TIMEOUT_S):
+        self.queue = queue or JobQueue()
+        self.n_workers = n_workers
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_time_limit_s = cpu_time_limit_s
+        self.timeout_s = timeout_s
+        self.running = {}
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.recover_orphans()
+        self._thread = threading.Thread(target=self._supervise, name='job-runner', daemon=True)
+        self._thread.start()
+        logger.info(f"Job runner started with {self.n_workers} worker(s).")
+
+    def run_forever(self):
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        self._stop_event.set()
+        for job_id, (process, _) in list(self.running.items()):
+            process.terminate()
+            self._finish(job_id, process, state='cancelled', error="Job runner stopped.")
+
+    def recover_orphans(self, grace_s=ORPHAN_GRACE_S):
+        """
+        Fail claimed jobs whose runner and worker process are both gone, so they are not shown as running forever.
+
+        :return: Ids of the recovered jobs.
+        """
+        recovered = []
+        now = time.time()
+        for job_id, claimed_at in self.queue.claimed().items():
+            if job_id in self.running or now - claimed_at < grace_s:
+                continue
+            job = self.queue.get(job_id)
+            if job is not None and job['state'] not in FINAL_STATES:
+                if _pid_alive(job.get('runner_pid')) or _pid_alive(job.get('pid')):
+                    continue
+                self.queue.update(job_id, state='failed', error="Job runner exited before the job finished.",
+                                  finished_at=now)
+            self.queue.release(job_id)
+            recovered.append(job_id)
+            logger.warning(f"Recovered orphaned job {job_id}.")
+        return recovered
+
+    def _supervise(self):
+        while not self._stop_event.is_set():
+            try:
+                self._reap()
+                while len(self.running) < self.n_workers:
+                    job_id = self.queue.claim()
+                    if job_id is None:
+                        break
+                    self.queue.update(job_id, runner_pid=os.getpid())
+                    process = self._context.Process(
+                        target=_job_process, name=f"job-{job_id}",
+                        args=(self.queue.root, job_id, self.memory_limit_mb, self.cpu_time_limit_s)
+                    )
+                    process.start()
+                    self.running[job_id] = (process, time.time())
+                    logger.info(f"Started job {job_id} (pid {process.pid}).")
+            except Exception as e:
+                logger.error(f"Job runner error: {e}", exc_info=True)
+            self._stop_event.wait(POLL_INTERVAL)
+
+    def _reap(self):
+        now = time.time()
+        for job_id, (process, started) in list(self.running.items()):
+            if not process.is_alive():
+                self._finish(job_id, process)
+            elif self.queue.cancel_requested(job_id):
+                process.terminate()
+                self._finish(job_id, process, state='cancelled', error="Cancelled.")
+            elif self.timeout_s and now - started > self.timeout_s:
+                process.terminate()
+                self._finish(job_id, process, state='failed', error=f"Timed out after {self.timeout_s}s.")
+
+    def _finish(self, job_id, process, state=None, error=None):
+        process.join(timeout=10)
+        self.running.pop(job_id, None)
+        self.queue.release(job_id)
+        job = self.queue.get(job_id)
+        if state is None and job is not None and job['state'] not in FINAL_STATES:
+            state, error = 'failed', f"Worker exited with code {process.exitcode} (resource limit or crash)."
+        if state is not None:
+            self.queue.update(job_id, state=state, error=error, finished_at=time.time())
+        logger.info(f"Job {job_id} finished: {state or job['state']}.")
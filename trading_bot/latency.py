@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Instrumentation is off until configure() enables it
+_enabled = False
+_histograms = {}
+_registry_lock = threading.Lock()
+_export_settings = {}
+_last_export = 0.0
+
+DEFAULT_SIGNIFICANT_BITS = 7  # ~0.8% relative bucket width
+REPORTED_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram.
+
+    Values (in microseconds) are bucketed by keeping a fixed number of significant
+    bits, so the relative error stays bounded from microseconds up to minutes while
+    memory only grows with the number of distinct magnitudes seen.
+    """
+    def __init__(self, significant_bits=DEFAULT_SIGNIFICANT_BITS):
+        self.significant_bits = significant_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _bucket(self, value):
+        shift = max(value.bit_length() - self.significant_bits, 0)
+        return (value >> shift) << shift
+
+    def _bucket_upper(self, bucket):
+        shift = max(bucket.bit_length() - self.significant_bits, 0)
+        return bucket + (1 << shift) - 1
+
+    def record(self, value_us):
+        value = max(int(value_us), 0)
+        bucket = self._bucket(value)
+        with self._lock:
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+            self.count += 1
+            self.total += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, quantile):
+        """
+        Return the highest value equivalent to the given quantile (0-1), in microseconds.
+        """
+        with self._lock:
+            if not self.count:
+                return 0
+            target = max(1, int(round(quantile * self.count)))
+            seen = 0
+            for bucket in sorted(self.counts):
+                seen += self.counts[bucket]
+                if seen >= target:
+                    return min(self._bucket_upper(bucket), self.max)
+            return self.max
+
+    def snapshot(self):
+        with self._lock:
+            count, total = self.count, self.total
+            minimum, maximum = self.min or 0, self.max or 0
+        snapshot = {
+            'count': count,
+            'min_us': minimum,
+            'max_us': maximum,
+            'mean_us': total / count if count else 0.0,
+            'sum_us': total,
+        }
+        for quantile in REPORTED_QUANTILES:
+            snapshot[f"p{quantile * 100:g}_us"] = self.percentile(quantile)
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+            self.count = 0
+            self.total = 0
+            self.min = None
+            self.max = None
+
+class _NullTimer:
+    """
+    Shared no-op context manager returned when instrumentation is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageTimer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, (time.perf_counter_ns() - self.start) / 1000)
+        return False
+
+def configure(settings):
+    """
+    Enable or disable latency instrumentation.
+
+    :param settings: Dictionary from Config.get_latency_settings().
+    """
+    global _enabled, _export_settings
+    _export_settings = dict(settings or {})
+    _enabled = bool(_export_settings.get('enabled', False))
+    if _enabled:
+        logger.info(f"Latency instrumentation enabled ({_export_settings.get('export_format', 'prometheus')} export).")
+
+def is_enabled():
+    return _enabled
+
+def get_histogram(stage):
+    histogram = _histograms.get(stage)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(stage, LatencyHistogram())
+    return histogram
+
+def record(stage, value_us):
+    """
+    Record a latency sample for a stage, in microseconds.
+    """
+    if _enabled:
+        get_histogram(stage).record(value_us)
+
+def timed(stage):
+    """
+    Context manager timing the enclosed block under the given stage name.
+    Returns a shared no-op object when instrumentation is disabled.
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _StageTimer(stage)
+
+def instrument(stage):
+    """
+    Decorator timing every call of the wrapped function under the given stage name.
+    """
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                get_histogram(stage).record((time.perf_counter_ns() - start) / 1000)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+def reset():
+    for histogram in list(_histograms.values()):
+        histogram.reset()
+
+def export_json():
+    """
+    Export all stage histograms as a JSON document.
+    """
+    stages = {stage: histogram.snapshot() for stage, histogram in sorted(_histograms.items())}
+    return json.dumps({'timestamp': time.time(), 'stages': stages}, indent=2)
+
+def export_prometheus(metric_name='trading_bot_stage_latency_seconds'):
+    """
+    Export all stage histograms in the Prometheus text exposition format (summary type).
+    """
+    lines = [
+        f"# HELP {metric_name} Latency of each stage of the signal-to-order path.",
+        f"# TYPE {metric_name} summary",
+    ]
+    for stage, histogram in sorted(_histograms.items()):
+        snapshot = histogram.snapshot()
+        for quantile in REPORTED_QUANTILES:
+            value = histogram.percentile(quantile) / 1e6
+            lines.append(f'{metric_name}{{stage="{stage}",quantile="{quantile:g}"}} {value:.9f}')
+        lines.append(f'{metric_name}_sum{{stage="{stage}"}} {snapshot["sum_us"] / 1e6:.9f}')
+        lines.append(f'{metric_name}_count{{stage="{stage}"}} {snapshot["count"]}')
+    return "\n".join(lines) + "\n"
+
+def write_export(path=None, export_format=None):
+    """
+    Write the current histograms to disk in the configured format.
+    """
+    export_format = export_format or _export_settings.get('export_format', 'prometheus')
+    path = path or _export_settings.get('export_path', 'latency_metrics.prom')
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(__file__), path)
+    content = export_json() if export_format == 'json' else export_prometheus()
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as export_file:
+            export_file.write(content)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.error(f"Failed to write latency export to {path}: {e}")
+
+def maybe_export():
+    """
+    Write an export if instrumentation is enabled and the export interval has elapsed.
+    """
+    global _last_export
+    if not _enabled:
+        return
+    now = time.monotonic()
+    if now - _last_export >= _export_settings.get('export_interval', 60):
+        _last_export = now
+        write_export()
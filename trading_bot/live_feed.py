@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from error_handler import handle_error
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.dirname(__file__), 'live_feed.sock')
+DEFAULT_ACCOUNT_INTERVAL = 5.0
+MAX_DATAGRAM_SIZE = 65536
+TOPICS = ('equity', 'positions', 'signal', 'status')
+
+class LiveFeedPublisher:
+    """
+    Publishes live updates (equity, positions, signals) from the trading process.
+
+    Each update is one JSON datagram on a non-blocking Unix socket bound by the web app. A send
+    never waits: when nobody is listening or the receiver's buffer is full, the update is
+    dropped and counted, so a slow or missing dashboard cannot slow the trading loop.
+    Equity and positions come from REST calls, so they are polled on a background thread.
+    """
+    def __init__(self, address=DEFAULT_SOCKET_PATH):
+        self.address = address
+        self.sent = 0
+        self.dropped = 0
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def publish(self, topic, data, key=None):
+        """
+        :param key: Updates with the same topic and key replace each other (e.g. the symbol of a signal).
+        """
+        message = json.dumps({'topic': topic, 'key': key, 'time': time.time(), 'data': data}, default=str)
+        try:
+            self._socket.sendto(message.encode(), self.address)
+            self.sent += 1
+        except (BlockingIOError, FileNotFoundError, ConnectionRefusedError):
+            self.dropped += 1
+        except OSError as e:
+            self.dropped += 1
+            logger.debug(f"Live feed update dropped: {e}")
+
+    def start_account_updates(self, account_provider, positions_provider, interval=DEFAULT_ACCOUNT_INTERVAL):
+        """
+        :param account_provider: Callable returning client.futures_account().
+        :param positions_provider: Callable returning open positions (e.g. BotState.positions).
+        """
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    account = account_provider()
+                    self.publish('equity', {
+                        'equity': float(account.get('totalMarginBalance', 0)),
+                        'wallet_balance': float(account.get('totalWalletBalance', 0)),
+                        'available_balance': float(account.get('availableBalance', 0)),
+                        'unrealized_pnl': float(account.get('totalUnrealizedProfit', 0)),
+                    })
+                    self.publish('positions', positions_provider())
+                except Exception as e:
+                    handle_error(e, error_type="Live Feed", critical=False)
+
+        self._thread = threading.Thread(target=run, name='live-feed-account', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._socket.close()
+
+class LiveFeedBroker:
+    """
+    In-memory pub/sub that fans updates out to any number of stream clients.
+
+    Only the latest update per (topic, key) is kept, tagged with a global version number.
+    A client remembers the last version it sent and, when woken, receives every entry newer
+    than that. Bursts are coalesced into one message per key, a slow client skips the
+    intermediate values instead of building a queue, and memory does not grow with the number
+    of clients. Publishing costs one dict write and one notify.
+    """
+    def __init__(self, max_clients=100):
+        self.max_clients = max_clients
+        self.clients = 0
+        self.version = 0
+        self._latest = {}  # (topic, key) -> (version, update)
+        self._condition = threading.Condition()
+
+    def publish(self, update):
+        with self._condition:
+            self.version += 1
+            self._latest[(update.get('topic'), update.get('key'))] = (self.version, update)
+            self._condition.notify_all()
+
+    def connect(self):
+        """
+        Register a stream client. Returns False when max_clients are already connected.
+        """
+        with self._condition:
+            if self.clients >= self.max_clients:
+                return False
+            self.clients += 1
+            return True
+
+    def disconnect(self):
+        with self._condition:
+            self.clients -= 1
+
+    def wait(self, since=0, timeout=15.0):
+        """
+        Wait up to timeout seconds for updates newer than version since.
+
+        :return: (latest version, updates newer than since in version order); the updates are empty on timeout.
+        """
+        with self._condition:
+            if since > self.version:
+                since = 0  # The web app restarted; send the current state again
+            self._condition.wait_for(lambda: self.version > since, timeout)
+            updates = sorted((entry for entry in self._latest.values() if entry[0] > since), key=lambda entry: entry[0])
+            return self.version, updates
+
+class LiveFeedReceiver:
+    """
+    Binds the live feed socket in the web app and publishes each received update to a broker.
+    """
+    def __init__(self, broker, address=DEFAULT_SOCKET_PATH):
+        self.broker = broker
+        self.address = address
+        self._socket = None
+        self._thread = None
+
+    def start(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # Left behind by a process that did not shut down cleanly
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.address)
+        os.chmod(self.address, 0o600)
+        self._thread = threading.Thread(target=self._receive, name='live-feed-receiver', daemon=True)
+        self._thread.start()
+        logger.info(f"Live feed listening on {self.address}.")
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _receive(self):
+        while self._socket is not None:
+            try:
+                message = self._socket.recv(MAX_DATAGRAM_SIZE)
+            except OSError:
+                break  # Socket closed
+            try:
+                self.broker.publish(json.loads(message))
+            except ValueError as e:
+                logger.warning(f"Invalid live feed update: {e}")
+
+# Process-wide publisher; publishing is a no-op until configure() enables it
+_publisher = None
+
+def configure(settings):
+    """
+    :param settings: Dictionary from Config.get_live_feed_settings().
+    """
+    global _publisher
+    if _publisher is not None:
+        _publisher.close()
+        _publisher = None
+    if settings.get('enabled'):
+        _publisher = LiveFeedPublisher(settings['socket_path'])
+    return _publisher
+
+def get_publisher():
+    return _publisher
+
+def publish(topic, data, key=None):
+    if _publisher is not None:
+        _publisher.publish(topic, data, key)
+
+def close():
+    if _publisher is not None:
+        _publisher.close()
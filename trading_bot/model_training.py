@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+import joblib
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import accuracy_score
+from xgboost import XGBClassifier
+from data_fetching import get_historical_data
+from dataset_builder import DatasetBuilder
+from feature_store import FeatureStore, feature_set_version
+from strategy import FEATURE_COLUMNS, LABEL_MAP, XGB_MODEL_FILE, label_actions
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+XGB_ARTIFACT_DIR = os.path.join(MODELS_DIR, 'xgboost')
+
+DEFAULT_XGB_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 6,
+    'learning_rate': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+}
+VALIDATION_FRACTION = 0.2
+MAX_WARM_START_TREES = 2000  # Refit from scratch once the warm-started booster grows past this
+
+# Atomic file writes
+def atomic_dump(obj, path):
+    """
+    Serialize an object with joblib so readers never see a partially written file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+def atomic_write_json(data, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as json_file:
+        json.dump(data, json_file, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+# Training data from the feature store
+def load_training_frames(client, pairs, interval='1h', lookback='2 months ago UTC', indicator_mode='simple',
+                         feature_store=None):
+    """
+    Sync recent klines for each pair into the feature store and return the full stored features.
+
+    :return: Dictionary mapping each pair to its feature DataFrame.
+    """
+    feature_store = feature_store or FeatureStore()
+    frames = {}
+    for pair in pairs:
+        klines = get_historical_data(client, pair, interval, lookback)
+        if klines is None or klines.empty:
+            logger.warning(f"No recent data for {pair}. Using stored features only.")
+            features = feature_store.load(pair, interval, indicator_mode)
+        else:
+            feature_store.get_features(pair, interval, klines, indicator_mode)
+            features = feature_store.load(pair, interval, indicator_mode)
+        if features is not None and not features.empty:
+            frames[pair] = features
+    return frames
+
+def time_ordered_split(frames, validation_fraction=VALIDATION_FRACTION):
+    """
+    Split each pair's history by time and pool the parts: every validation row is later
+    than every training row of the same pair.
+
+    :return: Tuple of (X_train, X_valid, y_train, y_valid).
+    """
+    train_parts, valid_parts = [], []
+    for features in frames.values():
+        split = int(len(features) * (1 - validation_fraction))
+        train_parts.append(features.iloc[:split])
+        valid_parts.append(features.iloc[split:])
+    train = pd.concat(train_parts)
+    valid = pd.concat(valid_parts)
+    return (train[FEATURE_COLUMNS], valid[FEATURE_COLUMNS],
+            label_actions(train).map(LABEL_MAP), label_actions(valid).map(LABEL_MAP))
+
+# Versioned model artifacts
+def save_xgboost_artifact(model, metadata, production_path=XGB_MODEL_FILE, promote=True):
+    """
+    Save a versioned copy of the model with its metadata, and atomically replace the
+    production model file when promote is set.
+
+    :return: Path of the versioned artifact.
+    """
+    version = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    artifact_path = os.path.join(XGB_ARTIFACT_DIR, f"xgboost_{version}.pkl")
+    atomic_dump(model, artifact_path)
+    atomic_write_json({**metadata, 'version': version, 'promoted': promote},
+                      os.path.join(XGB_ARTIFACT_DIR, f"xgboost_{version}.json"))
+    if promote:
+        atomic_dump(model, production_path)
+        logger.info(f"XGBoost model {version} promoted to {production_path}.")
+    return artifact_path
+
+def _load_previous_model(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        logger.error(f"Could not load previous XGBoost model from {path}: {e}")
+        return None
+
+# Retraining pipeline
+def retrain_xgboost(client, pairs, interval='1h', lookback='2 months ago UTC', params=None, warm_start=True,
+                    n_jobs=-1, indicator_mode='simple', production_path=XGB_MODEL_FILE, feature_store=None,
+                    candidate_path=None):
+    """
+    Retrain the XGBoost model on cached features of all pairs.
+
+    With warm_start, boosting continues from the previous production booster instead of
+    refitting from scratch. The candidate is validated on the most recent bars and only
+    promoted if it is at least as accurate as the previous model on the same rows.
+
+    :param params: XGBoost parameters overriding DEFAULT_XGB_PARAMS (e.g. config model_adjustments).
+    :param candidate_path: When set, the model is written there for shadow evaluation instead of
+                           replacing the production model.
+    :return: Tuple of (model, metadata), or (None, None) if no data was available.
+    """
+    start_time = time.time()
+    frames = load_training_frames(client, pairs, interval, lookback, indicator_mode, feature_store)
+    if not frames:
+        logger.error("No data available to retrain the XGBoost model.")
+        return None, None
+    X_train, X_valid, y_train, y_valid = time_ordered_split(frames)
+
+    params = {**DEFAULT_XGB_PARAMS, **(params or {}), 'tree_method': 'hist', 'n_jobs': n_jobs}
+    previous_model = _load_previous_model(production_path)
+    previous_booster = None
+    if warm_start and previous_model is not None:
+        previous_booster = previous_model.get_booster()
+        if previous_booster.num_boosted_rounds() >= MAX_WARM_START_TREES:
+            logger.info("Previous booster is too large to extend. Refitting from scratch.")
+            previous_booster = None
+
+    model = XGBClassifier(**params)
+    model.fit(X_train, y_train, xgb_model=previous_booster)
+    accuracy = accuracy_score(y_valid, model.predict(X_valid))
+    previous_accuracy = accuracy_score(y_valid, previous_model.predict(X_valid)) if previous_model is not None else None
+
+    metadata = {
+        'pairs': list(frames),
+        'interval': interval,
+        'feature_set_version': feature_set_version(indicator_mode),
+        'params': params,
+        'warm_started': previous_booster is not None,
+        'boosted_rounds': model.get_booster().num_boosted_rounds(),
+        'train_rows': len(X_train),
+        'validation_rows': len(X_valid),
+        'validation_accuracy': accuracy,
+        'previous_validation_accuracy': previous_accuracy,
+        'training_seconds': time.time() - start_time,
+    }
+    if candidate_path:
+        save_xgboost_artifact(model, {**metadata, 'candidate': candidate_path}, production_path, promote=False)
+        atomic_dump(model, candidate_path)
+        logger.info(f"XGBoost candidate written to {candidate_path} for shadow evaluation.")
+    else:
+        promote = previous_accuracy is None or accuracy >= previous_accuracy
+        save_xgboost_artifact(model, metadata, production_path, promote=promote)
+    logger.info(f"XGBoost retrained in {metadata['training_seconds']:.1f}s: validation accuracy {accuracy:.4f} "
+                f"(previous: {previous_accuracy}).")
+    return model, metadata
+
+# Pooled multi-symbol training
+def sync_feature_store(client, pairs, intervals=('1h',), lookback='2 months ago UTC', indicator_mode='simple',
+                       feature_store=None):
+    """
+    Fetch recent klines for every pair and interval and append them to the feature store.
+    """
+    feature_store = feature_store or FeatureStore()
+    for interval in intervals:
+        load_training_frames(client, pairs, interval, lookback, indicator_mode, feature_store)
+
+def train_pooled_xgboost(pairs, intervals=('1h',), params=None, indicator_mode='simple', chunk_rows=None,
+                         external_memory_dir=None, early_stopping_rounds=20, n_jobs=-1, feature_store=None):
+    """
+    Train one XGBoost model on the stored features of all pairs and intervals.
+
+    Data is streamed from the feature store in chunks into a QuantileDMatrix, or into an
+    external-memory DMatrix cached under external_memory_dir, so the pooled dataset does not
+    have to fit in memory. The model is saved as a versioned artifact; it expects the
+    dataset_builder.SYMBOL_FEATURE_COLUMNS tags stored in its metadata as extra inputs.
+
+    :param params: XGBoost parameters overriding DEFAULT_XGB_PARAMS; n_estimators sets the boosting rounds.
+    :return: Tuple of (booster, metadata), or (None, None) if no stored features were found.
+    """
+    start_time = time.time()
+    builder_kwargs = {'chunk_rows': chunk_rows} if chunk_rows else {}
+    builder = DatasetBuilder(pairs, intervals, indicator_mode, feature_store=feature_store, **builder_kwargs)
+    if not builder.entries:
+        logger.error("No stored features available for pooled training.")
+        return None, None
+
+    if external_memory_dir:
+        os.makedirs(external_memory_dir, exist_ok=True)
+        dtrain = builder.dmatrix('train', cache_prefix=os.path.join(external_memory_dir, 'train'))
+        dvalid = builder.dmatrix('valid', cache_prefix=os.path.join(external_memory_dir, 'valid'))
+    else:
+        dtrain = builder.dmatrix('train')
+        dvalid = builder.dmatrix('valid', ref=dtrain)
+
+    params = {**DEFAULT_XGB_PARAMS, **(params or {})}
+    num_boost_round = params.pop('n_estimators')
+    params.pop('random_state', None)
+    booster_params = {**params, 'objective': 'multi:softprob', 'num_class': len(LABEL_MAP), 'eval_metric': 'merror',
+                      'tree_method': 'hist', 'nthread': n_jobs}
+    evals_result = {}
+    booster = xgb.train(booster_params, dtrain, num_boost_round=num_boost_round, evals=[(dvalid, 'valid')],
+                        early_stopping_rounds=early_stopping_rounds, evals_result=evals_result, verbose_eval=False)
+
+    validation_error = evals_result['valid']['merror'][booster.best_iteration]
+    metadata = {
+        'pairs': builder.symbols,
+        'intervals': builder.intervals,
+        'feature_set_version': feature_set_version(indicator_mode),
+        'feature_columns': builder.columns,
+        'symbol_features': {f"{symbol}:{interval}": tags for (symbol, interval), tags in builder.symbol_features.items()},
+        'params': booster_params,
+        'best_iteration': booster.best_iteration,
+        'train_rows': builder.n_rows('train'),
+        'validation_rows': builder.n_rows('valid'),
+        'validation_accuracy': 1 - validation_error,
+        'training_seconds': time.time() - start_time,
+    }
+    version = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    model_path = os.path.join(XGB_ARTIFACT_DIR, f"pooled_{version}.json")
+    os.makedirs(XGB_ARTIFACT_DIR, exist_ok=True)
+    tmp_path = os.path.join(XGB_ARTIFACT_DIR, f"pooled_{version}.tmp.json")  # The .json suffix selects the format
+    booster.save_model(tmp_path)
+    os.replace(tmp_path, model_path)
+    atomic_write_json({**metadata, 'version': version}, os.path.join(XGB_ARTIFACT_DIR, f"pooled_{version}.meta.json"))
+    logger.info(f"Pooled XGBoost model saved to {model_path}: {metadata['train_rows']} training rows, "
+                f"validation accuracy {metadata['validation_accuracy']:.4f}.")
+    return booster, metadata
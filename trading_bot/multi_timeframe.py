@@ -0,0 +1,251 @@
+import logging
+from collections import deque
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SHORT_MA_WINDOW = 50
+LONG_MA_WINDOW = 200
+
+# Binance kline intervals
+INTERVALS = {
+    '1m': pd.Timedelta(minutes=1),
+    '3m': pd.Timedelta(minutes=3),
+    '5m': pd.Timedelta(minutes=5),
+    '15m': pd.Timedelta(minutes=15),
+    '30m': pd.Timedelta(minutes=30),
+    '1h': pd.Timedelta(hours=1),
+    '2h': pd.Timedelta(hours=2),
+    '4h': pd.Timedelta(hours=4),
+    '6h': pd.Timedelta(hours=6),
+    '8h': pd.Timedelta(hours=8),
+    '12h': pd.Timedelta(hours=12),
+    '1d': pd.Timedelta(days=1),
+    '3d': pd.Timedelta(days=3),
+    '1w': pd.Timedelta(weeks=1),
+}
+
+def interval_to_timedelta(interval):
+    """
+    Convert a Binance kline interval (e.g. '1m', '4h') to a pandas Timedelta.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"Unsupported interval: {interval}. Must be one of {list(INTERVALS)}.")
+    return INTERVALS[interval]
+
+def infer_interval(df):
+    """
+    Infer the candle interval of a DataFrame indexed by open_time.
+    """
+    if df is None or len(df) < 2:
+        return None
+    return pd.Series(df.index).diff().dropna().median()
+
+# Batch resampling of a base series into a higher timeframe
+def resample_ohlcv(df, interval, drop_incomplete=True):
+    """
+    Build higher timeframe candles from a base OHLCV DataFrame indexed by open_time.
+
+    :param df: Base OHLCV DataFrame (e.g. 1m or 1h candles).
+    :param interval: Target interval (e.g. '4h').
+    :param drop_incomplete: Drop the last candle if its period is not yet fully covered by the base data.
+    :return: OHLCV DataFrame indexed by the open_time of each higher timeframe candle.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume'])
+
+    period = interval_to_timedelta(interval)
+    resampled = df.resample(period, origin='epoch', label='left', closed='left').agg({
+        'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
+    }).dropna(subset=['close'])
+
+    if drop_incomplete and not resampled.empty:
+        base_interval = infer_interval(df) or pd.Timedelta(0)
+        if df.index[-1] + base_interval < resampled.index[-1] + period:
+            resampled = resampled.iloc[:-1]
+    return resampled
+
+# Vectorized moving-average trend
+def trend_series(df, short_window=SHORT_MA_WINDOW, long_window=LONG_MA_WINDOW):
+    """
+    Compute the moving-average trend for every candle without modifying the input.
+
+    :return: Series of 1 (bullish), -1 (bearish) or 0 (neutral / insufficient history).
+    """
+    short_ma = df['close'].rolling(window=short_window).mean()
+    long_ma = df['close'].rolling(window=long_window).mean()
+    trend = np.sign(short_ma - long_ma).fillna(0).astype(int)
+    return trend.rename('htf_trend')
+
+# Time-aligned trend for vectorized backtests
+def align_higher_timeframe_trend(df, higher_timeframe_df=None, higher_interval='4h', base_interval=None,
+                                 short_window=SHORT_MA_WINDOW, long_window=LONG_MA_WINDOW):
+    """
+    Align the higher timeframe trend to every base candle without lookahead.
+
+    A higher timeframe candle only contributes once it has closed, and a base candle
+    only sees trends from higher timeframe candles that closed at or before its own close.
+
+    :param df: Base OHLCV DataFrame indexed by open_time.
+    :param higher_timeframe_df: Optional higher timeframe candles. Resampled from df when omitted.
+    :param higher_interval: Interval of the higher timeframe candles.
+    :param base_interval: Interval of the base candles. Inferred from df when omitted.
+    :return: Series of trends indexed like df.
+    """
+    if df is None or df.empty:
+        return pd.Series(dtype=int, name='htf_trend')
+
+    if higher_timeframe_df is None:
+        higher_timeframe_df = resample_ohlcv(df, higher_interval)
+    if higher_timeframe_df is None or higher_timeframe_df.empty:
+        return pd.Series(0, index=df.index, name='htf_trend')
+
+    base_period = interval_to_timedelta(base_interval) if base_interval else infer_interval(df)
+    higher_period = interval_to_timedelta(higher_interval)
+
+    higher_trend = trend_series(higher_timeframe_df, short_window, long_window)
+    higher_close_time = pd.DataFrame({
+        'close_time': higher_timeframe_df.index + higher_period,
+        'htf_trend': higher_trend.values
+    })
+    base_close_time = pd.DataFrame({'close_time': df.index + base_period})
+
+    aligned = pd.merge_asof(base_close_time, higher_close_time, on='close_time', direction='backward')
+    return pd.Series(aligned['htf_trend'].fillna(0).astype(int).values, index=df.index, name='htf_trend')
+
+# Incremental moving-average trend
+class MovingAverageTrend:
+    """
+    Maintains the short/long moving-average trend with O(1) work per closed candle.
+    """
+    def __init__(self, short_window=SHORT_MA_WINDOW, long_window=LONG_MA_WINDOW):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.closes = deque(maxlen=long_window)
+        self.short_sum = 0.0
+        self.long_sum = 0.0
+        self.trend = 0
+
+    def update(self, close):
+        """
+        Add the close of a newly closed candle and return the updated trend.
+        """
+        close = float(close)
+        if len(self.closes) == self.long_window:
+            self.long_sum -= self.closes[0]
+        if len(self.closes) >= self.short_window:
+            self.short_sum -= self.closes[-self.short_window]
+        self.closes.append(close)
+        self.short_sum += close
+        self.long_sum += close
+
+        if len(self.closes) < self.long_window:
+            self.trend = 0
+        else:
+            short_ma = self.short_sum / self.short_window
+            long_ma = self.long_sum / self.long_window
+            self.trend = 1 if short_ma > long_ma else -1 if short_ma < long_ma else 0
+        return self.trend
+
+    def seed(self, closes):
+        for close in closes:
+            self.update(close)
+        return self.trend
+
+    @property
+    def ready(self):
+        return len(self.closes) == self.long_window
+
+class HigherTimeframeTrendTracker:
+    """
+    Tracks the higher timeframe trend of one symbol from a stream of base candles.
+
+    Base candles are bucketed by higher timeframe period; once a period has closed, its last
+    close updates the trend.
+    """
+    def __init__(self, higher_interval='4h', base_interval=None, short_window=SHORT_MA_WINDOW, long_window=LONG_MA_WINDOW):
+        self.higher_interval = higher_interval
+        self.period_ns = interval_to_timedelta(higher_interval).value
+        # With a known base interval, a period closes on its last base candle instead of the next period's first
+        self.base_period_ns = interval_to_timedelta(base_interval).value if base_interval else None
+        self.ma_trend = MovingAverageTrend(short_window, long_window)
+        self.current_bucket = None
+        self.current_close = None
+        self.last_open_time = None
+
+    @property
+    def trend(self):
+        return self.ma_trend.trend
+
+    def seed(self, higher_timeframe_df, now=None):
+        """
+        Warm up the trend from higher timeframe candles (e.g. a REST history fetch).
+        Candles whose period has not fully elapsed at `now` are dropped.
+
+        :param higher_timeframe_df: Higher timeframe OHLCV DataFrame indexed by open_time.
+        :param now: Current UTC time (defaults to the wall clock).
+        """
+        if higher_timeframe_df is None or higher_timeframe_df.empty:
+            return self.trend
+        now = pd.Timestamp(now) if now is not None else pd.Timestamp.utcnow().tz_localize(None)
+        closed = higher_timeframe_df[higher_timeframe_df.index + pd.Timedelta(self.period_ns) <= now]
+        if closed.empty:
+            return self.trend
+        self.ma_trend.seed(closed['close'].values)
+        # Base candles inside the last seeded period are already accounted for
+        self.current_bucket = pd.Timestamp(closed.index[-1]).value
+        self.last_open_time = self.current_bucket + self.period_ns - 1
+        self.current_close = None
+        return self.trend
+
+    def update(self, open_time, close):
+        """
+        Feed a closed base candle. Candles at or before the last seen open_time are ignored.
+
+        :return: The current higher timeframe trend.
+        """
+        open_time_ns = pd.Timestamp(open_time).value
+        if self.last_open_time is not None and open_time_ns <= self.last_open_time:
+            return self.trend
+        self.last_open_time = open_time_ns
+
+        bucket = open_time_ns - open_time_ns % self.period_ns
+        if self.current_bucket is not None and bucket != self.current_bucket and self.current_close is not None:
+            self.ma_trend.update(self.current_close)
+        self.current_bucket = bucket
+        self.current_close = float(close)
+
+        if self.base_period_ns and open_time_ns + self.base_period_ns >= bucket + self.period_ns:
+            self.ma_trend.update(self.current_close)
+            self.current_close = None
+        return self.trend
+
+    def on_candle_close(self, interval, bar):
+        """
+        Feed a closed higher timeframe bar, e.g. as a CandleAggregator on_close callback.
+
+        :param interval: Interval of the bar; bars of other intervals are ignored.
+        :param bar: (open_time_ms, open, high, low, close, volume) tuple.
+        """
+        if interval != self.higher_interval:
+            return self.trend
+        bucket = int(bar[0]) * 1_000_000
+        if self.current_bucket is not None and bucket <= self.current_bucket:
+            return self.trend
+        self.current_bucket = bucket
+        self.last_open_time = bucket + self.period_ns - 1
+        self.current_close = None
+        return self.ma_trend.update(bar[4])
+
+    def update_from_frame(self, df):
+        """
+        Feed every closed base candle of a DataFrame indexed by open_time.
+        """
+        if df is None or df.empty:
+            return self.trend
+        if self.last_open_time is not None:
+            df = df[df.index.asi8 > self.last_open_time]
+        for open_time, close in zip(df.index, df['close'].values):
+            self.update(open_time, close)
+        return self.trend
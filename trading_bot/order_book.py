@@ -0,0 +1,254 @@
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from error_handler import handle_error
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_LIMIT = 1000
+MAX_LEVELS = 5000  # Levels kept per side; the farthest levels are dropped beyond this
+FEATURE_DEPTH = 10
+MAX_RESYNC_ATTEMPTS = 3
+
+ORDER_BOOK_FEATURE_COLUMNS = ['ob_best_bid', 'ob_best_ask', 'ob_spread', 'ob_mid', 'ob_microprice', 'ob_imbalance']
+
+# Sorted-array price level update
+def _set_level(prices, quantities, price, quantity):
+    index = bisect_left(prices, price)
+    if index < len(prices) and prices[index] == price:
+        if quantity == 0:
+            del prices[index]
+            del quantities[index]
+        else:
+            quantities[index] = quantity
+    elif quantity != 0:
+        prices.insert(index, price)
+        quantities.insert(index, quantity)
+
+class LocalOrderBook:
+    """
+    Local L2 order book for one symbol, kept in sync with a diff-depth stream.
+
+    Prices are stored in ascending sorted arrays for each side, so the best bid is the
+    last bid and the best ask is the first ask. Diff events received before the REST
+    snapshot are buffered and replayed according to Binance's update-id sync protocol.
+    """
+    def __init__(self, symbol, max_levels=MAX_LEVELS, buffer_size=1000):
+        self.symbol = symbol
+        self.max_levels = max_levels
+        self.bid_prices = []
+        self.bid_quantities = []
+        self.ask_prices = []
+        self.ask_quantities = []
+        self.last_update_id = None
+        self.synced = False
+        self.buffer = deque(maxlen=buffer_size)
+        self._first_event_pending = False
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.bid_prices, self.bid_quantities = [], []
+            self.ask_prices, self.ask_quantities = [], []
+            self.last_update_id = None
+            self.synced = False
+            self.buffer.clear()
+
+    def apply_snapshot(self, snapshot):
+        """
+        Load a REST depth snapshot and replay the buffered diff events.
+
+        :param snapshot: Response of the order book endpoint (lastUpdateId, bids, asks).
+        :return: True if the book is synced afterwards.
+        """
+        with self._lock:
+            bids = sorted((float(price), float(quantity)) for price, quantity in snapshot['bids'])
+            asks = sorted((float(price), float(quantity)) for price, quantity in snapshot['asks'])
+            self.bid_prices = [price for price, _ in bids]
+            self.bid_quantities = [quantity for _, quantity in bids]
+            self.ask_prices = [price for price, _ in asks]
+            self.ask_quantities = [quantity for _, quantity in asks]
+            self.last_update_id = int(snapshot['lastUpdateId'])
+            self.synced = True
+            self._first_event_pending = True
+
+            buffered = list(self.buffer)
+            self.buffer.clear()
+            for index, event in enumerate(buffered):
+                if not self._apply_event(event):
+                    self.buffer.extend(buffered[index + 1:])
+                    break
+            return self.synced
+
+    def on_depth_event(self, event):
+        """
+        Process one diff-depth event.
+
+        :return: False if a sequence gap was detected and a new snapshot is required.
+        """
+        with self._lock:
+            if not self.synced:
+                self.buffer.append(event)
+                return True
+            return self._apply_event(event)
+
+    def _apply_event(self, event):
+        first_update_id, final_update_id = int(event['U']), int(event['u'])
+        if final_update_id <= self.last_update_id:
+            return True  # Already contained in the snapshot
+
+        if self._first_event_pending:
+            # The first event must straddle the snapshot's update id
+            in_sequence = first_update_id <= self.last_update_id + 1 <= final_update_id
+        elif 'pu' in event:
+            in_sequence = int(event['pu']) == self.last_update_id  # Futures streams link events by pu
+        else:
+            in_sequence = first_update_id == self.last_update_id + 1
+
+        if not in_sequence:
+            logger.warning(f"Order book gap for {self.symbol} (last {self.last_update_id}, event {first_update_id}-{final_update_id}). Resync required.")
+            self.synced = False
+            self.buffer.clear()
+            self.buffer.append(event)
+            return False
+
+        for price, quantity in event['b']:
+            _set_level(self.bid_prices, self.bid_quantities, float(price), float(quantity))
+        for price, quantity in event['a']:
+            _set_level(self.ask_prices, self.ask_quantities, float(price), float(quantity))
+        self._trim()
+
+        self.last_update_id = final_update_id
+        self._first_event_pending = False
+        return True
+
+    def _trim(self):
+        excess = len(self.bid_prices) - self.max_levels
+        if excess > 0:
+            del self.bid_prices[:excess]
+            del self.bid_quantities[:excess]
+        excess = len(self.ask_prices) - self.max_levels
+        if excess > 0:
+            del self.ask_prices[-excess:]
+            del self.ask_quantities[-excess:]
+
+    def best_bid(self):
+        with self._lock:
+            return (self.bid_prices[-1], self.bid_quantities[-1]) if self.bid_prices else (None, None)
+
+    def best_ask(self):
+        with self._lock:
+            return (self.ask_prices[0], self.ask_quantities[0]) if self.ask_prices else (None, None)
+
+    def top_levels(self, depth=FEATURE_DEPTH):
+        """
+        Return the best `depth` levels of each side as (bids, asks) lists of (price, quantity), best first.
+        """
+        with self._lock:
+            bids = list(zip(reversed(self.bid_prices[-depth:]), reversed(self.bid_quantities[-depth:])))
+            asks = list(zip(self.ask_prices[:depth], self.ask_quantities[:depth]))
+        return bids, asks
+
+    def features(self, depth=FEATURE_DEPTH):
+        """
+        Compute top-of-book and depth-weighted features.
+
+        :return: Dictionary keyed by ORDER_BOOK_FEATURE_COLUMNS, or an empty dictionary if the book is not synced.
+        """
+        with self._lock:
+            if not self.synced or not self.bid_prices or not self.ask_prices:
+                return {}
+            best_bid, bid_quantity = self.bid_prices[-1], self.bid_quantities[-1]
+            best_ask, ask_quantity = self.ask_prices[0], self.ask_quantities[0]
+            bid_depth = sum(self.bid_quantities[-depth:])
+            ask_depth = sum(self.ask_quantities[:depth])
+
+        top_quantity = bid_quantity + ask_quantity
+        microprice = (best_bid * ask_quantity + best_ask * bid_quantity) / top_quantity if top_quantity else (best_bid + best_ask) / 2
+        total_depth = bid_depth + ask_depth
+        return {
+            'ob_best_bid': best_bid,
+            'ob_best_ask': best_ask,
+            'ob_spread': best_ask - best_bid,
+            'ob_mid': (best_bid + best_ask) / 2,
+            'ob_microprice': microprice,
+            'ob_imbalance': (bid_depth - ask_depth) / total_depth if total_depth else 0.0,
+        }
+
+class OrderBookManager:
+    """
+    Maintains one LocalOrderBook per symbol from diff-depth WebSocket streams.
+    Snapshots are fetched over REST only at start-up and after a sequence gap.
+    """
+    def __init__(self, client, symbols, snapshot_limit=SNAPSHOT_LIMIT):
+        self.client = client
+        self.snapshot_limit = snapshot_limit
+        self.books = {symbol: LocalOrderBook(symbol) for symbol in symbols}
+        self._resyncing = set()
+        self._resync_lock = threading.Lock()
+
+    def subscribe(self, twm, update_speed=100, sync=True):
+        """
+        Subscribe to diff-depth streams on a stream manager (ThreadedWebsocketManager or StreamMultiplexer).
+
+        :param sync: Fetch the snapshots right away; pass False if the streams only start later and call sync().
+        """
+        for symbol in self.books:
+            twm.start_depth_socket(callback=self.process_message, symbol=symbol, interval=update_speed)
+        if sync:
+            self.sync()
+
+    def sync(self):
+        """
+        Fetch a snapshot for every book. The depth streams must already be running.
+        """
+        for symbol in self.books:
+            self.resync(symbol, background=False)
+
+    def process_message(self, msg):
+        if msg.get('e') == 'error':
+            handle_error(msg, error_type="Order Book WebSocket", critical=False)
+            return
+        try:
+            book = self.books.get(msg.get('s'))
+            if book is not None and not book.on_depth_event(msg):
+                self.resync(book.symbol)
+        except Exception as e:
+            handle_error(e, error_type="Order Book Processing", critical=False)
+
+    def resync(self, symbol, background=True):
+        """
+        Fetch a fresh snapshot for a symbol. Runs in a background thread by default so the
+        WebSocket callback is never blocked on REST.
+        """
+        with self._resync_lock:
+            if symbol in self._resyncing:
+                return
+            self._resyncing.add(symbol)
+
+        def _resync():
+            from data_fetching import retry_api_call  # Deferred: data_fetching imports this module
+            try:
+                # A snapshot older than the buffered events fails to sync; fetch another one
+                for attempt in range(MAX_RESYNC_ATTEMPTS):
+                    snapshot = retry_api_call(self.client.get_order_book, symbol=symbol, limit=self.snapshot_limit)
+                    if not snapshot:
+                        logger.error(f"Empty order book snapshot for {symbol}.")
+                        break
+                    if self.books[symbol].apply_snapshot(snapshot):
+                        logger.info(f"Order book for {symbol} synced at update id {snapshot['lastUpdateId']}.")
+                        break
+                    logger.warning(f"Order book snapshot for {symbol} out of sequence (attempt {attempt + 1}/{MAX_RESYNC_ATTEMPTS}).")
+            finally:
+                with self._resync_lock:
+                    self._resyncing.discard(symbol)
+
+        if background:
+            threading.Thread(target=_resync, name=f"orderbook-resync-{symbol}", daemon=True).start()
+        else:
+            _resync()
+
+    def get_features(self, symbol, depth=FEATURE_DEPTH):
+        book = self.books.get(symbol)
+        return book.features(depth) if book else {}
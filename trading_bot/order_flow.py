@@ -0,0 +1,242 @@
+import logging
+import threading
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from error_handler import handle_error
+from multi_timeframe import interval_to_timedelta
+
+logger = logging.getLogger(__name__)
+
+ORDER_FLOW_COLUMNS = [
+    'of_buy_volume', 'of_sell_volume', 'of_delta', 'of_cvd', 'of_imbalance',
+    'of_trade_count', 'of_trade_intensity', 'of_vpin'
+]
+DEFAULT_VPIN_BUCKET_VOLUME = 100.0
+DEFAULT_VPIN_WINDOW = 50
+DEFAULT_HISTORY = 1000
+
+class OrderFlowTracker:
+    """
+    Streaming order-flow features for one symbol, built from aggTrade messages.
+
+    Trades are accumulated per candle; when a trade from a later candle arrives (or flush()
+    is called after the candle closed) one row of features is emitted for the finished candle,
+    keyed by its open_time so it lines up with the kline of the same candle. A candle is emitted
+    once; trades that arrive for it after a flush() are ignored as late. Memory is bounded by
+    the row history and the VPIN window.
+    """
+    def __init__(self, symbol, interval='1m', vpin_bucket_volume=DEFAULT_VPIN_BUCKET_VOLUME,
+                 vpin_window=DEFAULT_VPIN_WINDOW, history=DEFAULT_HISTORY):
+        self.symbol = symbol
+        self.interval_ms = int(interval_to_timedelta(interval).total_seconds() * 1000)
+        self.vpin_bucket_volume = float(vpin_bucket_volume)
+        self.vpin_window = vpin_window
+        self.rows = deque(maxlen=history)
+        self.cvd = 0.0
+
+        # Current candle accumulators
+        self.candle_open_time = None
+        self.candle_emitted = False  # The current candle was already emitted by flush()
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.trade_count = 0
+
+        # VPIN volume buckets
+        self.bucket_buy = 0.0
+        self.bucket_total = 0.0
+        self.bucket_imbalances = deque(maxlen=vpin_window)
+        self.bucket_imbalance_sum = 0.0
+        self._lock = threading.Lock()
+
+    def on_trade(self, trade_time, price, quantity, is_buyer_maker):
+        """
+        Process one aggregated trade.
+
+        :param trade_time: Trade time in milliseconds since the epoch.
+        :param is_buyer_maker: True if the seller was the aggressor.
+        :return: The feature row emitted for a finished candle, or None.
+        """
+        trade_time = int(trade_time)
+        quantity = float(quantity)
+        candle_open_time = trade_time - trade_time % self.interval_ms
+        emitted = None
+        with self._lock:
+            if self.candle_open_time is not None and (candle_open_time < self.candle_open_time or
+                                                      (candle_open_time == self.candle_open_time and self.candle_emitted)):
+                logger.debug(f"Late trade for {self.symbol} at {trade_time} ignored.")
+                return None
+            if self.candle_open_time is not None and candle_open_time > self.candle_open_time and not self.candle_emitted:
+                emitted = self._emit()
+            self.candle_open_time = candle_open_time
+            self.candle_emitted = False
+
+            if is_buyer_maker:
+                self.sell_volume += quantity
+                self.cvd -= quantity
+            else:
+                self.buy_volume += quantity
+                self.cvd += quantity
+            self.trade_count += 1
+            self._fill_vpin_buckets(quantity, not is_buyer_maker)
+        return emitted
+
+    def _fill_vpin_buckets(self, quantity, is_buy):
+        # A trade larger than the remaining room is split across buckets
+        while quantity > 0:
+            take = min(quantity, self.vpin_bucket_volume - self.bucket_total)
+            self.bucket_total += take
+            if is_buy:
+                self.bucket_buy += take
+            quantity -= take
+            if self.bucket_total >= self.vpin_bucket_volume:
+                imbalance = abs(2 * self.bucket_buy - self.bucket_total) / self.bucket_total
+                if len(self.bucket_imbalances) == self.vpin_window:
+                    self.bucket_imbalance_sum -= self.bucket_imbalances[0]
+                self.bucket_imbalances.append(imbalance)
+                self.bucket_imbalance_sum += imbalance
+                self.bucket_buy = 0.0
+                self.bucket_total = 0.0
+
+    def _emit(self):
+        total = self.buy_volume + self.sell_volume
+        row = {
+            'open_time': self.candle_open_time,
+            'of_buy_volume': self.buy_volume,
+            'of_sell_volume': self.sell_volume,
+            'of_delta': self.buy_volume - self.sell_volume,
+            'of_cvd': self.cvd,
+            'of_imbalance': (self.buy_volume - self.sell_volume) / total if total else 0.0,
+            'of_trade_count': self.trade_count,
+            'of_trade_intensity': self.trade_count / (self.interval_ms / 1000),
+            'of_vpin': self.bucket_imbalance_sum / len(self.bucket_imbalances) if self.bucket_imbalances else np.nan,
+        }
+        self.rows.append(row)
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.trade_count = 0
+        return row
+
+    def flush(self, now_ms):
+        """
+        Emit the current candle if it has closed by now_ms (for quiet markets with no new trades).
+        """
+        with self._lock:
+            if (self.candle_open_time is not None and not self.candle_emitted and self.trade_count
+                    and now_ms >= self.candle_open_time + self.interval_ms):
+                self.candle_emitted = True
+                return self._emit()
+        return None
+
+    def to_frame(self):
+        """
+        Return the emitted rows as a DataFrame indexed by candle open_time.
+        """
+        with self._lock:
+            rows = list(self.rows)
+        df = pd.DataFrame(rows, columns=['open_time'] + ORDER_FLOW_COLUMNS)
+        df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
+        return df.set_index('open_time')
+
+class OrderFlowManager:
+    """
+    Maintains one OrderFlowTracker per symbol from aggTrade WebSocket streams.
+    """
+    def __init__(self, symbols, interval='1m', vpin_bucket_volumes=None,
+                 default_vpin_bucket_volume=DEFAULT_VPIN_BUCKET_VOLUME, vpin_window=DEFAULT_VPIN_WINDOW):
+        vpin_bucket_volumes = vpin_bucket_volumes or {}
+        self.trackers = {
+            symbol: OrderFlowTracker(symbol, interval, vpin_bucket_volumes.get(symbol, default_vpin_bucket_volume), vpin_window)
+            for symbol in symbols
+        }
+
+    def subscribe(self, twm):
+        for symbol in self.trackers:
+            twm.start_aggtrade_socket(callback=self.process_message, symbol=symbol)
+
+    def process_message(self, msg):
+        if msg.get('e') == 'error':
+            handle_error(msg, error_type="Order Flow WebSocket", critical=False)
+            return
+        try:
+            tracker = self.trackers.get(msg.get('s'))
+            if tracker is not None:
+                tracker.on_trade(msg['T'], msg['p'], msg['q'], msg['m'])
+        except Exception as e:
+            handle_error(e, error_type="Order Flow Processing", critical=False)
+
+    def flush(self, symbol, now_ms=None):
+        """
+        Emit the symbol's last candle if it has closed, so it is attached without waiting for the next trade.
+        """
+        tracker = self.trackers.get(symbol)
+        if tracker is None:
+            return None
+        return tracker.flush(int(time.time() * 1000) if now_ms is None else now_ms)
+
+    def attach(self, symbol, df):
+        """
+        Join the order-flow rows of a symbol onto a candle DataFrame indexed by open_time.
+        Candles without a finished order-flow row get NaN.
+        """
+        tracker = self.trackers.get(symbol)
+        if tracker is None or df is None or df.empty:
+            return df
+        return df.drop(columns=ORDER_FLOW_COLUMNS, errors='ignore').join(tracker.to_frame(), how='left')
+
+# Batch computation from archived trades for training
+def compute_order_flow_features(trades, interval='1m', vpin_bucket_volume=DEFAULT_VPIN_BUCKET_VOLUME,
+                                vpin_window=DEFAULT_VPIN_WINDOW):
+    """
+    Compute candle-aligned order-flow features from archived aggregated trades.
+    Matches the streaming OrderFlowTracker output for the same trades.
+
+    :param trades: DataFrame with 'time' (ms since epoch), 'quantity' and 'is_buyer_maker' columns, in trade order.
+    :param interval: Candle interval to align to.
+    :return: DataFrame indexed by candle open_time with ORDER_FLOW_COLUMNS.
+    """
+    if trades is None or trades.empty:
+        return pd.DataFrame(columns=ORDER_FLOW_COLUMNS)
+
+    interval_ms = int(interval_to_timedelta(interval).total_seconds() * 1000)
+    time_ms = trades['time'].to_numpy(dtype=np.int64)
+    quantity = trades['quantity'].to_numpy(dtype=float)
+    is_sell = trades['is_buyer_maker'].to_numpy(dtype=bool)
+    buy_quantity = np.where(is_sell, 0.0, quantity)
+    candle = time_ms - time_ms % interval_ms
+
+    grouped = pd.DataFrame({
+        'candle': candle, 'buy': buy_quantity, 'sell': quantity - buy_quantity, 'count': 1
+    }).groupby('candle', sort=True).sum()
+    features = pd.DataFrame(index=grouped.index)
+    features['of_buy_volume'] = grouped['buy']
+    features['of_sell_volume'] = grouped['sell']
+    features['of_delta'] = grouped['buy'] - grouped['sell']
+    features['of_cvd'] = features['of_delta'].cumsum()
+    total = grouped['buy'] + grouped['sell']
+    features['of_imbalance'] = (features['of_delta'] / total.where(total > 0)).fillna(0.0)
+    features['of_trade_count'] = grouped['count']
+    features['of_trade_intensity'] = grouped['count'] / (interval_ms / 1000)
+
+    # VPIN: split the cumulative volume into equal buckets; a trade is entirely buy or sell,
+    # so the buy volume at a bucket boundary is a linear interpolation within that trade
+    cumulative_volume = np.concatenate(([0.0], np.cumsum(quantity)))
+    cumulative_buy = np.concatenate(([0.0], np.cumsum(buy_quantity)))
+    n_buckets = int(cumulative_volume[-1] // vpin_bucket_volume)
+    vpin = pd.Series(np.nan, index=features.index)
+    if n_buckets:
+        boundaries = np.arange(0, n_buckets + 1) * vpin_bucket_volume
+        buy_at_boundary = np.interp(boundaries, cumulative_volume, cumulative_buy)
+        bucket_buy = np.diff(buy_at_boundary)
+        bucket_imbalance = np.abs(2 * bucket_buy - vpin_bucket_volume) / vpin_bucket_volume
+        bucket_vpin = pd.Series(bucket_imbalance).rolling(window=vpin_window, min_periods=1).mean().to_numpy()
+        # Each bucket completes on the trade that crosses its upper boundary
+        completing_trade = np.searchsorted(cumulative_volume, boundaries[1:], side='left') - 1
+        bucket_candle = candle[np.clip(completing_trade, 0, len(candle) - 1)]
+        vpin = pd.Series(bucket_vpin, index=bucket_candle).groupby(level=0).last().reindex(features.index).ffill()
+    features['of_vpin'] = vpin
+
+    features.index = pd.to_datetime(features.index, unit='ms')
+    features.index.name = 'open_time'
+    return features[ORDER_FLOW_COLUMNS]
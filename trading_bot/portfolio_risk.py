@@ -0,0 +1,244 @@
+import logging
+import math
+import threading
+from collections import namedtuple
+from statistics import NormalDist
+from error_handler import handle_error
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DECAY = 0.94  # RiskMetrics decay for the EWMA covariance
+DEFAULT_CONFIDENCE = 0.99
+DEFAULT_HORIZON_BARS = 60  # VaR horizon in candles of the return interval
+DEFAULT_MAX_VAR_FRACTION = 0.05  # Portfolio VaR limit as a fraction of equity
+DEFAULT_MAX_MARGIN_FRACTION = 0.5  # Initial margin limit as a fraction of equity
+MIN_ORDER_FRACTION = 0.1  # Orders scaled below this fraction of their requested size are rejected
+DEFAULT_RECONCILE_SECONDS = 5.0  # Interval between position refreshes from the exchange
+
+RiskDecision = namedtuple('RiskDecision', ['approved', 'quantity', 'scale', 'var', 'margin', 'reason'])
+
+class PortfolioRiskEngine:
+    """
+    Portfolio-level limits on value at risk and margin usage across all traded symbols.
+
+    Returns are tracked with an EWMA covariance matrix (RiskMetrics), updated with one
+    rank-one update per closed candle. Positions are kept as a signed notional vector, so an
+    order check costs one matrix-vector product: with b = Σw, the VaR after adding Δ to
+    symbol i is z * sqrt(h * (wᵀΣw + 2Δb_i + Δ²Σ_ii)). Both limits are solved for the largest
+    allowed Δ in closed form and the order is scaled down to it, or rejected.
+
+    All notionals are in the quote currency (USDT); quantities in base units.
+    """
+    def __init__(self, symbols, decay=DEFAULT_DECAY, confidence=DEFAULT_CONFIDENCE, horizon_bars=DEFAULT_HORIZON_BARS,
+                 max_var_fraction=DEFAULT_MAX_VAR_FRACTION, max_margin_fraction=DEFAULT_MAX_MARGIN_FRACTION,
+                 min_order_fraction=MIN_ORDER_FRACTION):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        n = len(self.symbols)
+        self.decay = decay
+        self.z = NormalDist().inv_cdf(confidence)
+        self.horizon_bars = horizon_bars
+        self.max_var_fraction = max_var_fraction
+        self.max_margin_fraction = max_margin_fraction
+        self.min_order_fraction = min_order_fraction
+
+        self.covariance = np.zeros((n, n))
+        self.observations = 0
+        self.quantities = np.zeros(n)  # Signed position sizes
+        self.prices = np.full(n, np.nan)
+        self.leverage = np.ones(n)
+
+        # Closes of the candle being collected; symbols without a close get a zero return
+        self._last_close = np.full(n, np.nan)
+        self._pending_close = np.full(n, np.nan)
+        self._pending_open_time = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._reconcile_thread = None
+
+    # Return covariance
+    def seed(self, closes):
+        """
+        Initialize the covariance from historical closes.
+
+        :param closes: DataFrame of close prices indexed by candle open_time, one column per symbol.
+        """
+        closes = closes.reindex(columns=self.symbols)
+        returns = np.log(closes).diff().iloc[1:].fillna(0.0).to_numpy()
+        if not len(returns):
+            return
+        weights = (1 - self.decay) * self.decay ** np.arange(len(returns) - 1, -1, -1)
+        with self._lock:
+            self.covariance = (returns * weights[:, None]).T @ returns + self.decay ** len(returns) * self.covariance
+            self.observations += len(returns)
+            last = closes.ffill().iloc[-1].to_numpy(dtype=float)
+            self._last_close = np.where(np.isnan(last), self._last_close, last)
+            self.prices = np.where(np.isnan(last), self.prices, last)
+        logger.info(f"Portfolio covariance seeded from {len(returns)} candles of {len(self.symbols)} symbols.")
+
+    def on_close(self, symbol, open_time, close):
+        """
+        Record a closed candle. Once a candle with a later open time arrives, the returns of
+        the collected candle update the covariance.
+        """
+        i = self.index.get(symbol)
+        if i is None:
+            return
+        with self._lock:
+            if self._pending_open_time is not None and open_time > self._pending_open_time:
+                self._update_covariance()
+            self._pending_open_time = open_time
+            self._pending_close[i] = float(close)
+            self.prices[i] = float(close)
+
+    def _update_covariance(self):
+        returns = np.log(self._pending_close / self._last_close)
+        returns[~np.isfinite(returns)] = 0.0
+        self.covariance *= self.decay
+        self.covariance += (1 - self.decay) * np.outer(returns, returns)
+        self.observations += 1
+        self._last_close = np.where(np.isnan(self._pending_close), self._last_close, self._pending_close)
+        self._pending_close.fill(np.nan)
+
+    def correlation(self):
+        """
+        :return: DataFrame of return correlations between the symbols.
+        """
+        with self._lock:
+            covariance = self.covariance.copy()
+        volatility = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(volatility, volatility)
+        return pd.DataFrame(correlation, index=self.symbols, columns=self.symbols)
+
+    # Positions
+    def set_position(self, symbol, quantity, price=None, leverage=None):
+        i = self.index[symbol]
+        with self._lock:
+            self.quantities[i] = quantity
+            if price is not None:
+                self.prices[i] = price
+            if leverage is not None:
+                self.leverage[i] = leverage
+
+    def load_positions(self, positions):
+        """
+        Set positions from client.futures_position_information() entries. Symbols without an entry
+        are flat, so exits the engine never saw (stop-loss, take-profit, liquidation, manual closes)
+        are picked up too.
+        """
+        quantities = dict.fromkeys(self.symbols, 0.0)
+        for position in positions:
+            symbol = position.get('symbol')
+            if symbol in self.index:
+                quantities[symbol] += float(position['positionAmt'])  # Hedge mode reports one entry per side
+                self.set_position(symbol, quantities[symbol], float(position.get('markPrice') or 0) or None,
+                                  float(position['leverage']) if position.get('leverage') else None)
+        with self._lock:
+            for symbol, quantity in quantities.items():
+                self.quantities[self.index[symbol]] = quantity
+
+    def start_reconciliation(self, positions_provider, interval=DEFAULT_RECONCILE_SECONDS):
+        """
+        Refresh positions from the exchange every interval seconds on a background thread.
+
+        :param positions_provider: Callable returning client.futures_position_information().
+        """
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.load_positions(positions_provider() or [])
+                except Exception as e:
+                    handle_error(e, error_type="Portfolio Risk", critical=False)
+
+        self._reconcile_thread = threading.Thread(target=run, name='portfolio-reconcile', daemon=True)
+        self._reconcile_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def on_fill(self, symbol, quantity, price, leverage=None):
+        """
+        :param quantity: Signed filled quantity (negative for sells).
+        """
+        i = self.index[symbol]
+        with self._lock:
+            self.quantities[i] += quantity
+            self.prices[i] = price
+            if leverage is not None:
+                self.leverage[i] = leverage
+
+    def _notional(self):
+        return self.quantities * np.nan_to_num(self.prices)
+
+    def value_at_risk(self):
+        with self._lock:
+            notional = self._notional()
+            return self.z * math.sqrt(max(0.0, self.horizon_bars * notional @ self.covariance @ notional))
+
+    def margin(self):
+        with self._lock:
+            return float(np.abs(self._notional()) @ (1 / self.leverage))
+
+    # Pre-trade check
+    def check_order(self, symbol, quantity, price, leverage, equity):
+        """
+        Approve, scale down or reject an order against the portfolio VaR and margin limits.
+
+        :param quantity: Signed order quantity (negative for sells).
+        :param equity: Account equity the limits are relative to.
+        :return: RiskDecision with the approved signed quantity and the VaR and margin after the order.
+        """
+        i = self.index.get(symbol)
+        if i is None or quantity == 0 or price <= 0 or equity <= 0:
+            return RiskDecision(False, 0.0, 0.0, None, None, "unknown symbol or empty order")
+
+        with self._lock:
+            notional = self._notional()
+            sigma_w = self.covariance @ notional
+            variance = float(notional @ sigma_w)
+            sigma_w_i = float(sigma_w[i])
+            sigma_ii = float(self.covariance[i, i])
+            margin = float(np.abs(notional) @ (1 / self.leverage))
+            current = float(notional[i])
+            current_leverage = float(self.leverage[i])
+
+        delta = quantity * price
+        direction = math.copysign(1.0, delta)
+        limit = abs(delta)
+        reasons = []
+
+        # VaR: largest t in [0, |Δ|] with h * (a + 2 d b t + c t²) <= (L / z)² for d = sign(Δ).
+        # Orders that lower the portfolio variance are never limited by VaR.
+        var_limit = (self.max_var_fraction * equity / self.z) ** 2 / self.horizon_bars
+        a, b, c = variance, direction * sigma_w_i, sigma_ii
+        variance_after = a + 2 * b * limit + c * limit ** 2
+        if variance_after > var_limit and variance_after > a:
+            discriminant = b * b - c * (a - var_limit)
+            if c > 0 and discriminant >= 0:
+                limit = min(limit, max(0.0, (-b + math.sqrt(discriminant)) / c))
+            else:
+                limit = 0.0
+            reasons.append("var")
+
+        # Margin: |current + d t| / leverage may rise by at most the remaining margin
+        other_margin = margin - abs(current) / current_leverage
+        margin_room = self.max_margin_fraction * equity - other_margin
+        max_position = max(0.0, margin_room * leverage)
+        # Largest t with |current + d t| <= max_position
+        margin_limit = max(0.0, max_position - direction * current)
+        if margin_limit < limit:
+            limit = margin_limit
+            reasons.append("margin")
+
+        scale = limit / abs(delta)
+        if scale < self.min_order_fraction:
+            return RiskDecision(False, 0.0, 0.0, None, None, f"rejected ({', '.join(reasons)} limit)")
+
+        approved = direction * limit
+        var_after = self.z * math.sqrt(max(0.0, self.horizon_bars * (a + 2 * b * limit + c * limit ** 2)))
+        margin_after = other_margin + abs(current + approved) / leverage
+        reason = f"scaled ({', '.join(reasons)} limit)" if reasons else "approved"
+        return RiskDecision(True, approved / price, scale, var_after, margin_after, reason)
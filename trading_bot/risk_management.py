@@ -5,6 +5,8 @@ from binance.enums import SIDE_SELL, SIDE_BUY, ORDER_TYPE_MARKET
 from binance.exceptions import BinanceAPIException
 from utils import detect_market_environment
 from config import Config
+from latency import timed, instrument
+import trade_recorder
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,10 +40,12 @@ def calculate_stop_loss_take_profit(current_price, atr, risk_factor=2, reward_fa
         return None, None
     return max(0, current_price - atr * risk_factor), max(0, current_price + atr * reward_factor)
 
-def manage_risk(client, symbol, signal, df, config, max_retries=3, retry_delay=2):
+@instrument('manage_risk')
+def manage_risk(client, symbol, signal, df, config, max_retries=3, retry_delay=2, portfolio=None):
     """
     Manages trading risk by calculating position size, stop-loss, and take-profit levels,
     and placing trades if the risk-to-reward ratio is acceptable.
+    With a PortfolioRiskEngine, the order is scaled down or rejected to keep portfolio VaR and margin within limits.
     """
     try:
         # Validate signal
@@ -75,7 +79,7 @@ def manage_risk(client, symbol, signal, df, config, max_retries=3, retry_delay=2
         if atr is None:
             logger.warning(f"ATR could not be calculated for {symbol}. Skipping trade.")
             return
-        position_size = calculate_position_size(futures_balance, atr, config.get_risk_percentage())
+        position_size = calculate_position_size(futures_balance, atr, config.get_risk_percentage(symbol))
 
         # Calculate stop-loss and take-profit
         stop_loss, take_profit = calculate_stop_loss_take_profit(
@@ -96,9 +100,23 @@ def manage_risk(client, symbol, signal, df, config, max_retries=3, retry_delay=2
         # Check the risk-to-reward ratio
         risk_to_reward_ratio = (take_profit - current_price) / (current_price - stop_loss)
         if risk_to_reward_ratio >= config.get_min_risk_to_reward():
+            leverage = config.get_leverage_settings(symbol)
+            if portfolio is not None:
+                with timed('portfolio_risk.check_order'):
+                    decision = portfolio.check_order(symbol, position_size if signal == "BUY" else -position_size,
+                                                     current_price, leverage, futures_balance)
+                logger.info(f"Portfolio risk for {symbol}: {decision.reason}, VaR {decision.var}, margin {decision.margin}")
+                if not decision.approved:
+                    logger.info(f"Trade skipped for {symbol} by portfolio risk limits.")
+                    return
+                position_size = abs(decision.quantity)
+
             # Place trade
             side = SIDE_BUY if signal == "BUY" else SIDE_SELL
-            place_futures_order(client, symbol, side, position_size, config.get_leverage(symbol), stop_loss, take_profit)
+            order = place_futures_order(client, symbol, side, position_size, leverage, stop_loss, take_profit,
+                                        price=current_price)
+            if order is not None and portfolio is not None:
+                portfolio.on_fill(symbol, position_size if signal == "BUY" else -position_size, current_price, leverage)
             track_open_positions(symbol, signal, position_size, current_price, stop_loss, take_profit)
         else:
             logger.info(f"Trade skipped for {symbol} due to suboptimal risk-to-reward ratio: {risk_to_reward_ratio:.2f}")
@@ -118,25 +136,41 @@ def track_open_positions(symbol, side, quantity, entry_price, stop_loss, take_pr
     }
     logger.info(f"Position tracked for {symbol}: {open_positions[symbol]}")
 
-def place_futures_order(client, symbol, side, quantity, leverage, stop_loss=None, take_profit=None):
+def place_futures_order(client, symbol, side, quantity, leverage, stop_loss=None, take_profit=None, price=None):
+    """
+    Place a market order with optional stop-loss and take-profit orders, and record them in the trade history.
+
+    :param price: Reference price recorded for the order when the response has no average price.
+    """
     try:
         # Validate the side parameter
         if side not in [SIDE_BUY, SIDE_SELL]:
             raise ValueError(f"Invalid side parameter '{side}' for {symbol}. Must be 'BUY' or 'SELL'.")
 
         # Set leverage and place order
-        client.futures_change_leverage(symbol=symbol, leverage=leverage)
-        order = client.futures_create_order(symbol=symbol, side=side, type=ORDER_TYPE_MARKET, quantity=quantity)
+        with timed('rest.futures_change_leverage'):
+            client.futures_change_leverage(symbol=symbol, leverage=leverage)
+        with timed('rest.futures_create_order.market'):
+            order = client.futures_create_order(symbol=symbol, side=side, type=ORDER_TYPE_MARKET, quantity=quantity)
         logger.info(f"Market order placed: {side} {quantity} of {symbol}")
+        # Fills, with realized PnL and commission, are synced from the exchange's account trades
+        trade_recorder.record_order(symbol, side, quantity, float(order.get('avgPrice') or 0) or price or 0.0,
+                                    ORDER_TYPE_MARKET, order, leverage)
 
         # Set stop-loss and take-profit
         if stop_loss and take_profit:
-            client.futures_create_order(
-                symbol=symbol, side=SIDE_SELL if side == SIDE_BUY else SIDE_BUY, type="STOP_MARKET", stopPrice=stop_loss
-            )
-            client.futures_create_order(
-                symbol=symbol, side=SIDE_SELL if side == SIDE_BUY else SIDE_BUY, type="TAKE_PROFIT_MARKET", stopPrice=take_profit
-            )
+            with timed('rest.futures_create_order.stop_market'):
+                stop_order = client.futures_create_order(
+                    symbol=symbol, side=SIDE_SELL if side == SIDE_BUY else SIDE_BUY, type="STOP_MARKET", stopPrice=stop_loss
+                )
+            with timed('rest.futures_create_order.take_profit_market'):
+                take_profit_order = client.futures_create_order(
+                    symbol=symbol, side=SIDE_SELL if side == SIDE_BUY else SIDE_BUY, type="TAKE_PROFIT_MARKET", stopPrice=take_profit
+                )
+            exit_side = SIDE_SELL if side == SIDE_BUY else SIDE_BUY
+            trade_recorder.record_order(symbol, exit_side, quantity, stop_loss, "STOP_MARKET", stop_order, leverage)
+            trade_recorder.record_order(symbol, exit_side, quantity, take_profit, "TAKE_PROFIT_MARKET", take_profit_order,
+                                        leverage)
             logger.info(f"Stop-loss set at {stop_loss}, Take-profit set at {take_profit}")
 
         return order
@@ -0,0 +1,235 @@
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import gym
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import BaseCallback, CallbackList, CheckpointCallback
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+from feature_store import FeatureStore, feature_set_version
+from strategy import RL_MODEL_FILE, TradingEnvironment
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.path.join(os.path.dirname(__file__), 'models', 'rl_checkpoints')
+CHECKPOINT_PREFIX = 'ppo'
+MIN_WINDOW_BARS = 200  # Windows shorter than this are not worth an environment
+RUN_CONFIG_FILE = 'run_config.json'  # Written next to the checkpoints to detect resuming a different run
+
+# Environment construction (runs inside the worker processes)
+class WindowCyclingEnvironment(gym.Env):
+    """
+    TradingEnvironment that moves to the next (symbol, window) on every reset().
+
+    Each environment walks round-robin through all windows, starting at its own offset, so
+    every symbol is trained on regardless of how many environments there are. Feature
+    matrices are loaded from the store once per symbol and window environments are cached.
+    """
+    def __init__(self, store_root, windows, interval, indicator_mode='simple', offset=0):
+        super().__init__()
+        self.feature_store = FeatureStore(store_root)
+        self.windows = [tuple(window) for window in windows]
+        self.interval = interval
+        self.indicator_mode = indicator_mode
+        self.next_window = offset % len(self.windows)
+        self._features = {}
+        self._environments = {}
+        self.env = self._environment(self.next_window)
+        self.action_space = self.env.action_space
+        self.observation_space = self.env.observation_space
+
+    def _environment(self, index):
+        if index not in self._environments:
+            symbol, start, end = self.windows[index]
+            if symbol not in self._features:
+                features = self.feature_store.load(symbol, self.interval, self.indicator_mode)
+                if features is None or len(features) < end:
+                    raise ValueError(f"Stored features for {symbol} {self.interval} do not cover the training window "
+                                     f"[{start}, {end}). The feature set or the store changed; rebuild the windows.")
+                self._features[symbol] = features
+            self._environments[index] = TradingEnvironment(self._features[symbol].iloc[start:end].dropna())
+        return self._environments[index]
+
+    def reset(self, **kwargs):
+        self.env = self._environment(self.next_window)
+        self.next_window = (self.next_window + 1) % len(self.windows)
+        return self.env.reset()
+
+    def step(self, action):
+        return self.env.step(action)
+
+def make_env(store_root, windows, interval, indicator_mode='simple', offset=0):
+    """
+    Return a factory that builds a WindowCyclingEnvironment over the given (symbol, start, end) windows.
+    Only the store location is pickled to the subprocess; the data is memory-mapped there.
+    """
+    def _init():
+        return WindowCyclingEnvironment(store_root, windows, interval, indicator_mode, offset)
+    return _init
+
+def stored_rows(feature_store, symbols, interval, indicator_mode='simple'):
+    """
+    :return: Dictionary of symbol -> number of stored feature rows (0 when nothing is stored).
+    """
+    rows = {}
+    for symbol in symbols:
+        features = feature_store.load(symbol, interval, indicator_mode)
+        rows[symbol] = 0 if features is None else len(features)
+    return rows
+
+def build_windows(feature_store, symbols, interval, windows_per_symbol, indicator_mode='simple'):
+    """
+    Split each symbol's stored history into contiguous date windows.
+
+    :return: List of (symbol, start, end) row ranges.
+    """
+    windows = []
+    for symbol in symbols:
+        features = feature_store.load(symbol, interval, indicator_mode)
+        if features is None or len(features) < MIN_WINDOW_BARS:
+            logger.warning(f"Not enough stored features for {symbol} {interval}. Skipping for RL training.")
+            continue
+        window_size = max(MIN_WINDOW_BARS, len(features) // windows_per_symbol)
+        for start in range(0, len(features) - MIN_WINDOW_BARS + 1, window_size):
+            windows.append((symbol, start, min(start + window_size, len(features))))
+    return windows
+
+class TrainingSpeedCallback(BaseCallback):
+    """
+    Log environment steps per second and wall-clock time of each PPO update (rollout + optimization).
+    """
+    def __init__(self, verbose=0):
+        super().__init__(verbose)
+        self._update_start = None
+        self._update_start_steps = 0
+        self._rollout_end = None
+
+    def _on_rollout_start(self):
+        now = time.time()
+        if self._update_start is not None:
+            update_seconds = now - self._update_start
+            steps = self.num_timesteps - self._update_start_steps
+            rollout_seconds = self._rollout_end - self._update_start
+            steps_per_second = steps / rollout_seconds if rollout_seconds > 0 else float('inf')
+            self.logger.record('time/env_steps_per_sec', steps_per_second)
+            self.logger.record('time/update_seconds', update_seconds)
+            logger.info(f"PPO update: {steps} env steps at {steps_per_second:.0f} steps/s, "
+                        f"{update_seconds:.2f}s wall-clock ({self.num_timesteps} total steps).")
+        self._update_start = now
+        self._update_start_steps = self.num_timesteps
+
+    def _on_rollout_end(self):
+        self._rollout_end = time.time()
+
+    def _on_step(self):
+        return True
+
+def latest_checkpoint(checkpoint_dir=CHECKPOINT_DIR):
+    """
+    :return: Path of the checkpoint with the most timesteps, or None.
+    """
+    pattern = re.compile(rf"{CHECKPOINT_PREFIX}_(\d+)_steps\.zip$")
+    checkpoints = [(int(match.group(1)), path)
+                   for path in glob.glob(os.path.join(checkpoint_dir, f"{CHECKPOINT_PREFIX}_*_steps.zip"))
+                   for match in [pattern.search(os.path.basename(path))] if match]
+    return max(checkpoints)[1] if checkpoints else None
+
+def _read_run_config(checkpoint_dir):
+    path = os.path.join(checkpoint_dir, RUN_CONFIG_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def _write_run_config(checkpoint_dir, run_config):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    with open(os.path.join(checkpoint_dir, RUN_CONFIG_FILE), 'w') as f:
+        json.dump(run_config, f, indent=2)
+
+def train_ppo(symbols, interval='1h', total_timesteps=50000, n_envs=4, windows_per_symbol=4, checkpoint_freq=10000,
+              policy='MlpPolicy', indicator_mode='simple', resume=True, use_subprocesses=True, ppo_kwargs=None,
+              model_path=RL_MODEL_FILE, checkpoint_dir=CHECKPOINT_DIR, feature_store=None):
+    """
+    Train PPO on n_envs parallel environments over date windows of several symbols.
+
+    Environments run in subprocesses (SubprocVecEnv) and cycle through the windows of all
+    symbols, moving to the next window on every episode. Checkpoints are written every
+    checkpoint_freq timesteps together with the run configuration (symbols, interval, feature-set
+    version, windows and the stored rows per symbol); with resume, training continues from the
+    latest checkpoint of an interrupted run with the same configuration and its original windows,
+    as long as the store still holds every row those windows cover. Checkpoints are removed once the run completes
+    and the model is saved to model_path.
+
+    :return: Trained PPO model, or None if no stored features were found.
+    :raises ValueError: If resuming from checkpoints of a run with a different configuration or feature set,
+                        or whose windows are no longer covered by the store.
+    """
+    feature_store = feature_store or FeatureStore()
+    run_config = {'symbols': list(symbols), 'interval': interval, 'indicator_mode': indicator_mode,
+                  'feature_set_version': feature_set_version(indicator_mode),
+                  'windows_per_symbol': windows_per_symbol, 'policy': policy}
+    rows = stored_rows(feature_store, symbols, interval, indicator_mode)
+    checkpoint = latest_checkpoint(checkpoint_dir) if resume else None
+    if checkpoint:
+        stored_config = _read_run_config(checkpoint_dir) or {}
+        if {key: stored_config.get(key) for key in run_config} != run_config:
+            raise ValueError(f"Checkpoints in {checkpoint_dir} were made by a different run "
+                             f"({ {key: stored_config.get(key) for key in run_config} }). "
+                             f"Remove them or train with resume=False.")
+        # The run continues on its original windows, which the store must still cover
+        shrunk = {symbol: (rows.get(symbol, 0), count) for symbol, count in (stored_config.get('rows') or {}).items()
+                  if rows.get(symbol, 0) < count}
+        if 'rows' not in stored_config or shrunk:
+            raise ValueError(f"The feature store no longer covers the windows of the checkpoints in {checkpoint_dir} "
+                             f"(stored rows now vs. at the start of the run: {shrunk or 'unknown'}). "
+                             f"Remove them or train with resume=False.")
+        windows = [tuple(window) for window in stored_config['windows']]
+        rows = stored_config['rows']
+    else:
+        windows = build_windows(feature_store, symbols, interval, windows_per_symbol, indicator_mode)
+    if not windows:
+        logger.error("No data available to train the RL model.")
+        return None
+    run_config['windows'] = [list(window) for window in windows]
+    run_config['rows'] = rows
+
+    # Each environment starts at a different window and then cycles through all of them
+    env_fns = [make_env(feature_store.root, windows, interval, indicator_mode, offset=i * len(windows) // n_envs)
+               for i in range(n_envs)]
+    vec_env = SubprocVecEnv(env_fns) if use_subprocesses and n_envs > 1 else DummyVecEnv(env_fns)
+    logger.info(f"RL training on {n_envs} environments over {len(windows)} windows of {len(symbols)} symbols.")
+
+    try:
+        if checkpoint:
+            model = PPO.load(checkpoint, env=vec_env)
+            logger.info(f"Resuming RL training from {checkpoint} at {model.num_timesteps} timesteps.")
+        else:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)  # Stale checkpoints of an earlier run
+            model = PPO(policy, vec_env, verbose=0, **(ppo_kwargs or {}))
+        _write_run_config(checkpoint_dir, run_config)
+
+        callbacks = CallbackList([
+            # save_freq counts vectorized steps, each of which advances every environment
+            CheckpointCallback(save_freq=max(checkpoint_freq // n_envs, 1), save_path=checkpoint_dir,
+                               name_prefix=CHECKPOINT_PREFIX),
+            TrainingSpeedCallback(),
+        ])
+        remaining = total_timesteps - model.num_timesteps
+        start_time = time.time()
+        if remaining > 0:
+            model.learn(total_timesteps=remaining, callback=callbacks, reset_num_timesteps=False)
+        elapsed = time.time() - start_time
+        logger.info(f"RL training finished: {model.num_timesteps} timesteps, {elapsed:.1f}s, "
+                    f"{max(remaining, 0) / elapsed if elapsed else 0:.0f} steps/s overall.")
+    finally:
+        vec_env.close()
+
+    # Saved next to the final path and renamed, so a crash never leaves a truncated model
+    tmp_path = f"{os.path.splitext(model_path)[0]}.tmp.zip"
+    model.save(tmp_path)
+    os.replace(tmp_path, model_path)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return model
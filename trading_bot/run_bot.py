@@ -6,7 +6,14 @@ from trading_bot import run_bot
 from backtest import run_backtest
 from strategy import load_trained_model, train_and_save_best_model, load_or_train_rl
 from data_fetching import get_historical_data
-from config import Config
+from model_training import retrain_xgboost, sync_feature_store, train_pooled_xgboost
+from hyperparameter_search import run_search, xgboost_params
+from rl_training import train_ppo
+from shadow import candidate_path
+from futures_data import FuturesDataStore
+from job_queue import JobQueue, JobRunner
+from binance.client import Client
+from config import get_config
 import time
 
 logging.basicConfig(level=logging.INFO)
@@ -16,27 +23,30 @@ logger = logging.getLogger(__name__)
 def periodic_xgboost_retraining(interval_hours=24):
     """
     Periodically retrain the XGBoost model with the latest trade data.
+    Boosting continues from the current model and only bars missing from the feature store are computed.
     :param interval_hours: Number of hours between retraining cycles.
     """
     logger.info(f"Starting periodic XGBoost retraining every {interval_hours} hours...")
-    config = Config()
+    config = get_config()
+    reload_settings = config.get_config_reload_settings()
+    if reload_settings['enabled']:
+        config.watch(reload_settings['interval'])
     api_key, api_secret = config.get_api_credentials()
     client = Client(api_key, api_secret)
 
     while True:
         try:
-            # Fetch recent data for retraining
             trading_pairs = config.get_trading_pairs()
-            for pair in trading_pairs:
-                logger.info(f"Fetching recent data for {pair}...")
-                df = get_historical_data(client, pair, '1h', '2 months ago UTC')  # Adjust lookback as needed
-                if df is None or df.empty:
-                    logger.warning(f"No data available for {pair}. Skipping retraining for this pair.")
-                    continue
-                
-                # Retrain the model
-                logger.info(f"Retraining XGBoost model for {pair}...")
-                train_and_save_best_model()
+            logger.info(f"Retraining XGBoost model on {', '.join(trading_pairs)}...")
+            # In shadow mode the retrained model becomes a candidate instead of replacing production
+            shadow_settings = config.get_shadow_settings()
+            model, metadata = retrain_xgboost(client, trading_pairs, '1h', '2 months ago UTC',  # Adjust lookback as needed
+                                              params=xgboost_params(config),
+                                              indicator_mode=config.get_indicator_mode(),
+                                              candidate_path=candidate_path(shadow_settings['retrain_candidate'])
+                                              if shadow_settings['enabled'] else None)
+            if model is None:
+                logger.warning("No data available for retraining. Skipping this cycle.")
 
             logger.info(f"XGBoost retraining completed. Next retraining in {interval_hours} hours.")
             time.sleep(interval_hours * 3600)
@@ -45,6 +55,80 @@ def periodic_xgboost_retraining(interval_hours=24):
             logger.error(f"Error during XGBoost retraining: {e}")
             time.sleep(300)  # Wait 5 minutes before retrying
 
+# Function to train one XGBoost model across all trading pairs
+def pooled_xgboost_training():
+    """
+    Sync the feature store for all trading pairs and configured intervals, then train a pooled model on it.
+    """
+    config = get_config()
+    api_key, api_secret = config.get_api_credentials()
+    client = Client(api_key, api_secret)
+    settings = config.get_pooled_training_settings()
+    trading_pairs = config.get_trading_pairs()
+    indicator_mode = config.get_indicator_mode()
+
+    logger.info(f"Syncing feature store for {', '.join(trading_pairs)} on {', '.join(settings['intervals'])}...")
+    sync_feature_store(client, trading_pairs, settings['intervals'], settings['lookback'], indicator_mode)
+    train_pooled_xgboost(trading_pairs, settings['intervals'], params=xgboost_params(config),
+                         indicator_mode=indicator_mode, chunk_rows=settings['chunk_rows'],
+                         external_memory_dir=settings['external_memory_dir'])
+
+# Function to search XGBoost hyperparameters
+def xgboost_hyperparameter_search():
+    """
+    Run a parallel hyperparameter search on cached features of all trading pairs.
+    The best parameters are picked up by subsequent XGBoost training.
+    """
+    config = get_config()
+    api_key, api_secret = config.get_api_credentials()
+    client = Client(api_key, api_secret)
+    best = run_search(client, config.get_trading_pairs(), config.get_hyperparameter_search_settings(),
+                      base_params=config.get_model_adjustments('xgboost'), indicator_mode=config.get_indicator_mode())
+    if best:
+        logger.info(f"Best parameters: {best['params']} ({best['n_estimators']} rounds, accuracy {best['score']:.4f}).")
+
+# Function to train PPO on parallel environments
+def parallel_rl_training():
+    """
+    Sync the feature store for all trading pairs and train PPO on parallel environments,
+    resuming from the latest checkpoint of an interrupted run.
+    """
+    config = get_config()
+    api_key, api_secret = config.get_api_credentials()
+    client = Client(api_key, api_secret)
+    settings = config.get_rl_training_settings()
+    trading_pairs = config.get_trading_pairs()
+    indicator_mode = config.get_indicator_mode()
+
+    sync_feature_store(client, trading_pairs, [settings['interval']], settings['lookback'], indicator_mode)
+    train_ppo(trading_pairs, settings['interval'], settings['total_timesteps'], settings['n_envs'],
+              settings['windows_per_symbol'], settings['checkpoint_freq'], settings['policy'], indicator_mode,
+              use_subprocesses=settings['use_subprocesses'])
+
+# Function to ingest futures market data into the local store
+def futures_data_sync():
+    """
+    Bulk-fetch funding rates, open interest, long/short ratios and mark price klines for all
+    trading pairs into the local futures data store. Only rows newer than the stored ones are requested.
+    """
+    config = get_config()
+    api_key, api_secret = config.get_api_credentials()
+    client = Client(api_key, api_secret)
+    settings = config.get_futures_data_settings()
+    store = FuturesDataStore()
+    for pair in config.get_trading_pairs():
+        store.sync_symbol(client, pair, interval='1h', stats_period=settings['history_stats_period'],
+                          lookback=settings['lookback'])
+
+# Function to run queued backtest and retrain jobs
+def job_worker():
+    """
+    Run jobs submitted from Telegram or the web dashboard in resource-limited worker processes.
+    """
+    settings = get_config().get_job_queue_settings()
+    JobRunner(JobQueue(), settings['workers'], settings['memory_limit_mb'], settings['cpu_time_limit_s'],
+              settings['timeout_s']).run_forever()
+
 # Function to enable live RL learning
 def live_rl_learning():
     """
@@ -52,7 +136,7 @@ def live_rl_learning():
     """
     logger.info("Initializing live RL decision-making and learning...")
     rl_model = load_or_train_rl()
-    config = Config()
+    config = get_config()
     api_key, api_secret = config.get_api_credentials()
     client = Client(api_key, api_secret)
     trading_pairs = config.get_trading_pairs()
@@ -94,7 +178,7 @@ def live_rl_learning():
 def main():
     # Check if the mode argument is passed
     if len(sys.argv) < 2:
-        logger.error("No mode provided. Usage: python run_bot.py --mode [live|backtest|train_rl|retrain_xgboost]")
+        logger.error("No mode provided. Usage: python run_bot.py --mode [live|backtest|train_rl|retrain_xgboost|train_pooled|hyperparameter_search|train_ppo|sync_futures_data|job_worker]")
         return
 
     # Parse the mode argument
@@ -112,8 +196,25 @@ def main():
     elif mode_arg == '--mode=retrain_xgboost':
         logger.info("Starting periodic XGBoost retraining mode...")
         periodic_xgboost_retraining()
+    elif mode_arg == '--mode=train_pooled':
+        logger.info("Starting pooled multi-symbol XGBoost training...")
+        pooled_xgboost_training()
+    elif mode_arg == '--mode=hyperparameter_search':
+        logger.info("Starting XGBoost hyperparameter search...")
+        xgboost_hyperparameter_search()
+    elif mode_arg == '--mode=train_ppo':
+        logger.info("Starting parallel PPO training...")
+        parallel_rl_training()
+    elif mode_arg == '--mode=sync_futures_data':
+        logger.info("Starting futures data ingestion...")
+        futures_data_sync()
+    elif mode_arg == '--mode=job_worker':
+        logger.info("Starting job worker...")
+        job_worker()
     else:
-        logger.error("Invalid mode. Use '--mode=live', '--mode=backtest', '--mode=train_rl', or '--mode=retrain_xgboost'.")
+        logger.error("Invalid mode. Use '--mode=live', '--mode=backtest', '--mode=train_rl', '--mode=retrain_xgboost', "
+                     "'--mode=train_pooled', '--mode=hyperparameter_search', '--mode=train_ppo', "
+                     "'--mode=sync_futures_data' or '--mode=job_worker'.")
 
 if __name__ == "__main__":
     main()
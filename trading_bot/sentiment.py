@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+import numpy as np
+import pandas as pd
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 100_000
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_WORKERS = 2
+DEFAULT_ITEM_HISTORY = 10_000  # News items kept per symbol for sentiment_series
+
+def text_key(text):
+    """
+    Content hash used to deduplicate texts in the score cache.
+    """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+class SentimentScorer:
+    """
+    VADER compound scores with one shared analyzer, an LRU cache keyed by content hash and
+    batched scoring on a worker pool.
+
+    Lookups never wait for NLP by default: texts that are not cached yet are queued for
+    scoring and reported as NaN until their batch has finished. Each text is scored once
+    while it stays in the cache, however often it is looked up.
+    """
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_WORKERS,
+                 item_history=DEFAULT_ITEM_HISTORY):
+        self.analyzer = SentimentIntensityAnalyzer()
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.item_history = item_history
+        self.cache = OrderedDict()
+        self.items = {}
+        self._pending = {}  # key -> future of the batch scoring it
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sentiment')
+
+    def _lookup(self, key):
+        with self._lock:
+            score = self.cache.get(key)
+            if score is not None:
+                self.cache.move_to_end(key)
+            return score
+
+    def _store(self, scored):
+        with self._lock:
+            for key, score in scored:
+                self.cache[key] = score
+                self.cache.move_to_end(key)
+                self._pending.pop(key, None)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _score_batch(self, batch):
+        try:
+            self._store([(key, self.analyzer.polarity_scores(text)['compound']) for key, text in batch])
+        except Exception as e:
+            logger.error(f"Sentiment batch of {len(batch)} texts failed: {e}")
+            with self._lock:
+                for key, _ in batch:
+                    self._pending.pop(key, None)
+
+    def submit(self, texts):
+        """
+        Queue texts that are neither cached nor already queued for scoring.
+
+        :return: List of futures of the batches scoring any of the texts that are not cached,
+                 including batches queued by earlier calls.
+        """
+        new = {}
+        futures = set()
+        with self._lock:
+            for text in texts:
+                key = text_key(text)
+                if key in self._pending:
+                    futures.add(self._pending[key])
+                elif key not in self.cache and key not in new:
+                    new[key] = text
+            # Submitted under the lock so a batch cannot store its scores before its keys are registered
+            batch = list(new.items())
+            for i in range(0, len(batch), self.batch_size):
+                chunk = batch[i:i + self.batch_size]
+                future = self.executor.submit(self._score_batch, chunk)
+                self._pending.update((key, future) for key, _ in chunk)
+                futures.add(future)
+        return list(futures)
+
+    def scores(self, texts, wait=False, timeout=None):
+        """
+        Compound scores for texts, in order.
+
+        :param wait: Block until missing texts are scored (for backtests and training). Otherwise
+                     missing texts are queued and reported as NaN.
+        :return: NumPy array of scores; None or empty texts score NaN.
+        """
+        texts = [text if isinstance(text, str) and text else None for text in texts]
+        unique = {text for text in texts if text is not None}
+        futures = self.submit(unique)
+        if wait and futures:
+            wait_futures(futures, timeout=timeout)
+        scores_by_text = {text: self._lookup(text_key(text)) for text in unique}
+        return np.array([np.nan if text is None or scores_by_text[text] is None else scores_by_text[text]
+                         for text in texts], dtype=float)
+
+    # Per-symbol news feed
+    def add_items(self, symbol, timestamps, texts):
+        """
+        Record news items for a symbol and queue them for scoring.
+
+        :param timestamps: Publication times (anything pd.to_datetime accepts), one per text.
+        """
+        texts = [str(text) for text in texts]
+        self.submit(texts)
+        history = self.items.setdefault(symbol, deque(maxlen=self.item_history))
+        for timestamp, text in zip(pd.to_datetime(list(timestamps)), texts):
+            history.append((timestamp, text_key(text)))
+
+    def sentiment_series(self, symbol, index):
+        """
+        Mean score of the symbol's scored news items published within each candle.
+
+        :param index: Candle open times (DatetimeIndex); an item belongs to the last candle opened before it.
+        :return: Series aligned to index, NaN for candles without scored items.
+        """
+        items = list(self.items.get(symbol, ()))
+        if not items or len(index) == 0:
+            return pd.Series(np.nan, index=index, name='sentiment')
+        timestamps = pd.DatetimeIndex([timestamp for timestamp, _ in items])
+        scores = np.array([self._lookup(key) for _, key in items], dtype=float)
+        positions = index.searchsorted(timestamps, side='right') - 1
+        valid = (positions >= 0) & ~np.isnan(scores)
+        means = pd.Series(scores[valid]).groupby(positions[valid]).mean()
+        return pd.Series(means.reindex(range(len(index))).to_numpy(), index=index, name='sentiment')
+
+_default_scorer = None
+_default_scorer_lock = threading.Lock()
+
+def get_scorer():
+    """
+    Process-wide SentimentScorer, created on first use.
+    """
+    global _default_scorer
+    with _default_scorer_lock:
+        if _default_scorer is None:
+            _default_scorer = SentimentScorer()
+        return _default_scorer
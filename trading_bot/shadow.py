@@ -0,0 +1,197 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+import joblib
+from stable_baselines3 import PPO
+from strategy import RL_MODEL_FILE, XGB_MODEL_FILE, trading_strategy
+
+logger = logging.getLogger(__name__)
+
+CANDIDATES_DIR = os.path.join(os.path.dirname(__file__), 'models', 'candidates')
+DEFAULT_QUEUE_SIZE = 256
+SUMMARY_INTERVAL = 60  # Seconds between summary file writes
+RELOAD_CHECK_INTERVAL = 30  # Seconds between checks for updated candidate model files
+POSITION_BY_SIGNAL = {'BUY': 1, 'SELL': -1}
+
+class SimulatedBook:
+    """
+    Would-be PnL of one model on one pair: BUY goes long, SELL goes short, HOLD keeps the
+    position. Positions are one unit of notional, marked to market on every row.
+    """
+    def __init__(self):
+        self.position = 0
+        self.last_price = None
+        self.pnl = 0.0
+        self.trades = 0
+
+    def update(self, signal, price):
+        if self.last_price:
+            self.pnl += self.position * (price - self.last_price) / self.last_price
+        new_position = POSITION_BY_SIGNAL.get(signal, self.position)
+        if new_position != self.position:
+            self.trades += 1
+            self.position = new_position
+        self.last_price = price
+        return self.pnl
+
+class _CandidateModel:
+    """
+    A candidate XGBoost/PPO pair loaded from files (by default candidate_path(name)). A model
+    file that does not exist falls back to the production model. Models are reloaded when
+    their files change, so retraining can replace a candidate at any time.
+    """
+    def __init__(self, name, xgboost_path=None, rl_path=None):
+        self.name = name
+        self.xgboost_path = xgboost_path or candidate_path(name, 'xgboost')
+        self.rl_path = rl_path or candidate_path(name, 'rl')
+        self.xgboost_model = None
+        self.rl_model = None
+        self._loaded = None
+
+    def _resolve(self):
+        paths = (self.xgboost_path if os.path.exists(self.xgboost_path) else XGB_MODEL_FILE,
+                 self.rl_path if os.path.exists(self.rl_path) else RL_MODEL_FILE)
+        return tuple((path, os.path.getmtime(path) if os.path.exists(path) else None) for path in paths)
+
+    def refresh(self):
+        resolved = self._resolve()
+        if resolved == self._loaded:
+            return self.ready
+        self._loaded = resolved
+        (xgboost_path, xgboost_mtime), (rl_path, rl_mtime) = resolved
+        try:
+            self.xgboost_model = joblib.load(xgboost_path) if xgboost_mtime else None
+            self.rl_model = PPO.load(rl_path) if rl_mtime else None
+            logger.info(f"Shadow candidate '{self.name}' loaded from {xgboost_path} and {rl_path}.")
+        except Exception as e:
+            logger.error(f"Could not load shadow candidate '{self.name}': {e}")
+            self.xgboost_model = self.rl_model = None
+        return self.ready
+
+    @property
+    def ready(self):
+        return self.xgboost_model is not None and self.rl_model is not None
+
+# Worker process
+def _shadow_worker(work_queue, candidates, log_path, summary_path, indicator_mode):
+    logging.basicConfig(level=logging.INFO)
+    models = [_CandidateModel(candidate['name'], candidate.get('xgboost'), candidate.get('rl')) for candidate in candidates]
+    books = {}
+    stats = {'rows': 0, 'agreements': {model.name: 0 for model in models}, 'scored': {model.name: 0 for model in models}}
+    last_reload_check = last_summary = 0.0
+
+    with open(log_path, 'a') as log_file:
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            now = time.time()
+            if now - last_reload_check >= RELOAD_CHECK_INTERVAL:
+                for model in models:
+                    model.refresh()
+                last_reload_check = now
+
+            pair, open_time, df, higher_timeframe_trend, production_signal, price = item
+            signals = {'production': production_signal}
+            for model in models:
+                if not model.ready:
+                    continue
+                try:
+                    signals[model.name] = trading_strategy(df, None, model.xgboost_model, model.rl_model, mode="hybrid",
+                                                           higher_timeframe_trend=higher_timeframe_trend,
+                                                           indicator_mode=indicator_mode)
+                except Exception as e:
+                    logger.error(f"Shadow candidate '{model.name}' failed on {pair}: {e}")
+                    continue
+                stats['scored'][model.name] += 1
+                stats['agreements'][model.name] += signals[model.name] == production_signal
+
+            pnl = {name: books.setdefault((name, pair), SimulatedBook()).update(signal, price)
+                   for name, signal in signals.items()}
+            stats['rows'] += 1
+            log_file.write(json.dumps({
+                'time': now, 'pair': pair, 'open_time': open_time, 'price': price, 'signals': signals, 'pnl': pnl
+            }) + '\n')
+            log_file.flush()
+
+            if now - last_summary >= SUMMARY_INTERVAL:
+                _write_summary(summary_path, books, stats)
+                last_summary = now
+    _write_summary(summary_path, books, stats)
+
+def _write_summary(summary_path, books, stats):
+    summary = {'rows': stats['rows'], 'updated': time.time(), 'models': {}}
+    for (name, pair), book in books.items():
+        model_summary = summary['models'].setdefault(name, {'pnl': 0.0, 'trades': 0, 'pairs': {}})
+        model_summary['pnl'] += book.pnl
+        model_summary['trades'] += book.trades
+        model_summary['pairs'][pair] = {'pnl': book.pnl, 'trades': book.trades, 'position': book.position}
+    for name, scored in stats['scored'].items():
+        if name in summary['models'] and scored:
+            summary['models'][name]['agreement_with_production'] = stats['agreements'][name] / scored
+    tmp_path = f"{summary_path}.tmp"
+    with open(tmp_path, 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    os.replace(tmp_path, summary_path)
+
+class ShadowEvaluator:
+    """
+    Scores candidate models on the same feature rows as production, off the critical path.
+
+    Rows are handed to a separate worker process through a bounded queue with put_nowait:
+    submitting never blocks, and the candidates' feature and model work never competes with
+    the trading loop for the GIL. When the worker falls behind, rows are dropped and counted.
+    Every submitted candle is written to a JSONL log; per-model simulated PnL and agreement with
+    production are summarized in a JSON file.
+    """
+    def __init__(self, candidates, log_path='shadow_log.jsonl', summary_path='shadow_summary.json',
+                 queue_size=DEFAULT_QUEUE_SIZE, indicator_mode='simple'):
+        # Spawned rather than forked: the trading process already runs WebSocket threads
+        context = multiprocessing.get_context('spawn')
+        self.queue = context.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._last_open_time = {}
+        self.process = context.Process(
+            target=_shadow_worker, args=(self.queue, candidates, log_path, summary_path, indicator_mode),
+            name='shadow-evaluator', daemon=True
+        )
+        self.process.start()
+        logger.info(f"Shadow evaluation started for {', '.join(candidate['name'] for candidate in candidates)}.")
+
+    def submit(self, pair, df, higher_timeframe_trend, production_signal, price):
+        """
+        Queue the feature rows behind a production signal for shadow scoring. Each candle is
+        submitted once per pair.
+
+        :return: True if queued, False if skipped or dropped.
+        """
+        open_time = str(df.index[-1])
+        if self._last_open_time.get(pair) == open_time:
+            return False
+        try:
+            self.queue.put_nowait((pair, open_time, df, higher_timeframe_trend, production_signal, float(price)))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Shadow queue full; {self.dropped} rows dropped so far.")
+            return False
+        self._last_open_time[pair] = open_time
+        return True
+
+    def stop(self, timeout=10):
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning("Shadow queue full on shutdown; terminating the worker.")
+            self.process.terminate()
+        self.process.join(timeout)
+
+def candidate_path(name, model_type='xgboost'):
+    """
+    Path under CANDIDATES_DIR where retraining writes a candidate model.
+    """
+    extension = 'pkl' if model_type == 'xgboost' else 'zip'
+    return os.path.join(CANDIDATES_DIR, f"{name}_{model_type}.{extension}")
@@ -1,16 +1,18 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 from xgboost import XGBClassifier
 import logging
 import joblib
 from binance.client import Client
 from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
 import gym
 from data_handler import add_features, confluence_signals
 from data_fetching import get_historical_data
+from utils import analyze_higher_timeframe
+from feature_store import FeatureStore
+from latency import timed, instrument
+from config import get_config
 import os
 
 # Logging setup
@@ -24,15 +26,7 @@ XGB_MODEL_FILE = 'trained_xgboost_model.pkl'
 RL_MODEL_FILE = 'trained_rl_model.zip'
 FEATURE_COLUMNS = ['returns', 'volatility', 'momentum', 'bb_upper', 'bb_lower', 'macd_diff', 'rsi', 'adx', 'short_ma', 'long_ma']
 EXPECTED_RL_INPUT_SIZE = 28  # Expected size for RL model input
-
-# Multi-Timeframe Analysis
-def analyze_higher_timeframe(df):
-    if df is None or df.empty or 'close' not in df.columns:
-        logger.error("Higher timeframe data is invalid.")
-        return None
-    df['short_ma'] = df['close'].rolling(window=50).mean()
-    df['long_ma'] = df['close'].rolling(window=200).mean()
-    return 1 if df['short_ma'].iloc[-1] > df['long_ma'].iloc[-1] else -1
+LABEL_MAP = {-1: 0, 0: 1, 1: 2}  # Action labels to XGBoost class ids
 
 # Load and Train Models
 def train_and_save_best_model():
@@ -67,14 +61,18 @@ def train_and_save_xgboost():
     if df is None or df.empty:
         logger.error("No data available to train the XGBoost model.")
         return None
-    df = add_features(df)
-    df['target'] = df.apply(label_action, axis=1).dropna()
+    df = FeatureStore().get_features('BTCUSDT', '1h', df)
     X = df[FEATURE_COLUMNS]
-    y = df['target'].map({-1: 0, 0: 1, 1: 2})
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+    y = label_actions(df).map(LABEL_MAP)
+    # Time-ordered split: the model is validated on bars after the ones it was trained on
+    split = int(len(X) * 0.7)
+    X_train, X_test, y_train, y_test = X.iloc[:split], X.iloc[split:], y.iloc[:split], y.iloc[split:]
+    from hyperparameter_search import xgboost_params  # Deferred: hyperparameter_search imports this module
+    params = {'subsample': 0.8, 'colsample_bytree': 0.8, **xgboost_params(get_config())}
     best_model, best_accuracy = None, 0.0
     for attempt in range(MAX_TRAINING_ATTEMPTS):
-        model = XGBClassifier(random_state=42)
+        # Row/column subsampling makes each seed produce a different model
+        model = XGBClassifier(**params, random_state=42 + attempt, tree_method='hist', n_jobs=-1)
         model.fit(X_train, y_train)
         accuracy = accuracy_score(y_test, model.predict(X_test))
         if accuracy > best_accuracy:
@@ -90,24 +88,35 @@ def train_rl_model():
     if df is None or df.empty:
         logger.error("No data available to train the RL model.")
         return None
-    df = add_features(df).dropna()
-    env = TradingEnvironment(df)
-    model = PPO('MlpPolicy', DummyVecEnv([lambda: env]), verbose=1)
-    model.learn(total_timesteps=50000)
-    model.save(RL_MODEL_FILE)
-    return model
+    FeatureStore().get_features('BTCUSDT', '1h', df)
+    from rl_training import train_ppo  # Deferred: rl_training imports this module
+    settings = get_config().get_rl_training_settings()
+    return train_ppo(['BTCUSDT'], '1h', settings['total_timesteps'], settings['n_envs'], settings['windows_per_symbol'],
+                     settings['checkpoint_freq'], settings['policy'], use_subprocesses=settings['use_subprocesses'])
 
 # Hybrid Decision-Making
-def trading_strategy(df, higher_timeframe_df, xgboost_model, rl_model, mode="hybrid"):
-    higher_timeframe_trend = analyze_higher_timeframe(higher_timeframe_df)
-    df = add_features(df)
+@instrument('trading_strategy')
+def trading_strategy(df, higher_timeframe_df, xgboost_model, rl_model, mode="hybrid", higher_timeframe_trend=None,
+                     indicator_mode="simple"):
+    """
+    Generate a BUY/SELL/HOLD signal for the last candle of df.
+
+    :param higher_timeframe_trend: Precomputed higher timeframe trend (1, -1 or 0). When omitted,
+        it is computed from higher_timeframe_df.
+    :param indicator_mode: Indicator mode passed to add_features ('simple' or 'wilder').
+    """
+    if higher_timeframe_trend is None:
+        higher_timeframe_trend = analyze_higher_timeframe(higher_timeframe_df)
+    # Only the model inputs (which include the confluence indicators) are computed
+    df = add_features(df, indicator_mode=indicator_mode, columns=FEATURE_COLUMNS)
     if df.empty:
         logger.error("DataFrame is empty after adding features. Returning 'HOLD'.")
         return 'HOLD'
     if not set(FEATURE_COLUMNS).issubset(df.columns):
         logger.error("DataFrame missing required features for prediction.")
         return 'HOLD'
-    xgboost_signal = xgboost_model.predict(df.iloc[-1:][FEATURE_COLUMNS])[0]
+    with timed('predict.xgboost'):
+        xgboost_signal = xgboost_model.predict(df.iloc[-1:][FEATURE_COLUMNS])[0]
     xgboost_signal = {-1: 'SELL', 0: 'HOLD', 1: 'BUY'}.get(xgboost_signal, 'HOLD')
     if mode == "xgboost-only":
         return xgboost_signal
@@ -122,7 +131,8 @@ def trading_strategy(df, higher_timeframe_df, xgboost_model, rl_model, mode="hyb
         logger.error(f"Invalid rl_input detected: {rl_input}")
         rl_input = np.nan_to_num(rl_input)
         logger.info(f"Cleaned rl_input: {rl_input}")
-    rl_signal = rl_model.predict(rl_input.reshape(1, -1))[0]
+    with timed('predict.ppo'):
+        rl_signal = rl_model.predict(rl_input.reshape(1, -1))[0]
     rl_signal = rl_signal.item() if isinstance(rl_signal, np.ndarray) else rl_signal
     return {-1: 'SELL', 0: 'HOLD', 1: 'BUY'}.get(rl_signal, 'HOLD')
 
@@ -170,3 +180,13 @@ class TradingEnvironment(gym.Env):
 def label_action(row):
     buy_conf, sell_conf = confluence_signals(row, higher_timeframe_trend=None)
     return 1 if buy_conf > sell_conf else -1 if sell_conf > buy_conf else 0
+
+def label_actions(df):
+    """
+    Vectorized label_action for a whole DataFrame.
+    """
+    buy_conf = ((df['short_ma'] > df['long_ma']).astype(int) + (df['macd_diff'] > 0).astype(int)
+                + (df['rsi'] < 30).astype(int))
+    sell_conf = ((df['short_ma'] < df['long_ma']).astype(int) + (df['macd_diff'] < 0).astype(int)
+                 + (df['rsi'] > 70).astype(int))
+    return np.sign(buy_conf - sell_conf).astype(int)
@@ -0,0 +1,184 @@
+# stream_harness.py
+
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import socket
+import sys
+import threading
+import time
+
+from stream_multiplexer import StreamMultiplexer
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+INTERVAL_MS = 60_000
+DEFAULT_TIMEOUT = 10.0
+
+# Minimal local stand-in for the Binance combined-stream endpoint
+class StandInStreamServer:
+    """
+    WebSocket server on localhost that plays one scripted list of messages per connection.
+
+    After the script of a connection is sent, the connection is dropped without a close frame,
+    like a network failure, so the client has to reconnect. Connections beyond the last script
+    are held open until the server stops. Only unfragmented text frames are sent; frames from
+    the client (pings, close) are read and ignored.
+    """
+    def __init__(self, scripts, host='127.0.0.1', port=0):
+        self.scripts = list(scripts)
+        self.paths = []
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name='stand-in-server', daemon=True)
+
+    @property
+    def url(self):
+        return f"ws://{self.address[0]}:{self.address[1]}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._server.close()
+
+    def _serve(self):
+        connection_index = 0
+        while not self._stop_event.is_set():
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                break  # Server closed
+            script = self.scripts[connection_index] if connection_index < len(self.scripts) else None
+            connection_index += 1
+            threading.Thread(target=self._handle, args=(connection, script), daemon=True).start()
+
+    def _handle(self, connection, script):
+        try:
+            self._handshake(connection)
+            threading.Thread(target=self._discard_frames, args=(connection,), daemon=True).start()
+            if script is None:
+                self._stop_event.wait()
+                return
+            for message in script:
+                connection.sendall(self._text_frame(json.dumps(message)))
+        except OSError as e:
+            logger.debug(f"Stand-in connection error: {e}")
+        finally:
+            # shutdown() sends the FIN even while the reader thread is blocked in recv() on the same socket
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+    def _handshake(self, connection):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = connection.recv(4096)
+            if not chunk:
+                raise OSError("Client closed during the handshake.")
+            request += chunk
+        lines = request.decode().split('\r\n')
+        self.paths.append(lines[0].split(' ')[1])
+        headers = {name.strip().lower(): value.strip() for name, _, value in (line.partition(':') for line in lines[1:] if line)}
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest()).decode()
+        connection.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+
+    def _discard_frames(self, connection):
+        try:
+            while connection.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    @staticmethod
+    def _text_frame(text):
+        payload = text.encode()
+        if len(payload) < 126:
+            header = bytes([0x81, len(payload)])
+        elif len(payload) < 65536:
+            header = bytes([0x81, 126]) + len(payload).to_bytes(2, 'big')
+        else:
+            header = bytes([0x81, 127]) + len(payload).to_bytes(8, 'big')
+        return header + payload
+
+# Scripted scenario
+def kline_message(symbol, open_time, close, is_closed=True, interval='1m'):
+    return {'stream': f"{symbol.lower()}@kline_{interval}", 'data': {
+        'e': 'kline', 's': symbol, 'k': {
+            't': open_time, 'i': interval, 'o': close, 'h': close, 'l': close, 'c': close, 'v': 1.0, 'x': is_closed
+        }
+    }}
+
+def run_reconnect_and_backfill(symbol='BTCUSDT', missed=3, timeout=DEFAULT_TIMEOUT):
+    """
+    Stream a closed candle, drop the connection, and resume `missed` candles later after the reconnect.
+
+    :return: List of failed checks (empty when the multiplexer reconnected and backfilled the gap in order).
+    """
+    resume_time = (missed + 1) * INTERVAL_MS
+    server = StandInStreamServer([
+        [kline_message(symbol, 0, 100.0)],
+        [kline_message(symbol, resume_time, 104.0, is_closed=False), kline_message(symbol, resume_time, 105.0)],
+    ]).start()
+
+    backfill_calls = []
+    def backfill(backfill_symbol, interval, first_open_time, last_open_time):
+        backfill_calls.append((backfill_symbol, interval, first_open_time, last_open_time))
+        time.sleep(0.2)  # A slow REST call must not reorder the stream
+        return [(open_time, 101.0, 101.0, 101.0, 101.0, 1.0)
+                for open_time in range(first_open_time, last_open_time + 1, INTERVAL_MS)]
+
+    received = []
+    done = threading.Event()
+    def on_kline(data):
+        received.append((data['k']['t'], data['k']['x'], data.get('backfilled', False)))
+        if data['k']['t'] == resume_time and data['k']['x']:
+            done.set()
+
+    multiplexer = StreamMultiplexer(server.url, backfill=backfill, min_backoff=0.1, max_backoff=0.5)
+    multiplexer.start_kline_socket(on_kline, symbol)
+    multiplexer.start()
+    done.wait(timeout)
+    multiplexer.stop()
+    server.stop()
+
+    expected_received = ([(0, True, False)] + [(i * INTERVAL_MS, True, True) for i in range(1, missed + 1)]
+                         + [(resume_time, False, False), (resume_time, True, False)])
+    failures = []
+    if multiplexer.connections[0].reconnects < 1:
+        failures.append("The multiplexer did not reconnect after the connection was dropped.")
+    if server.paths and server.paths[0] != f"/stream?streams={symbol.lower()}@kline_1m":
+        failures.append(f"Unexpected combined-stream path {server.paths[0]}.")
+    if backfill_calls != [(symbol, '1m', INTERVAL_MS, missed * INTERVAL_MS)]:
+        failures.append(f"Backfill calls {backfill_calls}, expected one for the {missed} missed candles.")
+    if received != expected_received:
+        failures.append(f"Received klines {received}, expected {expected_received}.")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check StreamMultiplexer reconnects and gap backfill against a local stand-in server.")
+    parser.add_argument('--missed', type=int, default=3, help="Candles skipped while the connection is down.")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Seconds to wait for the scenario.")
+    args = parser.parse_args()
+
+    failures = run_reconnect_and_backfill(missed=args.missed, timeout=args.timeout)
+    for failure in failures:
+        logger.error(failure)
+    if failures:
+        sys.exit(1)
+    print("Reconnect and gap backfill: OK")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import websocket
+from error_handler import handle_error
+from multi_timeframe import interval_to_timedelta
+
+logger = logging.getLogger(__name__)
+
+SPOT_STREAM_URL = 'wss://stream.binance.com:9443'
+FUTURES_STREAM_URL = 'wss://fstream.binance.com'
+MAX_STREAMS_PER_CONNECTION = 200  # Binance futures limit; spot allows 1024
+PING_INTERVAL = 60
+PING_TIMEOUT = 20
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+STABLE_CONNECTION_SECONDS = 60  # A connection that stayed up this long resets the backoff
+BACKFILL_WORKERS = 4
+
+class KlineGapDetector:
+    """
+    Detects missed candles of one interval from kline open times.
+
+    After a closed candle at t, the next message must be for t or t + interval; a later open
+    time means the candles in between never arrived closed (e.g. during a reconnect).
+    """
+    def __init__(self, interval):
+        self.interval_ms = int(interval_to_timedelta(interval).total_seconds() * 1000)
+        self.last_closed = {}
+
+    def check(self, symbol, open_time, is_closed):
+        """
+        :return: (first_open_time, last_open_time) of the missed candles, or None.
+        """
+        open_time = int(open_time)
+        last = self.last_closed.get(symbol)
+        gap = None
+        if last is not None and open_time > last + self.interval_ms:
+            gap = (last + self.interval_ms, open_time - self.interval_ms)
+            self.last_closed[symbol] = gap[1]  # Reported once; the caller backfills it
+        if is_closed and (last is None or open_time > self.last_closed[symbol]):
+            self.last_closed[symbol] = open_time
+        return gap
+
+class _StreamConnection(threading.Thread):
+    """
+    One combined-stream WebSocket connection, reconnected with exponential backoff and jitter.
+    """
+    def __init__(self, url, on_message, name, min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF):
+        super().__init__(name=name, daemon=True)
+        self.url = url
+        self.on_message = on_message
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+        self._app = None
+        self._connected_at = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        attempt = 0
+        while not self._stop_event.is_set():
+            self._connected_at = None
+            self._app = websocket.WebSocketApp(
+                self.url, on_open=self._on_open, on_message=self._on_message, on_error=self._on_error,
+                on_close=self._on_close
+            )
+            self._app.run_forever(ping_interval=PING_INTERVAL, ping_timeout=PING_TIMEOUT)
+            if self._stop_event.is_set():
+                break
+            if self._connected_at and time.time() - self._connected_at >= STABLE_CONNECTION_SECONDS:
+                attempt = 0
+            delay = min(self.max_backoff, self.min_backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            attempt += 1
+            self.reconnects += 1
+            logger.warning(f"{self.name} disconnected. Reconnecting in {delay:.1f}s (attempt {attempt}).")
+            self._stop_event.wait(delay)
+
+    def _on_open(self, ws):
+        self._connected_at = time.time()
+        logger.info(f"{self.name} connected.")
+
+    def _on_message(self, ws, message):
+        try:
+            self.on_message(message)
+        except Exception as e:
+            handle_error(e, error_type="WebSocket Processing", critical=False)
+
+    def _on_error(self, ws, error):
+        handle_error(error, error_type="WebSocket", critical=False)
+
+    def _on_close(self, ws, status_code=None, reason=None):
+        logger.info(f"{self.name} closed ({status_code} {reason}).")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._app is not None:
+            self._app.close()
+
+class StreamMultiplexer:
+    """
+    Multiplexes Binance streams over a small pool of combined-stream connections.
+
+    Streams are registered with the same start_*_socket methods as python-binance's
+    ThreadedWebsocketManager, so the order book and order flow managers subscribe to either.
+    They are packed max_streams_per_connection per connection when start() is called.
+    Each combined message ({"stream": ..., "data": ...}) is dispatched to its stream's
+    callback with the raw event payload.
+
+    Kline streams are checked for missed candles; a gap is filled through
+    backfill(symbol, interval, first_open_time, last_open_time), which returns
+    (open_time, open, high, low, close, volume) rows. The REST calls run on a worker pool, so
+    a backfill never stalls the other streams of the connection. Until it finishes, later
+    messages of that kline stream are held back; the backfilled rows are then delivered as
+    closed kline events, followed by the held messages, in their original order. Depth
+    streams recover on their own, because the local order books resync on update-id gaps.
+
+    :param base_url: Stream endpoint; point it at a local WebSocket server to test without Binance.
+    """
+    def __init__(self, base_url=SPOT_STREAM_URL, max_streams_per_connection=MAX_STREAMS_PER_CONNECTION, backfill=None,
+                 min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF, backfill_workers=BACKFILL_WORKERS):
+        self.base_url = base_url.rstrip('/')
+        self.max_streams_per_connection = max_streams_per_connection
+        self.backfill = backfill
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.handlers = {}
+        self.kline_streams = {}
+        self.gap_detectors = {}
+        self.connections = []
+        self._backfill_queues = {}  # kline stream -> deque of ('gap', (first, last)) / ('event', data) in arrival order
+        self._backfill_lock = threading.Lock()
+        self._backfill_executor = ThreadPoolExecutor(max_workers=backfill_workers, thread_name_prefix='kline-backfill')
+
+    # Registration (ThreadedWebsocketManager-compatible)
+    def start_kline_socket(self, callback, symbol, interval='1m'):
+        stream = f"{symbol.lower()}@kline_{interval}"
+        self.kline_streams[stream] = (symbol.upper(), interval)
+        self.gap_detectors.setdefault(interval, KlineGapDetector(interval))
+        return self._register(stream, callback)
+
+    def start_depth_socket(self, callback, symbol, interval=None):
+        stream = f"{symbol.lower()}@depth@{interval}ms" if interval else f"{symbol.lower()}@depth"
+        return self._register(stream, callback)
+
+    def start_aggtrade_socket(self, callback, symbol):
+        return self._register(f"{symbol.lower()}@aggTrade", callback)
+
+    def start_mark_price_socket(self, callback, symbol, fast=True):
+        # Futures endpoint only; fast updates every second instead of every three
+        return self._register(f"{symbol.lower()}@markPrice@1s" if fast else f"{symbol.lower()}@markPrice", callback)
+
+    def _register(self, stream, callback):
+        if self.connections:
+            raise RuntimeError(f"Cannot add stream {stream}: register all streams before start().")
+        self.handlers[stream] = callback
+        return stream
+
+    def combined_urls(self):
+        streams = list(self.handlers)
+        return [f"{self.base_url}/stream?streams={'/'.join(streams[i:i + self.max_streams_per_connection])}"
+                for i in range(0, len(streams), self.max_streams_per_connection)]
+
+    def start(self):
+        for index, url in enumerate(self.combined_urls()):
+            connection = _StreamConnection(url, self.dispatch, f"stream-connection-{index}", self.min_backoff,
+                                           self.max_backoff)
+            connection.start()
+            self.connections.append(connection)
+        logger.info(f"Streaming {len(self.handlers)} streams over {len(self.connections)} connection(s).")
+
+    def stop(self):
+        for connection in self.connections:
+            connection.stop()
+        self._backfill_executor.shutdown(wait=False)
+
+    # Message handling
+    def dispatch(self, message):
+        message = json.loads(message) if isinstance(message, (str, bytes)) else message
+        stream, data = message.get('stream'), message.get('data')
+        callback = self.handlers.get(stream)
+        if callback is None or data is None:
+            return
+        if stream in self.kline_streams and self._queue_behind_backfill(stream, data, callback):
+            return
+        callback(data)
+
+    def _queue_behind_backfill(self, stream, data, callback):
+        """
+        Queue a kline message behind a gap backfill of its stream, starting one when it reveals a gap.
+
+        :return: True if the message was queued and will be delivered by the backfill worker.
+        """
+        symbol, interval = self.kline_streams[stream]
+        kline = data['k']
+        gap = self.gap_detectors[interval].check(symbol, kline['t'], kline['x'])
+        if gap is not None:
+            logger.warning(f"Missed {symbol} {interval} candles from {gap[0]} to {gap[1]}. Backfilling.")
+            if self.backfill is None:
+                gap = None
+        with self._backfill_lock:
+            queue = self._backfill_queues.get(stream)
+            if queue is None:
+                if gap is None:
+                    return False
+                queue = self._backfill_queues[stream] = deque()
+                self._backfill_executor.submit(self._run_backfill, stream, callback)
+            if gap is not None:
+                queue.append(('gap', gap))
+            queue.append(('event', data))
+            return True
+
+    def _run_backfill(self, stream, callback):
+        """
+        Deliver a kline stream's queued gaps (fetched over REST) and messages in order, until the queue is empty.
+        """
+        symbol, interval = self.kline_streams[stream]
+        while True:
+            with self._backfill_lock:
+                queue = self._backfill_queues[stream]
+                if not queue:
+                    del self._backfill_queues[stream]  # Dispatch delivers directly again
+                    return
+                kind, item = queue.popleft()
+            try:
+                if kind == 'event':
+                    callback(item)
+                    continue
+                rows = self.backfill(symbol, interval, item[0], item[1]) or []
+                for open_time, open_, high, low, close, volume in rows:
+                    callback({'e': 'kline', 's': symbol, 'backfilled': True, 'k': {
+                        't': int(open_time), 'i': interval, 'o': open_, 'h': high, 'l': low, 'c': close, 'v': volume,
+                        'x': True
+                    }})
+            except Exception as e:
+                handle_error(e, error_type="Kline Backfill", critical=False)
@@ -1,115 +1,265 @@
+import asyncio
+import functools
 import logging
 import os
-import time
-from telegram import Update, Bot
-from telegram.ext import Updater, CommandHandler, CallbackContext, Application
-from config import Config
-from trading_bot import run_bot
-from backtest import run_backtest
+import subprocess
+import sys
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes
+from config import get_config
+from control_plane import ControlClient, live_lock_held
+from job_queue import JobQueue, JobRunner, FINAL_STATES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Fetch Telegram bot token from the config file
-config = Config()
-TELEGRAM_TOKEN = config.config_data.get("telegram_bot_token")
-AUTHORIZED_USERS = config.config_data.get("authorized_users", [])
+config = get_config()
+TELEGRAM_TOKEN = config.get_telegram_bot_token()
+RUN_BOT_SCRIPT = os.path.join(os.path.dirname(__file__), 'run_bot.py')
 
 if not TELEGRAM_TOKEN:
     raise ValueError("Telegram bot token not provided in the config file.")
 
-# Initialize the bot
-bot = Bot(token=TELEGRAM_TOKEN)
+# The trading process runs separately; commands reach it over the control plane socket
+control_settings = config.get_control_plane_settings()
+control = ControlClient(control_settings['socket_path'], control_settings['authkey'], control_settings['timeout'])
+live_process = None  # Live trading process started by /start_bot
+
+# Backtests and retraining run as queued jobs in worker processes
+jobs = JobQueue()
+JOB_POLL_SECONDS = 5
+
+def authorized(handler):
+    """Reject commands from users that are not in authorized_users."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user.id not in config.get_authorized_users():
+            await update.message.reply_text("Unauthorized user. Access denied.")
+            return
+        await handler(update, context)
+    return wrapper
+
+async def request(command, symbols=None):
+    """Send a control command from a worker thread, so the event loop never blocks on the socket."""
+    return await asyncio.to_thread(control.request, command, symbols)
+
+def format_status(status):
+    lines = [f"Uptime: {status['uptime_s'] / 3600:.1f} h" + (" (stopping)" if status['stopping'] else "")]
+    for symbol, stats in sorted(status['symbols'].items()):
+        latency_ms = stats['last_latency_ms']
+        lines.append(
+            f"{symbol}: {'paused' if stats['paused'] else 'active'}, price {stats['last_price']}, "
+            f"{stats['cycles_per_minute']:.1f} cycles/min, last {latency_ms:.1f} ms, max {stats['max_latency_ms']:.1f} ms"
+            if latency_ms is not None else f"{symbol}: {'paused' if stats['paused'] else 'active'}, no cycles yet"
+        )
+    for stage, snapshot in status.get('latency', {}).items():
+        if snapshot['count']:
+            lines.append(f"{stage}: p50 {snapshot['p50_us'] / 1000:.1f} ms, p99 {snapshot['p99_us'] / 1000:.1f} ms")
+    return "\n".join(lines)
+
+def format_positions(positions):
+    if not positions:
+        return "No open positions."
+    lines = [f"{p['symbol']}: {p['quantity']} @ {p['entry_price']} (mark {p['mark_price']}, x{p['leverage']}) "
+             f"PnL {p['unrealized_pnl']:.2f} USDT" for p in positions]
+    lines.append(f"Total unrealized PnL: {sum(p['unrealized_pnl'] for p in positions):.2f} USDT")
+    return "\n".join(lines)
 
 # Handlers
-def start(update: Update, context: CallbackContext):
+@authorized
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a welcome message and list available commands."""
-    user_id = update.effective_user.id
-    if user_id not in AUTHORIZED_USERS:
-        update.message.reply_text("Unauthorized user. Access denied.")
-        return
-
     message = (
         "Welcome to the Ultimate Crypto Trading Bot!\n\n"
         "Available commands:\n"
         "/status - Get the bot's current status\n"
-        "/start_bot - Start the trading bot\n"
+        "/positions - Show open positions and PnL\n"
+        "/start_bot - Start the trading bot (or resume all symbols)\n"
         "/stop_bot - Stop the trading bot\n"
-        "/backtest - Run a backtest\n"
+        "/pause [SYMBOL ...] - Pause trading for symbols (all by default)\n"
+        "/resume [SYMBOL ...] - Resume trading for symbols (all by default)\n"
+        "/backtest [SYMBOL ...] - Queue a backtest\n"
+        "/retrain - Queue an XGBoost retraining\n"
+        "/jobs - List your jobs\n"
+        "/job ID - Show a job's status\n"
+        "/cancel ID - Cancel a job\n"
         "/help - Display this help message"
     )
-    update.message.reply_text(message)
+    await update.message.reply_text(message)
 
-def status(update: Update, context: CallbackContext):
+@authorized
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Provide the current status of the bot."""
-    user_id = update.effective_user.id
-    if user_id not in AUTHORIZED_USERS:
-        update.message.reply_text("Unauthorized user. Access denied.")
-        return
+    try:
+        await update.message.reply_text(format_status(await request('status')))
+    except (ConnectionError, RuntimeError) as e:
+        await update.message.reply_text(f"Status unavailable: {e}")
 
-    # Placeholder for actual status retrieval
-    status_message = "The trading bot is currently running in live mode."
-    update.message.reply_text(status_message)
+@authorized
+async def positions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Report open positions and unrealized PnL."""
+    try:
+        await update.message.reply_text(format_positions(await request('positions')))
+    except (ConnectionError, RuntimeError) as e:
+        await update.message.reply_text(f"Positions unavailable: {e}")
 
-def start_bot(update: Update, context: CallbackContext):
-    """Start the trading bot in live mode."""
-    user_id = update.effective_user.id
-    if user_id not in AUTHORIZED_USERS:
-        update.message.reply_text("Unauthorized user. Access denied.")
+@authorized
+async def start_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Start the trading bot in live mode as a separate process, or resume it if it is running."""
+    global live_process
+    if not control_settings['enabled']:
+        await update.message.reply_text("The control plane is disabled, so a running bot cannot be detected. "
+                                        "Start the trading bot manually.")
+        return
+    if await asyncio.to_thread(control.is_running):
+        await request('resume')
+        await update.message.reply_text("The trading bot is already running. All symbols resumed.")
+        return
+    # A bot that holds the live lock but does not answer (starting up or busy) must not get a twin
+    if (live_process is not None and live_process.poll() is None) or live_lock_held(control_settings['lock_path']):
+        await update.message.reply_text("The trading bot is running or starting but not responding yet. Try again shortly.")
         return
-
-    update.message.reply_text("Starting the trading bot in live mode...")
     try:
-        run_bot(live_trading=True)
+        live_process = subprocess.Popen([sys.executable, RUN_BOT_SCRIPT, '--mode=live'],
+                                        cwd=os.path.dirname(RUN_BOT_SCRIPT), start_new_session=True)
+        await update.message.reply_text("Starting the trading bot in live mode...")
     except Exception as e:
         logger.error(f"Error starting the trading bot: {e}")
-        update.message.reply_text(f"Failed to start the trading bot: {e}")
+        await update.message.reply_text(f"Failed to start the trading bot: {e}")
 
-def stop_bot(update: Update, context: CallbackContext):
+@authorized
+async def stop_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Stop the trading bot."""
-    user_id = update.effective_user.id
-    if user_id not in AUTHORIZED_USERS:
-        update.message.reply_text("Unauthorized user. Access denied.")
-        return
+    try:
+        await request('stop')
+        await update.message.reply_text("Stopping the trading bot after the current cycle...")
+    except (ConnectionError, RuntimeError) as e:
+        await update.message.reply_text(f"Could not stop the trading bot: {e}")
 
-    update.message.reply_text("Stopping the trading bot...")
-    # Implement logic to stop the trading bot (e.g., setting a flag or terminating a process)
+@authorized
+async def pause(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Pause trading for the given symbols, or all symbols."""
+    try:
+        paused = await request('pause', context.args)
+        await update.message.reply_text(f"Paused: {', '.join(paused)}")
+    except (ConnectionError, RuntimeError) as e:
+        await update.message.reply_text(f"Could not pause: {e}")
 
-def backtest(update: Update, context: CallbackContext):
-    """Run a backtest and send results to the user."""
-    user_id = update.effective_user.id
-    if user_id not in AUTHORIZED_USERS:
-        update.message.reply_text("Unauthorized user. Access denied.")
-        return
+@authorized
+async def resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Resume trading for the given symbols, or all symbols."""
+    try:
+        paused = await request('resume', context.args)
+        await update.message.reply_text(f"Resumed. Still paused: {', '.join(paused) or 'none'}")
+    except (ConnectionError, RuntimeError) as e:
+        await update.message.reply_text(f"Could not resume: {e}")
+
+def format_job(job):
+    message = f"Job {job['id']} ({job['kind']}): {job['state']}"
+    if job['progress']:
+        message += f"\n{job['progress']['fraction'] * 100:.0f}% {job['progress']['message']}"
+    if job.get('error'):
+        message += f"\nError: {job['error']}"
+    return message
+
+async def watch_job(context: ContextTypes.DEFAULT_TYPE, chat_id, job_id):
+    """Relay a job's progress to the chat and send its artifacts when it finishes."""
+    seen = 0
+    while True:
+        await asyncio.sleep(JOB_POLL_SECONDS)
+        events = await asyncio.to_thread(jobs.progress, job_id, seen)
+        if events:
+            seen += len(events)
+            latest = events[-1]  # Only the latest event, so slow jobs do not flood the chat
+            await context.bot.send_message(chat_id, f"Job {job_id}: {latest['fraction'] * 100:.0f}% {latest['message']}")
+        job = await asyncio.to_thread(jobs.get, job_id)
+        if job is None or job['state'] in FINAL_STATES:
+            break
+    await context.bot.send_message(chat_id, format_job(job) if job else f"Job {job_id} disappeared.")
+    for name in (job or {}).get('artifacts', []):
+        path = jobs.artifact_path(job_id, name)
+        with open(path, 'rb') as artifact:
+            if name.endswith('.png'):
+                await context.bot.send_photo(chat_id, artifact, caption=name)
+            else:
+                await context.bot.send_document(chat_id, artifact, filename=name)
+
+async def submit_job(update: Update, context: ContextTypes.DEFAULT_TYPE, kind, params):
+    job_id = await asyncio.to_thread(jobs.submit, kind, params, f"telegram:{update.effective_user.id}")
+    await update.message.reply_text(f"Queued {kind} job {job_id}. Progress and results will be sent here.")
+    context.application.create_task(watch_job(context, update.effective_chat.id, job_id))
+
+@authorized
+async def backtest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Queue a backtest; results are sent when it finishes."""
+    await submit_job(update, context, 'backtest', {'pairs': [pair.upper() for pair in context.args] or None})
 
-    update.message.reply_text("Running backtest...")
+@authorized
+async def retrain(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Queue an XGBoost retraining."""
+    await submit_job(update, context, 'retrain_xgboost', {})
+
+@authorized
+async def list_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List the user's recent jobs."""
+    user_jobs = await asyncio.to_thread(jobs.list, f"telegram:{update.effective_user.id}", 10)
+    await update.message.reply_text("\n".join(format_job(job) for job in user_jobs) or "No jobs.")
+
+@authorized
+async def job_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the status of a job."""
     try:
-        run_backtest()
-        update.message.reply_text("Backtest completed successfully. Check logs for details.")
-    except Exception as e:
-        logger.error(f"Error running backtest: {e}")
-        update.message.reply_text(f"Failed to run backtest: {e}")
+        job = await asyncio.to_thread(jobs.get, context.args[0]) if context.args else None
+    except ValueError:
+        job = None
+    await update.message.reply_text(format_job(job) if job else "Usage: /job ID (unknown job).")
 
-def help_command(update: Update, context: CallbackContext):
+@authorized
+async def cancel_job(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Cancel a queued or running job."""
+    try:
+        cancelled = await asyncio.to_thread(jobs.cancel, context.args[0]) if context.args else False
+    except ValueError:
+        cancelled = False
+    await update.message.reply_text("Cancellation requested." if cancelled else "Usage: /cancel ID (job not cancellable).")
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a help message."""
-    start(update, context)
+    await start(update, context)
 
 # Main function to start the Telegram bot
 def main():
-    updater = Updater(token=TELEGRAM_TOKEN, use_context=True)
-    dispatcher = updater.dispatcher
+    application = Application.builder().token(TELEGRAM_TOKEN).build()
 
     # Command handlers
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("status", status))
-    dispatcher.add_handler(CommandHandler("start_bot", start_bot))
-    dispatcher.add_handler(CommandHandler("stop_bot", stop_bot))
-    dispatcher.add_handler(CommandHandler("backtest", backtest))
-    dispatcher.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("status", status))
+    application.add_handler(CommandHandler("positions", positions))
+    application.add_handler(CommandHandler("start_bot", start_bot))
+    application.add_handler(CommandHandler("stop_bot", stop_bot))
+    application.add_handler(CommandHandler("pause", pause))
+    application.add_handler(CommandHandler("resume", resume))
+    application.add_handler(CommandHandler("backtest", backtest))
+    application.add_handler(CommandHandler("retrain", retrain))
+    application.add_handler(CommandHandler("jobs", list_jobs))
+    application.add_handler(CommandHandler("job", job_status))
+    application.add_handler(CommandHandler("cancel", cancel_job))
+
+    # Changes to authorized_users apply without a restart
+    reload_settings = config.get_config_reload_settings()
+    if reload_settings['enabled']:
+        config.watch(reload_settings['interval'])
+
+    # Run queued jobs from this process unless a separate --mode=job_worker does
+    job_settings = config.get_job_queue_settings()
+    if job_settings['embedded_runner']:
+        JobRunner(jobs, job_settings['workers'], job_settings['memory_limit_mb'], job_settings['cpu_time_limit_s'],
+                  job_settings['timeout_s']).start()
+    application.add_handler(CommandHandler("help", help_command))
 
     # Start polling
-    updater.start_polling()
-    updater.idle()
+    application.run_polling()
 
 if __name__ == "__main__":
     logger.info("Starting Telegram bot...")
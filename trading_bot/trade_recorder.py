@@ -0,0 +1,211 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from error_handler import handle_error
+
+logger = logging.getLogger(__name__)
+
+# Same database as the Flask app (app/__init__.py)
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'site.db')
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_QUEUE_SIZE = 100_000
+DEFAULT_FILL_SYNC_SECONDS = 10.0
+ACCOUNT_TRADES_LIMIT = 1000  # Maximum page size of futures_account_trades
+
+# Schema of app.models.Trade, created here when the trading bot runs before the web app
+TRADE_COLUMNS = [
+    ('timestamp', 'DATETIME NOT NULL'), ('symbol', 'VARCHAR(20) NOT NULL'), ('action', 'VARCHAR(10) NOT NULL'),
+    ('quantity', 'FLOAT NOT NULL'), ('price', 'FLOAT NOT NULL'), ('kind', "VARCHAR(10) NOT NULL DEFAULT 'fill'"),
+    ('order_type', 'VARCHAR(30)'), ('order_id', 'VARCHAR(40)'), ('status', 'VARCHAR(20)'), ('leverage', 'INTEGER'),
+    ('fee', 'FLOAT NOT NULL DEFAULT 0'), ('fee_asset', 'VARCHAR(10)'), ('realized_pnl', 'FLOAT NOT NULL DEFAULT 0'),
+    ('trade_id', 'BIGINT'),
+]
+# Fills are keyed by the exchange trade id, so a fill synced twice is stored once
+INSERT_SQL = (f"INSERT OR IGNORE INTO trade ({', '.join(name for name, _ in TRADE_COLUMNS)}) "
+              f"VALUES ({', '.join('?' for _ in TRADE_COLUMNS)})")
+
+class TradeRecorder:
+    """
+    Records orders and exchange fills into the trade table from background threads.
+
+    record_order() only enqueues a tuple, so the trading path never waits on SQLite; when the
+    queue is full, records are dropped and counted instead. Fills, including stop-loss and
+    take-profit exits, are taken from the exchange's account trades, with their realized PnL
+    and commission, by a sync thread that continues after the last stored trade id of each
+    symbol. The writer inserts up to batch_size rows per transaction (executemany) in WAL mode,
+    so the dashboard can read while the bot writes.
+    """
+    def __init__(self, database_path=DEFAULT_DATABASE_PATH, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, queue_size=DEFAULT_QUEUE_SIZE):
+        self.database_path = database_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.orders = {}  # order id -> (order type, leverage) of orders placed by this process
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name='trade-recorder', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def start_fill_sync(self, client, symbols, interval=DEFAULT_FILL_SYNC_SECONDS):
+        """
+        Poll client.futures_account_trades for new fills of the given symbols every interval seconds.
+        """
+        thread = threading.Thread(target=self._sync_fills, args=(client, list(symbols), interval),
+                                  name='trade-recorder-fills', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    # Producer side
+    def _put(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Trade recorder queue full; {self.dropped} records dropped so far.")
+
+    def record_order(self, symbol, side, quantity, price, order_type, order=None, leverage=None):
+        """
+        :param order: Order response from the exchange (orderId and status are stored).
+        """
+        order = order or {}
+        if order.get('orderId') is not None:
+            self.orders[str(order['orderId'])] = (order_type, leverage)
+        self._put((datetime.utcnow(), symbol, side, float(quantity), float(price), 'order', order_type,
+                   order.get('orderId'), order.get('status'), leverage, 0.0, None, 0.0, None))
+
+    # Fill sync
+    def _last_trade_ids(self):
+        try:
+            connection = self._connect()
+            try:
+                return dict(connection.execute(
+                    "SELECT symbol, MAX(trade_id) FROM trade WHERE trade_id IS NOT NULL GROUP BY symbol").fetchall())
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read the last synced trade ids: {e}")
+            return {}
+
+    def _fill_record(self, trade):
+        order_id = str(trade['orderId'])
+        order_type, leverage = self.orders.get(order_id, (None, None))
+        return (datetime.utcfromtimestamp(trade['time'] / 1000), trade['symbol'], trade['side'], float(trade['qty']),
+                float(trade['price']), 'fill', order_type, order_id, 'FILLED', leverage,
+                float(trade.get('commission') or 0), trade.get('commissionAsset'), float(trade.get('realizedPnl') or 0),
+                int(trade['id']))
+
+    def _sync_fills(self, client, symbols, interval):
+        last_ids = self._last_trade_ids()
+        while True:
+            for symbol in symbols:
+                try:
+                    while True:
+                        params = {'symbol': symbol, 'limit': ACCOUNT_TRADES_LIMIT}
+                        if last_ids.get(symbol) is not None:
+                            params['fromId'] = last_ids[symbol] + 1
+                        trades = client.futures_account_trades(**params)
+                        for trade in trades:
+                            self._put(self._fill_record(trade))
+                            last_ids[symbol] = max(last_ids.get(symbol) or 0, int(trade['id']))
+                        if len(trades) < ACCOUNT_TRADES_LIMIT:
+                            break
+                except Exception as e:
+                    handle_error(e, error_type="Trade Recorder", critical=False)
+            if self._stop_event.wait(interval):
+                break
+
+    # Writer side
+    def _connect(self):
+        connection = sqlite3.connect(self.database_path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"CREATE TABLE IF NOT EXISTS trade (id INTEGER NOT NULL PRIMARY KEY, "
+                           f"{', '.join(f'{name} {definition}' for name, definition in TRADE_COLUMNS)})")
+        existing = {row[1] for row in connection.execute("PRAGMA table_info(trade)")}
+        for name, definition in TRADE_COLUMNS:
+            if name not in existing:
+                connection.execute(f"ALTER TABLE trade ADD COLUMN {name} {definition.replace(' NOT NULL', '')}")
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_trade_symbol_timestamp ON trade (symbol, timestamp)")
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_trade_timestamp ON trade (timestamp)")
+        connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_trade_trade_id ON trade (trade_id)")
+        connection.commit()
+        return connection
+
+    @staticmethod
+    def _row(record):
+        timestamp, *values = record
+        return (timestamp.strftime('%Y-%m-%d %H:%M:%S.%f'), *values)
+
+    def _run(self):
+        connection = None
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                continue
+            try:
+                connection = connection or self._connect()
+                with connection:
+                    connection.executemany(INSERT_SQL, [self._row(record) for record in batch])
+                self.written += len(batch)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write {len(batch)} trade records: {e}")
+                connection = None
+                time.sleep(self.flush_interval)
+        if connection is not None:
+            connection.close()
+
+# Process-wide recorder; recording is a no-op until configure() enables it
+_recorder = None
+
+def configure(settings, client=None, symbols=None):
+    """
+    :param settings: Dictionary from Config.get_trade_recorder_settings().
+    :param client: Binance client whose account fills are synced for symbols.
+    """
+    global _recorder
+    if _recorder is not None:
+        _recorder.stop()
+        _recorder = None
+    if settings.get('enabled'):
+        _recorder = TradeRecorder(settings.get('database_path') or DEFAULT_DATABASE_PATH,
+                                  settings.get('batch_size', DEFAULT_BATCH_SIZE),
+                                  settings.get('flush_interval', DEFAULT_FLUSH_INTERVAL))
+        _recorder.start()
+        if client is not None and symbols:
+            _recorder.start_fill_sync(client, symbols, settings.get('fill_sync_seconds', DEFAULT_FILL_SYNC_SECONDS))
+        logger.info(f"Recording trades to {_recorder.database_path}.")
+    return _recorder
+
+def get_recorder():
+    return _recorder
+
+def record_order(*args, **kwargs):
+    if _recorder is not None:
+        _recorder.record_order(*args, **kwargs)
+
+def stop():
+    if _recorder is not None:
+        _recorder.stop()
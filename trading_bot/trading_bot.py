@@ -1,15 +1,37 @@
 import logging
 import time
+import pandas as pd
 from binance.client import Client
-from strategy import load_trained_model, load_or_train_rl, add_features, trading_strategy
+from strategy import load_trained_model, load_or_train_rl, add_features, trading_strategy, FEATURE_COLUMNS
+from feature_graph import get_feature_graph
 from risk_management import manage_risk, track_open_positions
 from data_fetching import get_real_time_data_via_websocket, get_historical_data
-from config import Config
+from config import get_config
+from multi_timeframe import HigherTimeframeTrendTracker, align_higher_timeframe_trend, resample_ohlcv, LONG_MA_WINDOW
+from candle_aggregator import CandleAggregator, warmup_minutes
+from candle_buffer import CandleBufferSet
+from order_flow import OrderFlowManager
+from shadow import ShadowEvaluator
+from external_signals import create_default_service
+from futures_data import FuturesDataManager, FuturesDataStore
+from portfolio_risk import PortfolioRiskEngine
+from control_plane import BotState, ControlServer, acquire_live_lock
+import trade_recorder
+import live_feed
+import latency
 from requests.exceptions import RequestException
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Features computed on each live cycle: the model inputs plus ATR and ADX for the market environment check
+LIVE_FEATURE_COLUMNS = FEATURE_COLUMNS + ['atr', 'adx']
+CANDLE_BUFFER_CAPACITY = 1440
+
+# 1m candles passed to the strategy on each cycle: just enough for every live feature to be warmed up
+def live_window(indicator_mode):
+    return get_feature_graph(indicator_mode).min_history(LIVE_FEATURE_COLUMNS)
+
 # Retry decorator for API calls
 def retry_on_failure(func, retries=3, backoff=1):
     for attempt in range(retries):
@@ -27,32 +49,48 @@ def apply_slippage_and_fees(price, slippage_pct=0.05, fee_pct=0.1):
     fee = price * fee_pct / 100
     return price - slippage - fee
 
-def websocket_callback(df, client, pair, higher_timeframe_df, xgboost_model, rl_model, config, open_positions):
+@latency.instrument('signal_to_order')
+def websocket_callback(df, client, pair, higher_timeframe_trend, xgboost_model, rl_model, config, open_positions,
+                       order_book_features=None, shadow=None, external_features=None, portfolio=None):
     """
     Callback function for WebSocket to process incoming real-time data.
     Executes hybrid trading strategy, risk management, and tracks positions.
+    Order book features (imbalance, microprice, ...) and cached external signals (e.g. fear_greed) are
+    attached to the latest candle when available.
+    With a ShadowEvaluator, the same feature rows are queued for candidate models once the order is handled.
+    With a PortfolioRiskEngine, orders are checked against portfolio VaR and margin limits.
+    Each signal is published to the live dashboard feed.
     """
     try:
         if df is None or df.empty:
             logger.error(f"No real-time data for {pair}. Skipping.")
             return
 
-        if higher_timeframe_df is None or higher_timeframe_df.empty:
-            logger.error(f"No higher timeframe data for {pair}. Skipping.")
+        if higher_timeframe_trend is None:
+            logger.error(f"No higher timeframe trend for {pair}. Skipping.")
             return
 
         # Add features (indicators) to the real-time data
-        df = add_features(df)
+        df = add_features(df, indicator_mode=config.get_indicator_mode(), columns=LIVE_FEATURE_COLUMNS)
+
+        # Attach the local order book state and external signals to the latest candle
+        for name, value in {**(order_book_features or {}), **(external_features or {})}.items():
+            df.loc[df.index[-1], name] = value
 
         # Apply slippage and fees
         df['close'] = df['close'].apply(apply_slippage_and_fees)
 
         # Execute hybrid trading strategy
-        signal = trading_strategy(df, higher_timeframe_df, xgboost_model, rl_model, mode="hybrid")
+        signal = trading_strategy(df, None, xgboost_model, rl_model, mode="hybrid",
+                                  higher_timeframe_trend=higher_timeframe_trend,
+                                  indicator_mode=config.get_indicator_mode())
 
         # Extract necessary trade details
         current_price = df['close'].iloc[-1]
-        stop_loss, take_profit = manage_risk(client, pair, signal, df, config) or (None, None)
+        stop_loss, take_profit = manage_risk(client, pair, signal, df, config, portfolio=portfolio) or (None, None)
+        live_feed.publish('signal', {'symbol': pair, 'signal': signal, 'price': float(current_price),
+                                     'stop_loss': stop_loss, 'take_profit': take_profit,
+                                     'trend': higher_timeframe_trend}, key=pair)
 
         if stop_loss and take_profit:
             # Track open positions and log profit/loss
@@ -62,11 +100,20 @@ def websocket_callback(df, client, pair, higher_timeframe_df, xgboost_model, rl_
         else:
             logger.info(f"No trade executed for {pair}. Risk parameters unavailable.")
 
+        if shadow is not None:
+            shadow.submit(pair, df, higher_timeframe_trend, signal, current_price)
+
     except Exception as e:
         logger.error(f"Error trading {pair}: {e}", exc_info=True)
 
 def run_bot(live_trading=True):
-    config = Config()
+    config = get_config()
+    latency.configure(config.get_latency_settings())
+
+    # Risk, leverage and indicator settings are read every cycle, so edits to config.json apply live
+    reload_settings = config.get_config_reload_settings()
+    if reload_settings['enabled']:
+        config.watch(reload_settings['interval'])
 
     # Initialize Binance client with API credentials
     api_key, api_secret = config.get_api_credentials()
@@ -85,48 +132,207 @@ def run_bot(live_trading=True):
     open_positions = {}  # Dictionary to track open positions for each pair
 
     if live_trading:
+        # Only one live trading process may place orders; /start_bot relies on this lock
+        try:
+            live_lock = acquire_live_lock(config.get_control_plane_settings()['lock_path'])
+        except RuntimeError as e:
+            logger.error(f"Not starting live trading: {e}")
+            return
         logger.info("Starting live WebSocket data stream...")
-
-        # Start WebSocket for real-time data fetching
-        get_real_time_data_via_websocket(trading_pairs, client, interval='1m', fetch_order_book=True)
-
-        # Pre-fetch higher timeframe data
-        higher_timeframe_dfs = {}
+        trade_recorder.configure(config.get_trade_recorder_settings(), client, trading_pairs)
+
+        # The 4h trend is derived from the single 1m stream: seeded from one 4h REST request, then kept
+        # current by the aggregators from the WebSocket. 1m history only covers the candle buffer,
+        # which includes the current, still open 4h bucket.
+        aggregators = {}
+        higher_timeframe_trackers = {}
+        candles = CandleBufferSet(trading_pairs, capacity=CANDLE_BUFFER_CAPACITY)
+        higher_timeframe_lookback = f"{warmup_minutes('4h', LONG_MA_WINDOW)} minutes ago UTC"
+        base_lookback = f"{CANDLE_BUFFER_CAPACITY} minutes ago UTC"
         for pair in trading_pairs:
-            higher_timeframe_dfs[pair] = retry_on_failure(
-                lambda: get_historical_data(client, pair, interval='4h', lookback='3 months ago UTC')
+            higher_timeframe_trackers[pair] = HigherTimeframeTrendTracker(higher_interval='4h')
+            aggregators[pair] = CandleAggregator(
+                base_interval='1m', intervals=['4h'], history=LONG_MA_WINDOW,
+                on_close=higher_timeframe_trackers[pair].on_candle_close
+            )
+            higher_df = retry_on_failure(
+                lambda: get_historical_data(client, pair, interval='4h', lookback=higher_timeframe_lookback)
+            )
+            if higher_df is not None and not higher_df.empty:
+                higher_timeframe_trackers[pair].seed(higher_df)
+                aggregators[pair].seed('4h', higher_df.iloc[:-1])  # The last 4h candle is still open
+            else:
+                logger.warning(f"No 4h history for {pair}. The higher timeframe trend starts neutral.")
+            base_df = retry_on_failure(
+                lambda: get_historical_data(client, pair, interval='1m', lookback=base_lookback)
+            )
+            if base_df is not None and not base_df.empty:
+                # Only candles after the seeded 4h bars are folded into the open 4h bucket
+                aggregators[pair].update_from_frame(base_df.iloc[:-1])  # The last candle is still open
+                candles.seed(pair, base_df, last_closed=False)
+
+        # Portfolio VaR and margin limits across all pairs, from the covariance of 1m returns
+        portfolio = None
+        portfolio_settings = config.get_portfolio_risk_settings()
+        if portfolio_settings['enabled']:
+            portfolio = PortfolioRiskEngine(
+                trading_pairs, decay=portfolio_settings['decay'], confidence=portfolio_settings['confidence'],
+                horizon_bars=portfolio_settings['horizon_bars'], max_var_fraction=portfolio_settings['max_var_fraction'],
+                max_margin_fraction=portfolio_settings['max_margin_fraction'],
+                min_order_fraction=portfolio_settings['min_order_fraction']
+            )
+            closes = {pair: candles.to_frame(pair, closed_only=True)['close'] for pair in trading_pairs
+                      if len(candles.get(pair))}
+            if closes:
+                portfolio.seed(pd.DataFrame(closes))
+            try:
+                portfolio.load_positions(retry_on_failure(client.futures_position_information) or [])
+            except Exception as e:
+                logger.warning(f"Could not load open positions into the portfolio risk engine: {e}")
+            # Fills only ever add to positions; exits on the exchange are picked up from here
+            portfolio.start_reconciliation(client.futures_position_information, portfolio_settings['reconcile_seconds'])
+
+        def on_kline(symbol, open_time, open_, high, low, close, volume, is_closed):
+            candles.on_kline(symbol, open_time, open_, high, low, close, volume, is_closed)
+            aggregator = aggregators.get(symbol)
+            if aggregator:
+                aggregator.update(open_time, open_, high, low, close, volume, is_closed)
+            if portfolio is not None and is_closed:
+                portfolio.on_close(symbol, open_time, float(close))
+
+        # Order-flow features (CVD, imbalance, VPIN) from aggTrade streams, aligned to 1m candles
+        order_flow = None
+        order_flow_settings = config.get_order_flow_settings()
+        if order_flow_settings['enabled']:
+            order_flow = OrderFlowManager(
+                trading_pairs, interval='1m',
+                vpin_bucket_volumes=order_flow_settings['vpin_bucket_volume'],
+                default_vpin_bucket_volume=order_flow_settings['default_vpin_bucket_volume'],
+                vpin_window=order_flow_settings['vpin_window']
+            )
+
+        # Funding, open interest, long/short ratio and mark price from the futures market
+        futures = None
+        futures_settings = config.get_futures_data_settings()
+        if futures_settings['enabled']:
+            futures = FuturesDataManager(client, trading_pairs, interval='1m',
+                                         stats_period=futures_settings['live_stats_period'],
+                                         poll_seconds=futures_settings['poll_seconds'])
+            futures.start()
+
+        # External indicators are refreshed in the background; the loop only reads the cache
+        external_signals = None
+        external_signal_settings = config.get_external_signal_settings()
+        if external_signal_settings['enabled']:
+            external_signals = create_default_service(external_signal_settings)
+            external_signals.start()
+
+        # Candidate models score the same rows in a background process
+        shadow = None
+        shadow_settings = config.get_shadow_settings()
+        if shadow_settings['enabled'] and shadow_settings['candidates']:
+            shadow = ShadowEvaluator(
+                shadow_settings['candidates'], log_path=shadow_settings['log_path'],
+                summary_path=shadow_settings['summary_path'], queue_size=shadow_settings['queue_size'],
+                indicator_mode=config.get_indicator_mode()
             )
 
+        # Start WebSocket for real-time data fetching
+        streams, order_books = get_real_time_data_via_websocket(
+            trading_pairs, client, interval='1m', fetch_order_book=True, on_kline=on_kline, order_flow=order_flow
+        )
+
+        # Status and pause/resume/stop commands from the control plane (e.g. the Telegram bot)
+        state = BotState(trading_pairs)
+        state.positions_provider = client.futures_position_information
+        control_server = None
+        control_settings = config.get_control_plane_settings()
+        if control_settings['enabled']:
+            control_server = ControlServer(state, control_settings['socket_path'], control_settings['authkey'])
+            control_server.start()
+
+        # Equity, positions and signals for the web dashboard's live stream
+        live_feed_settings = config.get_live_feed_settings()
+        publisher = live_feed.configure(live_feed_settings)
+        if publisher is not None:
+            publisher.start_account_updates(client.futures_account, state.positions,
+                                            live_feed_settings['account_interval'])
+
         # Main live trading loop
-        while True:
+        while not state.stop_requested:
             try:
                 for pair in trading_pairs:
-                    # Fetch real-time data for the pair
-                    df = retry_on_failure(
-                        lambda: get_historical_data(client, pair, interval='1m', lookback='1 hour ago UTC')
-                    )
+                    if not state.is_active(pair):
+                        continue
+
+                    # Latest candles from the WebSocket-fed ring buffer; REST only until the buffer has data
+                    window = live_window(config.get_indicator_mode())
+                    df = candles.to_frame(pair, window)
+                    if df.empty:
+                        df = retry_on_failure(
+                            lambda: get_historical_data(client, pair, interval='1m', lookback=f"{window} minutes ago UTC")
+                        )
+                        candles.seed(pair, df, last_closed=False)
                     if df is None or df.empty:
                         logger.warning(f"No real-time data for {pair}. Skipping.")
                         continue
 
+                    if order_flow is not None:
+                        order_flow.flush(pair)  # In a quiet market the last closed candle has no later trade
+                        df = order_flow.attach(pair, df)
+                    if futures is not None:
+                        df = futures.attach(pair, df)
+
+                    higher_timeframe_trend = higher_timeframe_trackers[pair].trend
+
                     # Pass data to the callback for processing
+                    cycle_start = time.perf_counter()
                     websocket_callback(
                         df,
                         client,
                         pair,
-                        higher_timeframe_dfs.get(pair),
+                        higher_timeframe_trend,
                         xgboost_model,
                         rl_model,
                         config,
-                        open_positions
+                        open_positions,
+                        order_books.get_features(pair) if order_books else None,
+                        shadow,
+                        external_signals.snapshot() if external_signals else None,
+                        portfolio
                     )
+                    cycle_seconds = time.perf_counter() - cycle_start
+                    state.record_cycle(pair, cycle_seconds, float(df['close'].iloc[-1]))
+                    live_feed.publish('status', {'symbol': pair, 'price': float(df['close'].iloc[-1]),
+                                                 'latency_ms': cycle_seconds * 1000}, key=pair)
 
             except Exception as e:
                 logger.error(f"Error in live trading loop: {e}", exc_info=True)
 
+            # Periodically export stage latency histograms
+            latency.maybe_export()
+
             # Delay between WebSocket processing cycles
             time.sleep(1)
 
+        logger.info("Stop requested. Shutting down the live trading loop.")
+        streams.stop()
+        if futures is not None:
+            futures.stop()
+        if portfolio is not None:
+            portfolio.stop()
+        if external_signals is not None:
+            external_signals.stop()
+        if shadow is not None:
+            shadow.stop()
+        if control_server is not None:
+            control_server.stop()
+        trade_recorder.stop()
+        live_feed.close()
+        if latency.is_enabled():
+            latency.write_export()
+        live_lock.close()
+
     else:
         logger.info("Starting backtest mode...")
         for pair in trading_pairs:
@@ -139,22 +345,30 @@ def run_bot(live_trading=True):
                     logger.error(f"No backtest data for {pair}. Skipping.")
                     continue
 
-                # Fetch higher timeframe data
-                higher_timeframe_df = retry_on_failure(
-                    lambda: get_historical_data(client, pair, interval='4h', lookback='8 months ago UTC')
-                )
+                # Derive the higher timeframe from the same 1h series instead of fetching it separately
+                higher_timeframe_df = resample_ohlcv(df, '4h')
                 if higher_timeframe_df is None or higher_timeframe_df.empty:
                     logger.error(f"No higher timeframe data for {pair}. Skipping.")
                     continue
 
-                # Add features (indicators) to the historical data
-                df = add_features(df)
+                # Add features (indicators) to the historical data, with stored futures data when enabled
+                futures_features = None
+                futures_settings = config.get_futures_data_settings()
+                if futures_settings['enabled']:
+                    futures_features = FuturesDataStore().observations(
+                        pair, interval='1h', stats_period=futures_settings['history_stats_period']
+                    )
+                df = add_features(df, indicator_mode=config.get_indicator_mode(), futures_features=futures_features,
+                                  blocking_sentiment=True)
 
                 # Apply slippage and fees
                 df['close'] = df['close'].apply(apply_slippage_and_fees)
 
-                # Execute hybrid trading strategy
-                signal = trading_strategy(df, higher_timeframe_df, xgboost_model, rl_model, mode="hybrid")
+                # Execute hybrid trading strategy with the trend of the last closed 4h candle
+                higher_timeframe_trend = int(align_higher_timeframe_trend(df, higher_timeframe_df, higher_interval='4h').iloc[-1])
+                signal = trading_strategy(df, higher_timeframe_df, xgboost_model, rl_model, mode="hybrid",
+                                          higher_timeframe_trend=higher_timeframe_trend,
+                                          indicator_mode=config.get_indicator_mode())
 
                 # Manage risk and execute orders based on the signal
                 manage_risk(client, pair, signal, df, config)
@@ -165,6 +379,9 @@ def run_bot(live_trading=True):
             # Delay between backtest polling intervals
             time.sleep(config.get_polling_interval())
 
+        if latency.is_enabled():
+            latency.write_export()
+
 if __name__ == "__main__":
     logger.info("Starting Binance Futures Trading Bot in live mode...")
     run_bot(live_trading=True)
@@ -1,5 +1,6 @@
 import pandas as pd
 import logging
+from multi_timeframe import trend_series
 
 logger = logging.getLogger(__name__)
 
@@ -23,16 +24,8 @@ def analyze_higher_timeframe(df):
         logger.warning("Insufficient data for moving average calculations. Returning neutral trend.")
         return 0  # Neutral
 
-    df = df.copy()  # Avoid modifying the original DataFrame
-    df['short_ma'] = df['close'].rolling(window=50).mean()
-    df['long_ma'] = df['close'].rolling(window=200).mean()
-
-    if df['short_ma'].iloc[-1] > df['long_ma'].iloc[-1]:
-        return 1  # Bullish
-    elif df['short_ma'].iloc[-1] < df['long_ma'].iloc[-1]:
-        return -1  # Bearish
-    else:
-        return 0  # Neutral (no clear trend)
+    # Only the last 200 candles affect the latest moving averages
+    return int(trend_series(df.iloc[-200:]).iloc[-1])
 
 def detect_market_environment(df):
     """